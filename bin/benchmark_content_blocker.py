@@ -0,0 +1,378 @@
+#!/usr/bin/env python3
+# Copyright (c) 2017-2021 Cedric Bellegarde <cedric.bellegarde@adishatz.org>
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+    Content blocker pipeline benchmark
+
+    Generates synthetic rule sets and times each stage of the pipeline
+    used by eolie/content_blocker*.py. Results are written as JSON.
+
+    Run from source tree, no display needed:
+    $ python3 bin/benchmark_content_blocker.py --sizes 10000,100000 \\
+          --output results.json
+"""
+
+import os
+import sys
+import json
+import random
+import shutil
+import resource
+import subprocess
+import platform
+import tempfile
+from argparse import ArgumentParser
+from itertools import chain
+from time import monotonic
+
+# Never touch user data, must be set before GLib is loaded
+TMP_PATH = tempfile.mkdtemp(prefix="eolie-benchmark-")
+os.environ["XDG_DATA_HOME"] = TMP_PATH
+os.environ["XDG_CACHE_HOME"] = TMP_PATH
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import gi  # noqa
+gi.require_version("WebKit2", "4.0")
+from gi.repository import Gio, GLib  # noqa
+
+from eolie.define import EOLIE_DATA_PATH  # noqa
+from eolie.content_blocker_exceptions import ContentBlockerExceptions  # noqa
+from eolie.content_blocker_optimizer import ContentBlockerOptimizer  # noqa
+from eolie.content_blocker_rules import RulesReader, RulesWriter  # noqa
+
+
+class RulesGenerator:
+    """
+        Generate synthetic rules looking like EasyList:
+        - domains follow a Zipf distribution
+        - most rules are url blocks, some are element hiding rules,
+          some are exceptions
+        - some rules are duplicated, like in merged lists
+    """
+
+    __RESOURCE_TYPES = ["script", "image", "style-sheet", "media",
+                        "raw", "font", "popup", "document"]
+    __WORDS = ["ad", "ads", "banner", "track", "pixel", "analytics",
+               "sponsor", "promo", "popunder", "beacon", "stats", "tag"]
+
+    def __init__(self, seed, domains):
+        """
+            Init generator
+            @param seed as int
+            @param domains as int: domains count
+        """
+        self.__random = random.Random(seed)
+        self.__domains = ["site%s.%s" % (i, self.__random.choice(
+                          ["com", "net", "org", "fr", "de", "io"]))
+                          for i in range(0, domains)]
+        # Zipf weights: a few domains get most domain rules
+        self.__weights = [1.0 / (i + 1) for i in range(0, domains)]
+
+    def get_rules(self, count):
+        """
+            Get rules
+            @param count as int
+            @return []
+        """
+        rules = []
+        while len(rules) < count:
+            value = self.__random.random()
+            if value < 0.05 and rules:
+                rules.append(self.__random.choice(rules))
+            elif value < 0.65:
+                rules.append(self.__get_block_rule())
+            elif value < 0.90:
+                rules.append(self.__get_css_rule())
+            else:
+                rules.append(self.__get_ignore_rule())
+        return rules
+
+    def get_domains(self, count):
+        """
+            Get domains for exceptions
+            @param count as int
+            @return [str]
+        """
+        return self.__random.choices(self.__domains, self.__weights, k=count)
+
+#######################
+# PRIVATE             #
+#######################
+    def __get_domain(self):
+        """
+            Get a domain
+            @return str
+        """
+        return self.__random.choices(self.__domains, self.__weights)[0]
+
+    def __get_url_filter(self):
+        """
+            Get an url filter
+            @return str
+        """
+        word = self.__random.choice(self.__WORDS)
+        kind = self.__random.random()
+        if kind < 0.4:
+            return "^https?://([^/]+\\.)?%s" % self.__get_domain().replace(
+                ".", "\\.")
+        elif kind < 0.8:
+            return "[/_.-]%s%s[/_.-]" % (word, self.__random.randint(0, 999))
+        return "%s\\.js" % word
+
+    def __get_block_rule(self):
+        """
+            Get a block rule
+            @return {}
+        """
+        trigger = {"url-filter": self.__get_url_filter()}
+        if self.__random.random() < 0.3:
+            trigger["resource-type"] = self.__random.sample(
+                self.__RESOURCE_TYPES, self.__random.randint(1, 3))
+        if self.__random.random() < 0.5:
+            trigger["load-type"] = ["third-party"]
+        if self.__random.random() < 0.2:
+            trigger["if-domain"] = ["*%s" % self.__get_domain()]
+        return {"trigger": trigger, "action": {"type": "block"}}
+
+    def __get_css_rule(self):
+        """
+            Get an element hiding rule
+            @return {}
+        """
+        selector = ".%s-%s" % (self.__random.choice(self.__WORDS),
+                               self.__random.randint(0, 5000))
+        trigger = {"url-filter": ".*"}
+        if self.__random.random() < 0.6:
+            trigger["if-domain"] = ["*%s" % self.__get_domain()]
+        return {"trigger": trigger,
+                "action": {"type": "css-display-none", "selector": selector}}
+
+    def __get_ignore_rule(self):
+        """
+            Get an exception rule
+            @return {}
+        """
+        return {"trigger": {"url-filter": self.__get_url_filter(),
+                            "if-domain": ["*%s" % self.__get_domain()]},
+                "action": {"type": "ignore-previous-rules"}}
+
+
+class ContentBlockerBenchmark:
+    """
+        Time content blocker pipeline stages
+    """
+
+    def __init__(self, webkit):
+        """
+            Init benchmark
+            @param webkit as bool: benchmark WebKit compilation
+        """
+        self.__store = None
+        if webkit:
+            from gi.repository import WebKit2
+            self.__store = WebKit2.UserContentFilterStore.new(
+                "%s/content_blocker" % EOLIE_DATA_PATH)
+        self.__json_path = "%s/content_blocker_json" % EOLIE_DATA_PATH
+        GLib.mkdir_with_parents(self.__json_path, 0o0750)
+
+    def run(self, generator, count, exceptions):
+        """
+            Run all stages for count rules
+            @param generator as RulesGenerator
+            @param count as int
+            @param exceptions as int
+            @return {}
+        """
+        stages = {}
+        counts = {}
+        start = monotonic()
+        rules = generator.get_rules(count)
+        stages["generate"] = monotonic() - start
+        source = Gio.File.new_for_path("%s/source.json" % self.__json_path)
+        source.replace_contents(json.dumps(rules).encode("utf-8"), None,
+                                False,
+                                Gio.FileCreateFlags.REPLACE_DESTINATION,
+                                None)
+        counts["source_bytes"] = source.query_info(
+            Gio.FILE_ATTRIBUTE_STANDARD_SIZE,
+            Gio.FileQueryInfoFlags.NONE, None).get_size()
+        del rules
+
+        # JSON parse, whole file and stream
+        start = monotonic()
+        (status, content, tag) = source.load_contents(None)
+        rules = json.loads(content.decode("utf-8"))
+        stages["json_parse"] = monotonic() - start
+        del content
+        start = monotonic()
+        parsed = sum(1 for rule in RulesReader(source))
+        stages["stream_parse"] = monotonic() - start
+        counts["rules"] = parsed
+
+        # Merge with exceptions
+        start = monotonic()
+        blocker_exceptions = ContentBlockerExceptions("benchmark")
+        batch = [(domain, ".*", False)
+                 for domain in generator.get_domains(exceptions // 2)]
+        batch += [(domain, "%s/script.*" % domain, False)
+                  for domain in generator.get_domains(exceptions // 2)]
+        blocker_exceptions.add_domain_exceptions(batch)
+        merged = rules + blocker_exceptions.rules
+        stages["exceptions_merge"] = monotonic() - start
+        counts["exceptions"] = len(blocker_exceptions.rules)
+        start = monotonic()
+        for domain in generator.get_domains(1000):
+            blocker_exceptions.is_domain_exception(domain)
+            blocker_exceptions.is_domain_excepted("www.%s" % domain)
+        stages["exceptions_lookup_1000"] = monotonic() - start
+
+        # Optimization
+        start = monotonic()
+        optimizer = ContentBlockerOptimizer()
+        optimized = list(optimizer.optimize(merged))
+        stages["optimize"] = monotonic() - start
+        counts["optimized_rules"] = len(optimized)
+
+        # Serialization
+        compiled = Gio.File.new_for_path(
+            "%s/benchmark.compiled.json" % self.__json_path)
+        start = monotonic()
+        writer = RulesWriter(compiled)
+        for rule in optimized:
+            writer.write(rule)
+        writer.close()
+        stages["serialize"] = monotonic() - start
+        counts["written_rules"] = writer.count
+        del rules, merged, optimized
+
+        # Streaming pipeline, as done by ContentBlocker._save_rules()
+        start = monotonic()
+        writer = RulesWriter(compiled)
+        for rule in ContentBlockerOptimizer().optimize(
+                chain(RulesReader(source), blocker_exceptions.rules)):
+            writer.write(rule)
+        writer.close()
+        stages["pipeline"] = monotonic() - start
+
+        if self.__store is not None:
+            stages["compile"] = self.__wait(self.__store.save_from_file,
+                                            self.__store.save_finish,
+                                            "benchmark", compiled)
+            stages["load"] = self.__wait(self.__store.load,
+                                         self.__store.load_finish,
+                                         "benchmark")
+        return {"stages": stages, "counts": counts}
+
+#######################
+# PRIVATE             #
+#######################
+    def __wait(self, function, finish, *args):
+        """
+            Run an async store function and wait for result
+            @param function as function
+            @param finish as function
+            @param *args as function args
+            @return float (seconds), -1 on error
+        """
+        loop = GLib.MainLoop.new(None, False)
+        result = {}
+
+        def on_finish(store, async_result):
+            try:
+                finish(async_result)
+                result["time"] = monotonic() - start
+            except Exception as e:
+                print("Benchmark: %s" % e, file=sys.stderr)
+                result["time"] = -1
+            loop.quit()
+
+        start = monotonic()
+        function(*args, None, on_finish)
+        loop.run()
+        return result["time"]
+
+
+def run_size(args, size):
+    """
+        Run benchmark for size in a new process, so peak RSS is per size
+        @param args as argparse.Namespace
+        @param size as int
+        @return {}
+    """
+    command = [sys.executable, os.path.abspath(__file__),
+               "--sizes", str(size),
+               "--exceptions", str(args.exceptions),
+               "--domains", str(args.domains),
+               "--seed", str(args.seed)]
+    if args.no_webkit:
+        command.append("--no-webkit")
+    output = subprocess.run(command, stdout=subprocess.PIPE,
+                            check=True).stdout
+    return json.loads(output.decode("utf-8"))["results"][0]
+
+
+def main():
+    """
+        Run benchmark and write results, one process per size
+    """
+    parser = ArgumentParser(description="Content blocker benchmark")
+    parser.add_argument("--sizes", default="10000,50000,100000,500000",
+                        help="rules counts, comma separated")
+    parser.add_argument("--exceptions", type=int, default=200,
+                        help="exceptions count")
+    parser.add_argument("--domains", type=int, default=20000,
+                        help="domains count")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-webkit", action="store_true",
+                        help="do not time WebKit compilation")
+    parser.add_argument("--output", default="-",
+                        help="JSON results file, - for stdout")
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(",")]
+    results = []
+    for size in sizes:
+        if len(sizes) > 1:
+            result = run_size(args, size)
+        else:
+            benchmark = ContentBlockerBenchmark(not args.no_webkit)
+            generator = RulesGenerator(args.seed, args.domains)
+            result = benchmark.run(generator, size, args.exceptions)
+            result["size"] = size
+            # Process only runs this size
+            result["max_rss_kb"] = resource.getrusage(
+                resource.RUSAGE_SELF).ru_maxrss
+            print("%s rules: %s" % (size, ", ".join(
+                "%s %.3fs" % (stage, value)
+                for (stage, value) in result["stages"].items())),
+                file=sys.stderr)
+        results.append(result)
+
+    output = {"version": 1,
+              "python": platform.python_version(),
+              "machine": platform.machine(),
+              "seed": args.seed,
+              "domains": args.domains,
+              "exceptions": args.exceptions,
+              "results": results}
+    content = json.dumps(output, indent=2)
+    if args.output == "-":
+        print(content)
+    else:
+        with open(args.output, "w") as f:
+            f.write(content)
+    shutil.rmtree(TMP_PATH, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -29,6 +29,7 @@ from signal import signal, SIGINT, SIGTERM
 import gc
 
 from eolie.application_night import NightApplication
+from eolie.application_memory import MemoryApplication
 from eolie.settings import Settings
 from eolie.window import Window
 from eolie.art import Art
@@ -42,18 +43,20 @@ from eolie.database_history import DatabaseHistory
 from eolie.database_bookmarks import DatabaseBookmarks
 from eolie.database_settings import DatabaseSettings
 from eolie.sqlcursor import SqlCursor
+from eolie.context_pool import ContextPool
 from eolie.search import Search
 from eolie.download_manager import DownloadManager
+from eolie.discard_manager import DiscardManager
 from eolie.menu_pages import PagesMenu
 from eolie.helper_task import TaskHelper
 from eolie.define import EOLIE_DATA_PATH, TimeSpan, TimeSpanValues, LoadingType
-from eolie.define import StartPage
+from eolie.define import StartPage, TaskPriority
 from eolie.utils import is_unity, wanted_loading_type
 from eolie.logger import Logger
 from eolie.webview_state import WebViewState
 
 
-class Application(Gtk.Application, NightApplication):
+class Application(Gtk.Application, NightApplication, MemoryApplication):
     """
         Eolie application
     """
@@ -180,8 +183,11 @@ class Application(Gtk.Application, NightApplication):
             window.hide()
         # Stop pending tasks
         self.download_manager.cancel()
+        self.discard_manager.stop()
         for content_blocker in self.__content_blockers:
             content_blocker.stop()
+        self.history.writer.stop()
+        self.task_helper.http_client.dump()
         # Clear history
         active_id = str(self.settings.get_enum("history-storage"))
         if active_id != TimeSpan.FOREVER:
@@ -201,7 +207,8 @@ class Application(Gtk.Application, NightApplication):
         if vacuum:
             self.task_helper.run(
                         self.__vacuum,
-                        callback=(lambda x: Gio.Application.quit(self),))
+                        callback=(lambda x: Gio.Application.quit(self),),
+                        priority=TaskPriority.INTERACTIVE)
         else:
             Gio.Application.quit(self)
 
@@ -216,16 +223,12 @@ class Application(Gtk.Application, NightApplication):
                 return content_blocker
 
     @property
-    def content_filters(self):
+    def content_blockers(self):
         """
-            Get content filters
-            @return [WebKit2.UserContentFilter]
+            Get content blockers
+            @return [ContentBlocker]
         """
-        filters = []
-        for content_blocker in self.__content_blockers:
-            if content_blocker.enabled:
-                filters.append(content_blocker.filter)
-        return filters
+        return self.__content_blockers
 
     @property
     def start_page(self):
@@ -324,11 +327,12 @@ class Application(Gtk.Application, NightApplication):
                     PhishingContentBlocker]:
             content_blocker = cls()
             content_blocker.connect("set-filter",
-                                    self.__on_content_blocker_set_filter)
+                                    self.__on_content_blocker_filter)
             content_blocker.connect("unset-filter",
-                                    self.__on_content_blocker_unset_filter)
+                                    self.__on_content_blocker_filter)
             self.__content_blockers.append(content_blocker)
         self.art = Art()
+        self.context_pool = ContextPool()
 
         # Get a default user agent for search
         settings = WebKit2.Settings.new()
@@ -336,6 +340,15 @@ class Application(Gtk.Application, NightApplication):
 
         self.task_helper = TaskHelper()
         self.download_manager = DownloadManager()
+        self.discard_manager = DiscardManager()
+        MemoryApplication.__init__(self)
+        # Build autocompletion indexes
+        self.task_helper.run(self.history.load_index,
+                             priority=TaskPriority.BULK)
+        self.task_helper.run(self.bookmarks.load_index,
+                             priority=TaskPriority.BULK)
+        # Visits age, recompute frecency lazily
+        GLib.timeout_add_seconds(3600, self.__on_update_frecency)
         self.pages_menu = PagesMenu()
 
         # Check MOZ_PLUGIN_PATH
@@ -428,6 +441,14 @@ class Application(Gtk.Application, NightApplication):
             Logger.error("Application::__vacuum(): %s ", e)
         self.art.vacuum()
 
+    def __update_frecency(self):
+        """
+            Recompute history frecency and reload autocompletion index
+            @thread safe
+        """
+        self.history.update_frecency()
+        self.history.load_index()
+
     def __save_state(self):
         """
             Save windows state
@@ -572,9 +593,9 @@ class Application(Gtk.Application, NightApplication):
             active_window.container.add_webview_for_uri(self.start_page,
                                                         loading_type)
         if self.settings.get_value("debug"):
-            WebKit2.WebContext.get_default().get_plugins(None,
-                                                         self.__on_get_plugins,
-                                                         None)
+            self.context_pool.default.get_plugins(None,
+                                                  self.__on_get_plugins,
+                                                  None)
         Gdk.notify_startup_complete()
         active_window.present()
         return 0
@@ -711,6 +732,16 @@ class Application(Gtk.Application, NightApplication):
         if self.get_windows():
             self.active_window.present()
 
+    def __on_update_frecency(self):
+        """
+            Recompute history frecency in background
+            @return True
+        """
+        self.task_helper.run(self.__update_frecency,
+                             priority=TaskPriority.BULK,
+                             key="frecency")
+        return True
+
     def __on_shortcut_action(self, action, param):
         """
             Global shortcuts handler
@@ -723,25 +754,12 @@ class Application(Gtk.Application, NightApplication):
             window.container.add_webview_for_uri(
                 self.start_page, LoadingType.FOREGROUND)
 
-    def __on_content_blocker_set_filter(self, content_blocker, content_filter):
-        """
-            Add filter to content manager
-            @param content_blocker as ContentBlocker
-            @param content_filter as WebKit2.UserContentFilter
-        """
-        for window in self.windows:
-            for webview in window.container.webviews:
-                content_manager = webview.get_user_content_manager()
-                content_manager.add_filter(content_filter)
-
-    def __on_content_blocker_unset_filter(self, content_blocker,
-                                          content_filter):
+    def __on_content_blocker_filter(self, content_blocker, content_filter):
         """
-            Remove filter from content manager
+            Update webviews content filters
             @param content_blocker as ContentBlocker
             @param content_filter as WebKit2.UserContentFilter
         """
         for window in self.windows:
             for webview in window.container.webviews:
-                content_manager = webview.get_user_content_manager()
-                content_manager.remove_filter(content_filter)
+                webview.update_content_filters()
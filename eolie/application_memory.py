@@ -0,0 +1,134 @@
+# Copyright (c) 2017-2021 Cedric Bellegarde <cedric.bellegarde@adishatz.org>
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+from gi.repository import Gio, WebKit2
+
+import gc
+
+from eolie.utils import get_rss
+from eolie.logger import Logger
+
+
+class MemoryApplication:
+    """
+        Release memory when system is low on memory:
+        - LOW: drop in memory caches
+        - MEDIUM: clear WebKit memory cache on idle contexts
+        - CRITICAL: discard least recently used background webviews
+    """
+
+    def __init__(self):
+        """
+            Connect to memory monitor
+        """
+        self.__memory_monitor = None
+        try:
+            self.__memory_monitor = Gio.MemoryMonitor.dup_default()
+            self.__memory_monitor.connect("low-memory-warning",
+                                          self.__on_low_memory_warning)
+        except Exception as e:
+            Logger.error("MemoryApplication::__init__(): %s", e)
+
+    def release_memory(self, level):
+        """
+            Release memory for level
+            @param level as Gio.MemoryMonitorWarningLevel
+        """
+        self.__drop_caches()
+        if level >= Gio.MemoryMonitorWarningLevel.MEDIUM:
+            self.__clear_webkit_caches()
+        if level >= Gio.MemoryMonitorWarningLevel.CRITICAL:
+            self.__discard_webviews()
+
+#######################
+# PRIVATE             #
+#######################
+    def __drop_caches(self):
+        """
+            Drop in memory caches
+        """
+        rss = get_rss()
+        stylesheets_size = 0
+        popover_items = 0
+        for window in self.windows:
+            visible = window.container.webview
+            for webview in window.container.webviews:
+                if webview != visible:
+                    stylesheets_size += webview.clear_night_mode_stylesheets()
+            popover_items += window.toolbar.title.entry.popover.clear_models()
+        # GC is disabled by Application
+        gc.collect()
+        Logger.info("MemoryApplication: stylesheets: %s bytes, "
+                    "popover: %s items, process: %s bytes released",
+                    stylesheets_size, popover_items, rss - get_rss())
+
+    def __clear_webkit_caches(self):
+        """
+            Clear memory cache for contexts not loading a page
+        """
+        rss = get_rss()
+        cleared = 0
+        for context in self.context_pool.contexts:
+            idle = True
+            for window in self.windows:
+                for webview in window.container.webviews:
+                    if webview.get_context() == context and\
+                            webview.is_loading():
+                        idle = False
+                        break
+            if not idle:
+                continue
+            data_manager = context.get_property("website-data-manager")
+            data_manager.clear(WebKit2.WebsiteDataTypes.MEMORY_CACHE,
+                               0, None, self.__on_data_manager_clear, rss)
+            cleared += 1
+        Logger.info("MemoryApplication: %s WebKit memory caches clearing",
+                    cleared)
+
+    def __discard_webviews(self):
+        """
+            Discard half of background webviews, least recently used first
+        """
+        rss = get_rss()
+        count = max(1, len(self.discard_manager.loaded) // 2)
+        discarded = self.discard_manager.discard(count)
+        Logger.info("MemoryApplication: webviews: %s discarded, "
+                    "process: %s bytes released",
+                    discarded, rss - get_rss())
+
+    def __on_data_manager_clear(self, data_manager, result, rss):
+        """
+            Check for errors and log released memory
+            @param data_manager as WebKit2.WebsiteDataManager
+            @param result as Gio.AsyncResult
+            @param rss as int: process memory before clearing
+        """
+        try:
+            data_manager.clear_finish(result)
+            Logger.info("MemoryApplication: WebKit memory cache cleared, "
+                        "process: %s bytes released", rss - get_rss())
+        except Exception as e:
+            Logger.error("MemoryApplication::__on_data_manager_clear(): %s",
+                         e)
+
+    def __on_low_memory_warning(self, monitor, level):
+        """
+            Release memory
+            @param monitor as Gio.MemoryMonitor
+            @param level as Gio.MemoryMonitorWarningLevel
+        """
+        Logger.info("MemoryApplication: low memory warning: %s", level)
+        try:
+            self.release_memory(level)
+        except Exception as e:
+            Logger.error("MemoryApplication::__on_low_memory_warning(): %s",
+                         e)
@@ -72,7 +72,9 @@ class WebViewContainer:
         self._window.toolbar.title.entry.icons.show_readable_button(False)
         self._window.toolbar.title.entry.icons.set_loading(False)
         self._window.toolbar.title.entry.progress.hide()
-        if webview.get_uri() is None and\
+        if webview.discarded:
+            webview.restore()
+        elif webview.get_uri() is None and\
                 webview.uri is not None and\
                 webview.related is None:
             webview.load_uri(webview.uri)
@@ -13,18 +13,28 @@
 from gi.repository import Gio, GObject, GLib, WebKit2
 
 import json
+from itertools import chain
+from time import monotonic
 
 from eolie.helper_task import TaskHelper
 from eolie.utils import emit_signal
-from eolie.define import EOLIE_DATA_PATH, App
+from eolie.define import EOLIE_DATA_PATH, App, TaskPriority
 from eolie.content_blocker_exceptions import ContentBlockerExceptions
+from eolie.content_blocker_optimizer import ContentBlockerOptimizer
+from eolie.content_blocker_rules import RulesReader, RulesWriter
 from eolie.logger import Logger
 
 
 class ContentBlocker(GObject.Object):
     """
-        A WebKit Content Blocker
+        A WebKit Content Blocker:
+        - compiled filter is loaded from store at startup
+        - rules are only compiled again when their hash changed
+        - domain wide exceptions are not compiled, filter is just not
+          applied to pages in those domains
     """
+    # Rules used when no rules have been saved
+    DEFAULT = []
     _DB_PATH = "%s/content_blocker" % EOLIE_DATA_PATH
     _JSON_PATH = "%s/content_blocker_json" % EOLIE_DATA_PATH
     __gsignals__ = {
@@ -43,12 +53,25 @@ class ContentBlocker(GObject.Object):
             GObject.Object.__init__(self)
             self.__filter = None
             self.__name = name
+            self.__saved = False
+            self.__loading = False
+            # Save waiting for store load result
+            self.__pending_save = None
+            self.__hash_file = Gio.File.new_for_path(
+                "%s/%s.sha256" % (self._JSON_PATH, name))
+            self.__hash = None
             self.__exceptions = ContentBlockerExceptions(name)
+            # Exceptions in compiled filter
+            self.__compiled_exceptions = json.dumps(self.__exceptions.rules)
             self._cancellable = Gio.Cancellable.new()
             self._task_helper = TaskHelper()
             self.__store = WebKit2.UserContentFilterStore.new(self._DB_PATH)
             if not GLib.file_test(self._JSON_PATH, GLib.FileTest.IS_DIR):
                 GLib.mkdir_with_parents(self._JSON_PATH, 0o0750)
+            if self.__hash_file.query_exists():
+                (status, content, tag) = self.__hash_file.load_contents(None)
+                if status:
+                    self.__hash = content.decode("utf-8")
             if self.enabled:
                 self.load()
             App().settings.connect("changed::%s" % name,
@@ -60,32 +83,34 @@ class ContentBlocker(GObject.Object):
         """
             Load from store
         """
+        self.__loading = True
         self.__store.load(self.__name, self._cancellable,
                           self.__on_store_load)
 
-    def save(self, bytes):
+    def update(self, force=False):
         """
-            Save to store
+            Update current filters with saved rules and new exceptions
+            @param force as bool: compile even if exceptions did not change
         """
-        self.__store.save(self.__name, GLib.Bytes(bytes), self._cancellable,
-                          self.__on_store_save)
+        # Only domain wide exceptions changed, filter is still valid
+        if not force and json.dumps(self.__exceptions.rules) ==\
+                self.__compiled_exceptions:
+            if self.enabled and self.__filter is not None:
+                emit_signal(self, "set-filter", self.__filter)
+            return
+        self._task_helper.run(self.__update_rules,
+                              priority=TaskPriority.BULK,
+                              key=self.__class__.__name__)
 
-    def update(self):
+    def get_filter(self, netloc):
         """
-            Update current filters with new exceptions
+            Get filter to apply to a page
+            @param netloc as str
+            @return WebKit2.UserContentFilter/None
         """
-        try:
-            f = Gio.File.new_for_path(
-                "%s/%s.json" % (self._JSON_PATH, self.__name))
-            if f.query_exists():
-                (status, content, tag) = f.load_contents(None)
-                if status:
-                    rules = json.loads(content.decode("utf-8"))
-                    self._task_helper.run(self._save_rules, rules)
-            else:
-                self._task_helper.run(self._save_rules, self.DEFAULT)
-        except Exception as e:
-            Logger.error("ContentBlocker::update(): %s", e)
+        if not self.enabled or self.__exceptions.is_domain_excepted(netloc):
+            return None
+        return self.__filter
 
     def stop(self):
         """
@@ -131,44 +156,113 @@ class ContentBlocker(GObject.Object):
 #######################
     def _save_rules(self, rules):
         """
-            Save rules to file
-            @param uri as str
-            @param rules []
+            Write rules with exceptions to file and compile it
+            @param rules as iterable of {}
+            @thread safe
         """
+        f = Gio.File.new_for_path(
+            "%s/%s.compiled.json" % (self._JSON_PATH, self.__name))
+        writer = None
         try:
-            new_rules = list(rules)
-            if self.__exceptions is not None:
-                new_rules += self.__exceptions.rules
-            bytes = json.dumps(new_rules).encode("utf-8")
-            self.save(bytes)
+            exceptions = self.__exceptions.rules
+            self.__compiled_exceptions = json.dumps(exceptions)
+            writer = RulesWriter(f)
+            optimizer = ContentBlockerOptimizer()
+            for rule in optimizer.optimize(chain(rules, exceptions)):
+                writer.write(rule)
+            digest = writer.close()
+            # WebKit is not thread safe
+            GLib.idle_add(self.__save_file, f, digest)
         except Exception as e:
             Logger.error("ContentBlocker::_save_rules(): %s", e)
+            if writer is not None:
+                writer.abort()
 
 #######################
 # PRIVATE             #
 #######################
+    def __update_rules(self):
+        """
+            Compile saved rules with current exceptions
+        """
+        f = Gio.File.new_for_path(
+            "%s/%s.json" % (self._JSON_PATH, self.__name))
+        if f.query_exists():
+            self._save_rules(RulesReader(f))
+        elif self.DEFAULT:
+            self._save_rules(self.DEFAULT)
+        else:
+            Logger.info("ContentBlocker::__update_rules(): no rules for %s",
+                        self.__name)
+
+    def __save_file(self, f, digest):
+        """
+            Compile rules file, only if rules changed
+            @param f as Gio.File
+            @param digest as str
+        """
+        if digest == self.__hash:
+            # Compiled filter may be missing, wait for store
+            if self.__loading:
+                self.__pending_save = (f, digest)
+                return
+            Logger.debug("ContentBlocker::__save_file(): %s unchanged",
+                         self.__name)
+            return
+        self.__store.save_from_file(self.__name, f, self._cancellable,
+                                    self.__on_store_save, digest,
+                                    monotonic())
+
     def __on_store_load(self, store, result):
         """
-            Notify for new filter
+            Notify for new filter, compile rules if filter is missing
             @param store as WebKit2.UserContentFilterStore
             @param result as Gio.AsyncResult
-            @param encoded as str
         """
+        self.__loading = False
+        pending_save = self.__pending_save
+        self.__pending_save = None
         try:
-            self.__filter = store.save_finish(result)
+            content_filter = store.load_finish(result)
+            # A newer filter has been compiled meanwhile
+            if self.__saved:
+                return
+            self.__filter = content_filter
             if self.enabled:
                 emit_signal(self, "set-filter", self.__filter)
         except Exception as e:
             Logger.error("ContentBlocker::__on_store_load(): %s", e)
+            if self.__saved:
+                return
+            # Store does not match hash file anymore
+            self.__hash = None
+            try:
+                if self.__hash_file.query_exists():
+                    self.__hash_file.delete(None)
+            except Exception as e:
+                Logger.error("ContentBlocker::__on_store_load(): %s", e)
+            if pending_save is None:
+                self.update(True)
+            else:
+                self.__save_file(*pending_save)
 
-    def __on_store_save(self, store, result):
+    def __on_store_save(self, store, result, digest, start):
         """
             Notify for new filter
             @param store as WebKit2.UserContentFilterStore
             @param result as Gio.AsyncResult
+            @param digest as str
+            @param start as float
         """
         try:
-            self.__filter = store.load_finish(result)
+            self.__filter = store.save_finish(result)
+            Logger.debug("ContentBlocker: %s compiled in %.2fs",
+                         self.__name, monotonic() - start)
+            self.__saved = True
+            self.__hash = digest
+            self.__hash_file.replace_contents(
+                digest.encode("utf-8"), None, False,
+                Gio.FileCreateFlags.REPLACE_DESTINATION, None)
             if self.enabled:
                 emit_signal(self, "set-filter", self.__filter)
         except Exception as e:
@@ -180,7 +274,9 @@ class ContentBlocker(GObject.Object):
             @param settings as Gio.Settings
             @param value as GLib.Variant
         """
-        if self.enabled:
+        if not self.enabled:
+            emit_signal(self, "unset-filter", self.__filter)
+        elif self.__filter is None:
             self.load()
         else:
-            emit_signal(self, "unset-filter", self.__filter)
+            emit_signal(self, "set-filter", self.__filter)
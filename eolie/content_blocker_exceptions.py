@@ -20,9 +20,19 @@ from eolie.logger import Logger
 
 class ContentBlockerExceptions:
     """
-        Exception handler
+        Exception handler:
+        - exceptions are indexed by (domain, url filter, action)
+        - saved as a compact list of keys
+        - WebKit rules are only built when compiling
+        - domain wide exceptions are not part of WebKit rules, filter is
+          not applied to those domains
     """
     __JSON_PATH = "%s/content_blocker_json" % EOLIE_DATA_PATH
+    # User exceptions
+    __IGNORE = "ignore-previous-rules"
+    # Internal domains are allowed by default, a block rule disables them
+    __BLOCK = "block"
+    __ANY = ".*"
 
     def __init__(self, name):
         """
@@ -30,31 +40,36 @@ class ContentBlockerExceptions:
         """
         try:
             self.__name = name
-            self.__rules = []
+            # (domain, url_filter, action) => None, ordered set
+            self.__keys = {}
+            self.__rules = None
             f = Gio.File.new_for_path(
-                "%s/exceptions_%s.json" % (self.__JSON_PATH, self.__name))
+                "%s/exceptions_%s.keys" % (self.__JSON_PATH, self.__name))
             if f.query_exists():
                 (status, contents, tag) = f.load_contents(None)
                 if status:
-                    self.__rules = json.loads(contents.decode("utf-8"))
+                    for key in json.loads(contents.decode("utf-8")):
+                        self.__keys[tuple(key)] = None
+            else:
+                self.__import_rules()
         except Exception as e:
-            Logger.error("AdblockExceptions::__init__(): %s", e)
+            Logger.error("ContentBlockerExceptions::__init__(): %s", e)
 
     def save(self):
         """
-            Save rules to disk
+            Save exceptions to disk
         """
         try:
             f = Gio.File.new_for_path(
-                "%s/exceptions_%s.json" % (self.__JSON_PATH, self.__name))
-            content = json.dumps(self.__rules)
+                "%s/exceptions_%s.keys" % (self.__JSON_PATH, self.__name))
+            content = json.dumps(list(self.__keys.keys()))
             f.replace_contents(content.encode("utf-8"),
                                None,
                                False,
                                Gio.FileCreateFlags.REPLACE_DESTINATION,
                                None)
         except Exception as e:
-            Logger.error("AdblockExceptions::save(): %s", e)
+            Logger.error("ContentBlockerExceptions::save(): %s", e)
 
     def add_domain_exception(self, domain, url_filter=".*", internal=False):
         """
@@ -63,13 +78,7 @@ class ContentBlockerExceptions:
             @param url_filter as str
             @param internal as bool
         """
-        if internal:
-            rule = self.__get_rule_for_internal_domain(domain, url_filter)
-            if rule in self.__rules:
-                self.__rules.remove(rule)
-        else:
-            rule = self.__get_rule_for_domain(domain, url_filter)
-            self.__rules.append(rule)
+        self.add_domain_exceptions([(domain, url_filter, internal)])
 
     def remove_domain_exception(self, domain, url_filter=".*", internal=False):
         """
@@ -78,23 +87,42 @@ class ContentBlockerExceptions:
             @param url_filter as str
             @param internal as bool
         """
-        if internal:
-            rule = self.__get_rule_for_internal_domain(domain, url_filter)
-            self.__rules.append(rule)
-        else:
-            rule = self.__get_rule_for_domain(domain, url_filter)
-            if rule in self.__rules:
-                self.__rules.remove(rule)
+        self.remove_domain_exceptions([(domain, url_filter, internal)])
+
+    def add_domain_exceptions(self, exceptions):
+        """
+            Add exceptions, call ContentBlocker.update() once after
+            @param exceptions as [(domain as str, url_filter as str,
+                                   internal as bool)]
+        """
+        for (domain, url_filter, internal) in exceptions:
+            if internal:
+                self.__keys.pop((domain, url_filter, self.__BLOCK), None)
+            else:
+                self.__keys[(domain, url_filter, self.__IGNORE)] = None
+        self.__rules = None
+
+    def remove_domain_exceptions(self, exceptions):
+        """
+            Remove exceptions, call ContentBlocker.update() once after
+            @param exceptions as [(domain as str, url_filter as str,
+                                   internal as bool)]
+        """
+        for (domain, url_filter, internal) in exceptions:
+            if internal:
+                self.__keys[(domain, url_filter, self.__BLOCK)] = None
+            else:
+                self.__keys.pop((domain, url_filter, self.__IGNORE), None)
+        self.__rules = None
 
     def remove_all_domain_exceptions(self, domain):
         """
             Remove all exceptions for a domain
             @param domain as str
         """
-        for rule in list(self.__rules):
-            if rule["trigger"]["if-domain"] == ["*%s" % domain]:
-                self.remove_domain_exception(
-                    domain, rule["trigger"]["url-filter"])
+        self.remove_domain_exceptions(
+            [(key[0], key[1], False) for key in self.__keys.keys()
+             if key[0] == domain and key[2] == self.__IGNORE])
 
     def is_domain_exception(self, domain, url_filter=".*", internal=False):
         """
@@ -105,28 +133,46 @@ class ContentBlockerExceptions:
             @return bool
         """
         if internal:
-            rule = self.__get_rule_for_internal_domain(domain, url_filter)
-            return rule not in self.__rules
+            return (domain, url_filter, self.__BLOCK) not in self.__keys
         else:
-            rule = self.__get_rule_for_domain(domain, url_filter)
-            return rule in self.__rules
+            return (domain, url_filter, self.__IGNORE) in self.__keys
+
+    def is_domain_excepted(self, netloc):
+        """
+            True if netloc or one of its parent domains is excepted
+            @param netloc as str
+            @return bool
+        """
+        split = netloc.split(".")
+        for i in range(0, len(split)):
+            key = (".".join(split[i:]), self.__ANY, self.__IGNORE)
+            if key in self.__keys:
+                return True
+        return False
 
     @property
     def rules(self):
         """
-            Get rules
+            Get WebKit rules, domain wide exceptions excluded
             @return []
         """
+        if self.__rules is None:
+            self.__rules = [self.__get_rule(domain, url_filter, action)
+                            for (domain, url_filter, action)
+                            in self.__keys.keys()
+                            if url_filter != self.__ANY or
+                            action != self.__IGNORE]
         return self.__rules
 
 #######################
 # PRIVATE             #
 #######################
-    def __get_rule_for_domain(self, domain, url_filter):
+    def __get_rule(self, domain, url_filter, action):
         """
             Return rule for domain
             @param domain as str
             @param url_filter as str
+            @param action as str
             @return {}
         """
         value = "*%s" % domain
@@ -136,24 +182,24 @@ class ContentBlockerExceptions:
                 "if-domain": [value]
             },
             "action": {
-                "type": "ignore-previous-rules"
+                "type": action
             }
         }
 
-    def __get_rule_for_internal_domain(self, domain, url_filter):
-        """
-            Return rule for domain
-            @param domain as str
-            @param url_filter as str
-            @return {}
-        """
-        value = "*%s" % domain
-        return {
-            "trigger": {
-                "url-filter": url_filter,
-                "if-domain": [value]
-            },
-            "action": {
-                "type": "block"
-            }
-        }
+    def __import_rules(self):
+        """
+            Import exceptions saved as WebKit rules
+        """
+        f = Gio.File.new_for_path(
+            "%s/exceptions_%s.json" % (self.__JSON_PATH, self.__name))
+        if not f.query_exists():
+            return
+        (status, contents, tag) = f.load_contents(None)
+        if not status:
+            return
+        for rule in json.loads(contents.decode("utf-8")):
+            trigger = rule["trigger"]
+            domain = trigger["if-domain"][0][1:]
+            self.__keys[(domain, trigger["url-filter"],
+                         rule["action"]["type"])] = None
+        self.save()
@@ -10,8 +10,6 @@
 # You should have received a copy of the GNU General Public License
 # along with this program. If not, see <http://www.gnu.org/licenses/>.
 
-import json
-
 from eolie.content_blocker import ContentBlocker
 from eolie.logger import Logger
 
@@ -39,8 +37,7 @@ class MediasContentBlocker(ContentBlocker):
         """
         try:
             ContentBlocker.__init__(self, "block-medias")
-            rules = self.DEFAULT + self.exceptions.rules
-            bytes = json.dumps(rules).encode("utf-8")
-            self.save(bytes)
+            # Only compiled if rules changed since last run
+            self.update(True)
         except Exception as e:
             Logger.error("PopupsContentBlocker::__init__(): %s", e)
@@ -0,0 +1,209 @@
+# Copyright (c) 2017-2021 Cedric Bellegarde <cedric.bellegarde@adishatz.org>
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import json
+from time import monotonic
+
+from eolie.logger import Logger
+
+
+class ContentBlockerOptimizer:
+    """
+        Reduce WebKit content blocker rules before compilation:
+        - identical rules are removed
+        - rules only differing by their if-domain list are merged
+        - rules covered by a broader rule with same action are removed
+        - rules are sorted to share url-filter prefixes
+        "ignore-previous-rules" rules apply to rules before them, so rules
+        are never moved across them and are optimized as a stream
+    """
+
+    __ANY = ".*"
+    __DOMAIN_KEYS = ["if-domain", "unless-domain",
+                     "if-top-url", "unless-top-url"]
+    __LIST_KEYS = ["resource-type", "load-type"]
+    # Only broad rules restricted by these keys can cover other rules
+    __COVER_KEYS = ["url-filter", "url-filter-is-case-sensitive"] +\
+        __LIST_KEYS
+
+    def __init__(self):
+        """
+            Init optimizer
+        """
+        self.__count = 0
+        self.__optimized_count = 0
+        self.__time = 0
+
+    def optimize(self, rules):
+        """
+            Get optimized rules, only rules up to next
+            "ignore-previous-rules" rule are kept in memory
+            @param rules as iterable of {}
+            @return iterator of {}
+            @thread safe
+        """
+        self.__count = 0
+        self.__optimized_count = 0
+        self.__time = 0
+        segment = []
+        for rule in rules:
+            self.__count += 1
+            try:
+                action_type = rule["action"]["type"]
+                rule["trigger"]["url-filter"]
+            except Exception:
+                Logger.debug("ContentBlockerOptimizer: invalid rule %s", rule)
+                continue
+            if action_type == "ignore-previous-rules":
+                yield from self.__optimize_segment(segment)
+                self.__optimized_count += 1
+                yield rule
+                segment = []
+            else:
+                segment.append(rule)
+        yield from self.__optimize_segment(segment)
+        Logger.debug("ContentBlockerOptimizer: %s rules -> %s in %.2fs",
+                     self.__count, self.__optimized_count, self.__time)
+
+    @property
+    def count(self):
+        """
+            Rules count before last optimization
+            @return int
+        """
+        return self.__count
+
+    @property
+    def optimized_count(self):
+        """
+            Rules count after last optimization
+            @return int
+        """
+        return self.__optimized_count
+
+    @property
+    def time(self):
+        """
+            Last optimization duration
+            @return float (seconds)
+        """
+        return self.__time
+
+#######################
+# PRIVATE             #
+#######################
+    def __get_key(self, value):
+        """
+            Get a hashable key for a JSON value
+            @param value as {}
+            @return str
+        """
+        return json.dumps(value, sort_keys=True)
+
+    def __optimize_segment(self, rules):
+        """
+            Optimize rules without "ignore-previous-rules" between them
+            @param rules as []
+            @return []
+        """
+        start = monotonic()
+        rules = self.__merge_domains(rules)
+        rules = self.__remove_covered(rules)
+        # Group rules by action, rules without domain first, then by filter
+        rules.sort(key=lambda rule: (
+            self.__get_key(rule["action"]),
+            bool(set(self.__DOMAIN_KEYS) & rule["trigger"].keys()),
+            rule["trigger"].get("url-filter", "")))
+        self.__optimized_count += len(rules)
+        self.__time += monotonic() - start
+        return rules
+
+    def __merge_domains(self, rules):
+        """
+            Remove identical rules and merge if-domain lists
+            @param rules as []
+            @return []
+        """
+        merged = {}
+        for rule in rules:
+            trigger = dict(rule["trigger"])
+            domains = trigger.pop("if-domain", None)
+            key = (self.__get_key(trigger),
+                   self.__get_key(rule["action"]),
+                   domains is None)
+            if key not in merged.keys():
+                merged[key] = {"trigger": dict(rule["trigger"]),
+                               "action": rule["action"]}
+            elif domains is not None:
+                trigger = merged[key]["trigger"]
+                trigger["if-domain"] = sorted(
+                    set(trigger["if-domain"]) | set(domains))
+        return list(merged.values())
+
+    def __covers(self, broad, rule):
+        """
+            True if broad rule matches all requests matched by rule
+            @param broad as {}: rule without domain conditions
+            @param rule as {}
+            @return bool
+        """
+        broad_trigger = broad["trigger"]
+        trigger = rule["trigger"]
+        if broad_trigger.keys() - set(self.__COVER_KEYS):
+            return False
+        if broad_trigger.get("url-filter") != self.__ANY:
+            if broad_trigger.get("url-filter") != trigger.get("url-filter"):
+                return False
+            if broad_trigger.get("url-filter-is-case-sensitive", False) !=\
+                    trigger.get("url-filter-is-case-sensitive", False):
+                return False
+        for key in self.__LIST_KEYS:
+            if key not in broad_trigger.keys():
+                continue
+            if key not in trigger.keys() or\
+                    not set(trigger[key]) <= set(broad_trigger[key]):
+                return False
+        return True
+
+    def __remove_covered(self, rules):
+        """
+            Remove rules covered by a broader rule with same action
+            @param rules as []
+            @return []
+        """
+        # (action, url-filter) => [(position, broad rule)]
+        broads = {}
+        for (position, rule) in enumerate(rules):
+            trigger = rule["trigger"]
+            if set(self.__DOMAIN_KEYS) & trigger.keys():
+                continue
+            key = (self.__get_key(rule["action"]), trigger.get("url-filter"))
+            broads.setdefault(key, []).append((position, rule))
+        kept = []
+        for (position, rule) in enumerate(rules):
+            action = self.__get_key(rule["action"])
+            candidates = broads.get((action, rule["trigger"].get(
+                "url-filter")), []) + broads.get((action, self.__ANY), [])
+            covered = False
+            for (broad_position, broad) in candidates:
+                if broad_position == position or\
+                        not self.__covers(broad, rule):
+                    continue
+                # Two rules covering each other: keep the first one
+                if broad_position < position or\
+                        set(self.__DOMAIN_KEYS) & rule["trigger"].keys() or\
+                        not self.__covers(rule, broad):
+                    covered = True
+                    break
+            if not covered:
+                kept.append(rule)
+        return kept
@@ -11,21 +11,15 @@
 # along with this program. If not, see <http://www.gnu.org/licenses/>.
 
 from gi.repository import Gio, GLib
-from gi.repository.Gio import FILE_ATTRIBUTE_STANDARD_NAME, \
-                              FILE_ATTRIBUTE_TIME_MODIFIED
 
-import json
 from time import time
 
 from eolie.content_blocker import ContentBlocker
+from eolie.content_blocker_updater import ContentBlockerUpdater
 from eolie.define import PHISHING_URI, App
 from eolie.logger import Logger
 
 
-SCAN_QUERY_INFO = "{},{}".format(FILE_ATTRIBUTE_STANDARD_NAME,
-                                 FILE_ATTRIBUTE_TIME_MODIFIED)
-
-
 class PhishingContentBlocker(ContentBlocker):
     """
         A WebKit Content Blocker for phishing
@@ -37,18 +31,13 @@ class PhishingContentBlocker(ContentBlocker):
         """
         try:
             ContentBlocker.__init__(self, "block-phishing")
-            f = Gio.File.new_for_path(
-                    "%s/block-phishing.json" % self._JSON_PATH)
-            if f.query_exists():
-                info = f.query_info(SCAN_QUERY_INFO,
-                                    Gio.FileQueryInfoFlags.NONE,
-                                    None)
-                mtime = int(info.get_attribute_as_string("time::modified"))
-            else:
-                mtime = 0
+            self.__updater = ContentBlockerUpdater("block-phishing",
+                                                   [PHISHING_URI],
+                                                   self._JSON_PATH,
+                                                   self._task_helper)
             if App().settings.get_value("block-phishing"):
                 GLib.timeout_add_seconds(7200, self.__download_task, True)
-                if time() - mtime > 7200:
+                if time() - self.__updater.mtime > 7200:
                     GLib.timeout_add_seconds(10, self.__download_task, False)
         except Exception as e:
             Logger.error("PhishingContentBlocker::__init__(): %s", e)
@@ -61,44 +50,14 @@ class PhishingContentBlocker(ContentBlocker):
             Update database from the web, for timeout_add()
             @param loop as bool
         """
-        if not Gio.NetworkMonitor.get_default().get_network_metered():
-            self.__download_uri(PHISHING_URI)
+        network_monitor = Gio.NetworkMonitor.get_default()
+        if network_monitor.get_network_available() and\
+                not network_monitor.get_network_metered():
+            self.__updater.update(self._cancellable, self.__on_rules_updated)
         return loop
 
-    def __download_uri(self, uri):
+    def __on_rules_updated(self):
         """
-            Update database from the web
-            @param uris as [str]
-            @param data as []
-        """
-        if not Gio.NetworkMonitor.get_default().get_network_available():
-            return
-        self._task_helper.load_uri_content(uri,
-                                           self._cancellable,
-                                           self.__on_load_uri_content)
-
-    def __on_load_uri_content(self, uri, status, content):
+            Compile new rules
         """
-            Save loaded values
-            @param uri as str
-            @param status as bool
-            @param content as bytes
-        """
-        try:
-            Logger.debug(
-                "PhishingContentBlocker::__on_load_uri_content(): %s", uri)
-            if status:
-                rules = json.loads(content.decode("utf-8"))
-                # Save to sources
-                f = Gio.File.new_for_path(
-                    "%s/block-phishing.json" % self._JSON_PATH)
-                content = json.dumps(rules).encode("utf-8")
-                f.replace_contents(content,
-                                   None,
-                                   False,
-                                   Gio.FileCreateFlags.REPLACE_DESTINATION,
-                                   None)
-                self._task_helper.run(self._save_rules, rules)
-        except Exception as e:
-            Logger.error(
-                "PhishingContentBlocker::__on_load_uri_content(): %s", e)
+        self.update(True)
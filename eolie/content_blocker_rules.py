@@ -0,0 +1,166 @@
+# Copyright (c) 2017-2021 Cedric Bellegarde <cedric.bellegarde@adishatz.org>
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+from gi.repository import Gio
+
+import json
+import codecs
+from hashlib import sha256, blake2b
+
+
+class RulesReader:
+    """
+        Iterate over rules of a JSON array file without loading it
+    """
+
+    __CHUNK_SIZE = 65536
+    __SEPARATORS = " \t\r\n,["
+
+    def __init__(self, f):
+        """
+            Init reader
+            @param f as Gio.File
+        """
+        self.__file = f
+
+    def __iter__(self):
+        """
+            Parse file chunk by chunk, rules are JSON objects
+            @return iterator of {}
+        """
+        decoder = json.JSONDecoder()
+        utf8 = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        stream = self.__file.read(None)
+        try:
+            buffer = ""
+            position = 0
+            eof = False
+            while True:
+                while position < len(buffer) and\
+                        buffer[position] in self.__SEPARATORS:
+                    position += 1
+                if position < len(buffer):
+                    if buffer[position] == "]":
+                        return
+                    # Fails until buffer contains the whole object
+                    try:
+                        (rule, position) = decoder.raw_decode(buffer,
+                                                              position)
+                        yield rule
+                        continue
+                    except ValueError:
+                        if eof:
+                            raise
+                elif eof:
+                    return
+                data = stream.read_bytes(self.__CHUNK_SIZE, None).get_data()
+                eof = not data
+                buffer = buffer[position:] + utf8.decode(data, eof)
+                position = 0
+        finally:
+            stream.close(None)
+
+
+class RulesWriter:
+    """
+        Write rules to a JSON array file:
+        - rules are written in a compact canonical form
+        - identical rules are only written once between two
+          ignore-previous-rules rules
+        - file is only replaced when writer is closed
+    """
+
+    __BUFFER_SIZE = 65536
+
+    def __init__(self, f):
+        """
+            Init writer
+            @param f as Gio.File
+        """
+        self.__stream = f.replace(None, False,
+                                  Gio.FileCreateFlags.REPLACE_DESTINATION,
+                                  None)
+        # 8 bytes digests of written rules
+        self.__digests = set()
+        self.__sha256 = sha256()
+        self.__buffer = ["["]
+        self.__buffer_size = 1
+        self.__count = 0
+
+    def write(self, rule):
+        """
+            Write rule if not already written since last exception
+            @param rule as {}
+            @return bool
+        """
+        value = json.dumps(rule, sort_keys=True, separators=(",", ":"))
+        digest = blake2b(value.encode("utf-8"), digest_size=8).digest()
+        if digest in self.__digests:
+            return False
+        # Rules before an exception must apply again after it
+        if rule.get("action", {}).get("type") == "ignore-previous-rules":
+            self.__digests = set()
+        else:
+            self.__digests.add(digest)
+        if self.__count != 0:
+            value = "," + value
+        self.__buffer.append(value)
+        self.__buffer_size += len(value)
+        self.__count += 1
+        if self.__buffer_size > self.__BUFFER_SIZE:
+            self.__flush()
+        return True
+
+    def close(self):
+        """
+            Finish file
+            @return sha256 of file content as str
+        """
+        self.__buffer.append("]")
+        self.__flush()
+        self.__stream.close(None)
+        self.__digests = set()
+        return self.__sha256.hexdigest()
+
+    def abort(self):
+        """
+            Keep previous file
+        """
+        # A cancelled close does not replace destination
+        cancellable = Gio.Cancellable.new()
+        cancellable.cancel()
+        try:
+            self.__stream.close(cancellable)
+        except Exception:
+            pass
+        self.__digests = set()
+
+    @property
+    def count(self):
+        """
+            Written rules count
+            @return int
+        """
+        return self.__count
+
+#######################
+# PRIVATE             #
+#######################
+    def __flush(self):
+        """
+            Write buffer to file
+        """
+        data = "".join(self.__buffer).encode("utf-8")
+        self.__sha256.update(data)
+        self.__stream.write_all(data, None)
+        self.__buffer = []
+        self.__buffer_size = 0
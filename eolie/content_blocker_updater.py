@@ -0,0 +1,259 @@
+# Copyright (c) 2017-2021 Cedric Bellegarde <cedric.bellegarde@adishatz.org>
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+from gi.repository import Gio, GLib
+
+import json
+from hashlib import sha256
+
+from eolie.http_client import FileSink
+from eolie.content_blocker_rules import RulesReader, RulesWriter
+from eolie.define import TaskPriority
+from eolie.logger import Logger
+
+
+class SourceSink(FileSink):
+    """
+        Write a rules source to disk and keep its validators
+    """
+
+    def __init__(self, path):
+        """
+            Init sink
+            @param path as str
+        """
+        FileSink.__init__(self, path)
+        self.status_code = 0
+        self.validators = {}
+        self.loaded = False
+        self.changed = False
+
+    def set_response(self, status_code, headers):
+        """
+            Keep status and validators
+            @param status_code as int
+            @param headers as Soup.MessageHeaders
+        """
+        self.status_code = status_code
+        for name in ["ETag", "Last-Modified"]:
+            value = headers.get_one(name)
+            if value is not None:
+                self.validators[name] = value
+
+
+class ContentBlockerUpdater:
+    """
+        Update content blocker rules from remote sources:
+        - sources are fetched concurrently
+        - ETag/Last-Modified validators are sent, unchanged sources
+          are not downloaded again
+        - sources are merged to one file as a stream, without duplicates
+        - callback is only run when merged rules hash changed
+    """
+
+    __VALIDATORS = {"ETag": "If-None-Match",
+                    "Last-Modified": "If-Modified-Since"}
+
+    def __init__(self, name, uris, path, task_helper):
+        """
+            Init updater
+            @param name as str
+            @param uris as [str]
+            @param path as str: rules directory
+            @param task_helper as TaskHelper
+        """
+        self.__name = name
+        self.__uris = uris
+        self.__path = path
+        self.__task_helper = task_helper
+        self.__sources_path = "%s/sources" % path
+        self.__state_file = Gio.File.new_for_path(
+            "%s/%s.state" % (self.__sources_path, name))
+        self.__state = None
+
+    def update(self, cancellable, callback, *args):
+        """
+            Fetch sources, callback only called if rules changed
+            @param cancellable as Gio.Cancellable
+            @param callback as function
+            @callback (*args)
+        """
+        try:
+            if not GLib.file_test(self.__sources_path,
+                                  GLib.FileTest.IS_DIR):
+                GLib.mkdir_with_parents(self.__sources_path, 0o0750)
+            state = self.__get_state()
+            sinks = {}
+            headers = {}
+            for uri in self.__uris:
+                source = self.__get_source_file(uri)
+                sinks[uri] = SourceSink(source.get_path())
+                headers[uri] = []
+                if source.query_exists():
+                    validators = state["uris"].get(uri, {})
+                    for (name, value) in validators.items():
+                        headers[uri].append((self.__VALIDATORS[name], value))
+            # All sinks must exist before first callback
+            for uri in self.__uris:
+                self.__task_helper.http_client.load(uri, sinks[uri],
+                                                    headers[uri],
+                                                    cancellable,
+                                                    self.__on_load,
+                                                    sinks, cancellable,
+                                                    callback, args)
+        except Exception as e:
+            Logger.error("ContentBlockerUpdater::update(): %s", e)
+
+    @property
+    def mtime(self):
+        """
+            Last update check time
+            @return int
+        """
+        try:
+            if self.__state_file.query_exists():
+                info = self.__state_file.query_info(
+                    Gio.FILE_ATTRIBUTE_TIME_MODIFIED,
+                    Gio.FileQueryInfoFlags.NONE,
+                    None)
+                return int(info.get_attribute_as_string(
+                    Gio.FILE_ATTRIBUTE_TIME_MODIFIED))
+        except Exception as e:
+            Logger.error("ContentBlockerUpdater::mtime(): %s", e)
+        return 0
+
+#######################
+# PRIVATE             #
+#######################
+    def __get_state(self):
+        """
+            Get validators and rules hash from disk
+            @return {"hash": str, "uris": {str: {str: str}}}
+        """
+        if self.__state is None:
+            self.__state = {"hash": "", "uris": {}}
+            try:
+                if self.__state_file.query_exists():
+                    (status, content, tag) =\
+                        self.__state_file.load_contents(None)
+                    if status:
+                        self.__state.update(
+                            json.loads(content.decode("utf-8")))
+            except Exception as e:
+                Logger.error("ContentBlockerUpdater::__get_state(): %s", e)
+        return self.__state
+
+    def __save_state(self):
+        """
+            Save validators and rules hash to disk
+        """
+        try:
+            content = json.dumps(self.__get_state()).encode("utf-8")
+            self.__state_file.replace_contents(
+                content, None, False,
+                Gio.FileCreateFlags.REPLACE_DESTINATION, None)
+        except Exception as e:
+            Logger.error("ContentBlockerUpdater::__save_state(): %s", e)
+
+    def __get_source_file(self, uri):
+        """
+            Get file for source uri
+            @param uri as str
+            @return Gio.File
+        """
+        digest = sha256(uri.encode("utf-8")).hexdigest()
+        return Gio.File.new_for_path("%s/%s.json" % (self.__sources_path,
+                                                     digest))
+
+    def __merge(self, changed):
+        """
+            Merge sources, rules are streamed from sources to merged file
+            @param changed as bool: a source has been downloaded
+            @return hash as str, "" if rules did not change, None on error
+            @thread safe
+        """
+        writer = None
+        try:
+            f = Gio.File.new_for_path("%s/%s.json" % (self.__path,
+                                                      self.__name))
+            if not changed and f.query_exists():
+                return ""
+            writer = RulesWriter(f)
+            for uri in self.__uris:
+                source = self.__get_source_file(uri)
+                if source.query_exists():
+                    for rule in RulesReader(source):
+                        writer.write(rule)
+            if writer.count == 0:
+                writer.abort()
+                return ""
+            digest = writer.close()
+            if digest == self.__get_state()["hash"]:
+                return ""
+            return digest
+        except Exception as e:
+            Logger.error("ContentBlockerUpdater::__merge(): %s", e)
+            if writer is not None:
+                writer.abort()
+        return None
+
+    def __on_load(self, uri, status, result, sinks, cancellable,
+                  callback, args):
+        """
+            Merge sources once all are loaded
+            @param uri as str
+            @param status as bool
+            @param result as Gio.File/None
+            @param sinks as {str: SourceSink}
+            @param cancellable as Gio.Cancellable
+            @param callback as function
+            @param args as []
+        """
+        sink = sinks[uri]
+        sink.loaded = True
+        sink.changed = status
+        if status:
+            Logger.debug("ContentBlockerUpdater: %s updated", uri)
+        elif sink.status_code == 304:
+            Logger.debug("ContentBlockerUpdater: %s not modified", uri)
+        if [sink for sink in sinks.values() if not sink.loaded] or\
+                cancellable.is_cancelled():
+            return
+        # Validators are saved once sources are merged, else unmerged
+        # sources would never be downloaded again
+        validators = {uri: sink.validators for (uri, sink) in sinks.items()
+                      if sink.changed}
+        self.__task_helper.run(self.__merge, bool(validators),
+                               callback=(self.__on_merge, validators,
+                                         callback, args),
+                               priority=TaskPriority.BULK,
+                               key="%s-merge" % self.__name)
+
+    def __on_merge(self, digest, validators, callback, args):
+        """
+            Save state and notify rules changed
+            @param digest as str/None
+            @param validators as {str: {str: str}}
+            @param callback as function
+            @param args as []
+        """
+        # Merge failed or cancelled, sources will be downloaded again
+        if digest is None:
+            return
+        self.__get_state()["uris"].update(validators)
+        if not digest:
+            Logger.debug("ContentBlockerUpdater: %s unchanged", self.__name)
+            self.__save_state()
+            return
+        self.__get_state()["hash"] = digest
+        self.__save_state()
+        callback(*args)
@@ -32,6 +32,7 @@ class Context:
         """
         self.__context = context
         self.__task_helper = TaskHelper()
+        self.__cookie_storage_id = None
         if not context.is_ephemeral():
             context.set_cache_model(WebKit2.CacheModel.WEB_BROWSER)
             context.set_favicon_database_directory(App().favicons_path)
@@ -51,17 +52,24 @@ class Context:
         context.register_uri_scheme("accept", self.__on_accept_scheme)
         context.get_security_manager().register_uri_scheme_as_local("populars")
         context.set_sandbox_enabled(True)
-        values = App().settings.get_value("notification-domains")
-        try:
-            origins = []
-            for value in values:
-                (scheme, netloc) = value.split(";")
-                origins.append(WebKit2.SecurityOrigin(scheme, netloc, 0))
-            context.initialize_notification_permissions(origins, [])
-        except Exception as e:
-            Logger.error("Context::__init__(): %s", e)
+        # Context is shared between webviews, permissions are requested
+        # by WebKit for each new web process
+        context.connect("initialize-notification-permissions",
+                        self.__on_initialize_notification_permissions)
         # We allow DownloadPopover to connect before default context
         context.connect_after("download-started", self.__on_download_started)
+        if not context.is_ephemeral():
+            self.__cookie_storage_id = App().settings.connect(
+                "changed::cookie-storage",
+                self.__on_cookie_storage_changed)
+
+    def stop(self):
+        """
+            Stop handling settings changes
+        """
+        if self.__cookie_storage_id is not None:
+            App().settings.disconnect(self.__cookie_storage_id)
+            self.__cookie_storage_id = None
 
 #######################
 # PRIVATE             #
@@ -182,6 +190,32 @@ class Context:
             parsed.netloc.split(":")[0])
         view.load_uri(uri)
 
+    def __on_initialize_notification_permissions(self, context):
+        """
+            Set allowed notification origins
+            @param context as WebKit2.WebContext
+        """
+        values = App().settings.get_value("notification-domains")
+        try:
+            origins = []
+            for value in values:
+                (scheme, netloc) = value.split(";")
+                origins.append(WebKit2.SecurityOrigin(scheme, netloc, 0))
+            context.initialize_notification_permissions(origins, [])
+        except Exception as e:
+            Logger.error(
+                "Context::__on_initialize_notification_permissions(): %s", e)
+
+    def __on_cookie_storage_changed(self, settings, value):
+        """
+            Update cookie policy
+            @param settings as Gio.Settings
+            @param value as GLib.Variant
+        """
+        cookie_manager = self.__context.get_cookie_manager()
+        cookie_manager.set_accept_policy(
+            App().settings.get_enum("cookie-storage"))
+
     def __on_download_started(self, context, download):
         """
             A new download started, handle signals
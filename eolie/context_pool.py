@@ -0,0 +1,160 @@
+# Copyright (c) 2017-2021 Cedric Bellegarde <cedric.bellegarde@adishatz.org>
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+from gi.repository import WebKit2
+
+from eolie.define import App
+from eolie.context import Context
+from eolie.logger import Logger
+
+
+class ContextPool:
+    """
+        Share WebKit2.WebContext between webviews:
+        - one persistent context shared by all windows (default)
+        - up to "max-web-contexts" contexts per window
+        - one ephemeral context per private session
+    """
+
+    def __init__(self):
+        """
+            Init pool
+        """
+        self.__default = None
+        self.__ephemeral = None
+        # Window => [WebKit2.WebContext]
+        self.__groups = {}
+        # WebKit2.WebContext => Context
+        self.__handlers = {}
+        # WebKit2.WebContext => webviews count
+        self.__usage = {}
+
+    def get(self, window):
+        """
+            Get a persistent context for window
+            @param window as Window
+            @return WebKit2.WebContext
+        """
+        max_contexts = App().settings.get_value(
+            "max-web-contexts").get_int32()
+        if max_contexts <= 1:
+            if self.__default is None:
+                self.__default = self.__new_context()
+            return self.__default
+        if window not in self.__groups.keys():
+            self.__groups[window] = []
+            window.connect("destroy", self.__on_window_destroy)
+        contexts = self.__groups[window]
+        if len(contexts) < max_contexts:
+            context = self.__new_context()
+            contexts.append(context)
+        else:
+            context = min(contexts, key=lambda x: self.__usage[x])
+        return context
+
+    def get_ephemeral(self):
+        """
+            Get ephemeral context for current private session
+            @return WebKit2.WebContext
+        """
+        if self.__ephemeral is None:
+            self.__ephemeral = self.__new_context(True)
+        return self.__ephemeral
+
+    def add_webview(self, webview):
+        """
+            Track webview context usage
+            @param webview as WebView
+        """
+        context = webview.get_context()
+        if context in self.__usage.keys():
+            self.__usage[context] += 1
+            webview.connect("destroy", self.__on_webview_destroy, context)
+
+    def clear_ephemeral(self):
+        """
+            End current private session
+        """
+        if self.__ephemeral is not None:
+            self.__remove_context(self.__ephemeral)
+            self.__ephemeral = None
+
+    @property
+    def default(self):
+        """
+            Get default persistent context
+            @return WebKit2.WebContext
+        """
+        if self.__default is None:
+            self.__default = self.__new_context()
+        return self.__default
+
+    @property
+    def contexts(self):
+        """
+            Get all pooled contexts
+            @return [WebKit2.WebContext]
+        """
+        return list(self.__usage.keys())
+
+#######################
+# PRIVATE             #
+#######################
+    def __new_context(self, ephemeral=False):
+        """
+            Create a new context and setup it
+            @param ephemeral as bool
+            @return WebKit2.WebContext
+        """
+        if ephemeral:
+            context = WebKit2.WebContext.new_ephemeral()
+        else:
+            context = WebKit2.WebContext(
+                process_swap_on_cross_site_navigation_enabled=True)
+        self.__handlers[context] = Context(context)
+        self.__usage[context] = 0
+        Logger.debug("ContextPool::__new_context(): %s contexts",
+                     len(self.__usage))
+        return context
+
+    def __remove_context(self, context):
+        """
+            Forget context, will be freed with its last webview
+            @param context as WebKit2.WebContext
+        """
+        if context in self.__usage.keys():
+            del self.__usage[context]
+        if context in self.__handlers.keys():
+            self.__handlers[context].stop()
+            del self.__handlers[context]
+
+    def __on_webview_destroy(self, webview, context):
+        """
+            Update context usage
+            @param webview as WebView
+            @param context as WebKit2.WebContext
+        """
+        if context in self.__usage.keys():
+            self.__usage[context] -= 1
+            # Private session ended
+            if context == self.__ephemeral and self.__usage[context] == 0:
+                self.clear_ephemeral()
+
+    def __on_window_destroy(self, window):
+        """
+            Forget window contexts
+            @param window as Window
+        """
+        if window in self.__groups.keys():
+            for context in self.__groups[window]:
+                self.__remove_context(context)
+            del self.__groups[window]
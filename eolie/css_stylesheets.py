@@ -125,6 +125,18 @@ class StyleSheets(GObject.Object):
         except Exception as e:
             Logger.error("StyleSheets::remove_cache(): %s", e)
 
+    def clear(self):
+        """
+            Drop in memory stylesheets, they will be loaded again from cache
+            @return freed bytes as int
+        """
+        size = 0
+        for stylesheet in self.__stylesheets.values():
+            if stylesheet.contents is not None:
+                size += len(stylesheet.contents)
+        self.__stylesheets = {}
+        return size
+
     def reset(self):
         """
             Reset stylesheet state
@@ -16,6 +16,7 @@ import sqlite3
 import itertools
 from urllib.parse import urlparse
 from threading import Lock
+from time import time
 
 from eolie.utils import noaccents, get_random_string
 from eolie.define import EOLIE_DATA_PATH, Type
@@ -23,6 +24,7 @@ from eolie.localized import LocalizedCollation
 from eolie.sqlcursor import SqlCursor
 from eolie.logger import Logger
 from eolie.database_upgrade import DatabaseUpgrade
+from eolie.uri_index import UriIndex
 
 
 class DatabaseBookmarks:
@@ -61,6 +63,29 @@ class DatabaseBookmarks:
                                         parent_guid TEXT NOT NULL,
                                         parent_name TEXT NOT NULL)'''
 
+    # Full text index, accents removed with noaccents()
+    __create_bookmarks_fts = [
+        """CREATE VIRTUAL TABLE bookmarks_fts USING fts5(
+                                               title, uri,
+                                               tokenize='trigram')""",
+        """CREATE TRIGGER bookmarks_fts_insert AFTER INSERT ON bookmarks
+           BEGIN
+               INSERT INTO bookmarks_fts (rowid, title, uri)
+               VALUES (new.rowid, noaccents(new.title), noaccents(new.uri));
+           END""",
+        """CREATE TRIGGER bookmarks_fts_delete AFTER DELETE ON bookmarks
+           BEGIN
+               DELETE FROM bookmarks_fts WHERE rowid=old.rowid;
+           END""",
+        """CREATE TRIGGER bookmarks_fts_update
+           AFTER UPDATE OF title, uri ON bookmarks
+           BEGIN
+               UPDATE bookmarks_fts SET title=noaccents(new.title),
+                                        uri=noaccents(new.uri)
+               WHERE rowid=new.rowid;
+           END"""
+    ]
+
     def __init__(self):
         """
             Create database tables or manage update if needed
@@ -78,10 +103,17 @@ class DatabaseBookmarks:
                     sql.execute(self.__create_bookmarks_tags)
                     sql.execute(self.__create_parents)
                     sql.execute("PRAGMA user_version=%s" % upgrade.version)
+                with SqlCursor(self, True) as sql:
+                    self.create_fts(sql)
             except Exception as e:
                 Logger.error("DatabaseBookmarks::__init__(): %s", e)
         else:
             upgrade.upgrade(self)
+        with SqlCursor(self) as sql:
+            result = sql.execute("SELECT name FROM sqlite_master\
+                                  WHERE name='bookmarks_fts'")
+            self.__has_fts = result.fetchone() is not None
+        self.__index = UriIndex()
 
     def add(self, title, uri, guid, tags, atime=0):
         """
@@ -115,6 +147,7 @@ class DatabaseBookmarks:
                 sql.execute("INSERT INTO bookmarks_tags\
                              (bookmark_id, tag_id) VALUES (?, ?)",
                             (bookmarks_id, tag_id))
+            self.__index.add(uri.rstrip('/'), 1)
             return bookmarks_id
 
     def remove(self, bookmark_id):
@@ -123,6 +156,11 @@ class DatabaseBookmarks:
             @param bookmark id as int
         """
         with SqlCursor(self, True) as sql:
+            result = sql.execute("SELECT uri, popularity FROM bookmarks\
+                                  WHERE rowid=?", (bookmark_id,))
+            v = result.fetchone()
+            if v is not None:
+                self.__index.remove(v[0], v[1] + 1)
             sql.execute("DELETE FROM bookmarks\
                          WHERE rowid=?", (bookmark_id,))
             sql.execute("DELETE FROM bookmarks_tags\
@@ -594,6 +632,12 @@ class DatabaseBookmarks:
             @param uri as str
         """
         with SqlCursor(self, True) as sql:
+            result = sql.execute("SELECT uri, popularity FROM bookmarks\
+                                  WHERE rowid=?", (bookmark_id,))
+            v = result.fetchone()
+            if v is not None:
+                self.__index.remove(v[0], v[1] + 1)
+                self.__index.add(uri.rstrip('/'), v[1] + 1)
             sql.execute("UPDATE bookmarks\
                          SET uri=?\
                          WHERE rowid=?", (uri.rstrip('/'), bookmark_id,))
@@ -681,6 +725,8 @@ class DatabaseBookmarks:
             @param ssl_force as bool
             @return str
         """
+        if self.__index.loaded:
+            return self.__index.match(uri, ssl_force)
         with SqlCursor(self) as sql:
             if ssl_force:
                 filter = ("https://%{}%".format(uri),)
@@ -696,6 +742,20 @@ class DatabaseBookmarks:
                 return v[0]
             return None
 
+    def load_index(self):
+        """
+            Load uris in autocompletion index
+            @thread safe
+        """
+        try:
+            with SqlCursor(self) as sql:
+                result = sql.execute("SELECT uri, popularity + 1\
+                                      FROM bookmarks\
+                                      WHERE guid != uri")
+                self.__index.set_items(result)
+        except Exception as e:
+            Logger.error("DatabaseBookmarks::load_index(): %s", e)
+
     def set_tag_title(self, tag_id, title):
         """
             Set tag id title
@@ -718,6 +778,7 @@ class DatabaseBookmarks:
             if v is not None:
                 sql.execute("UPDATE bookmarks set popularity=?\
                              WHERE uri=?", (v[0] + 1, uri))
+                self.__index.add(uri, 1)
 
     def add_tag_to(self, tag_id, bookmark_id):
         """
@@ -937,6 +998,208 @@ class DatabaseBookmarks:
         except Exception as e:
             Logger.error("DatabaseBookmarks::import_firefox(): %s", e)
 
+    def apply_sync_records(self, records):
+        """
+            Apply Firefox Sync bookmarks records in one transaction
+            Rows are loaded with one query, writes are batched
+            @param records as [{}]: at most 400 records
+            @return folders children guids as [[str]]
+        """
+        guids = [record["payload"]["id"] for record in records]
+        uris = [record["payload"]["bmkUri"].rstrip("/")
+                for record in records
+                if isinstance(record["payload"].get("bmkUri"), str)]
+        children = []
+        with SqlCursor(self, True) as sql:
+            result = sql.execute("SELECT rowid, guid, uri, mtime, popularity\
+                                  FROM bookmarks\
+                                  WHERE guid IN (%s) OR uri IN (%s)" % (
+                                      self.__get_placeholders(guids),
+                                      self.__get_placeholders(uris)),
+                                 guids + uris)
+            rows = {}
+            by_guid = {}
+            by_uri = {}
+            for row in result:
+                rows[row[0]] = row
+                by_guid[row[1]] = row[0]
+                by_uri[row[2]] = row[0]
+            result = sql.execute("SELECT bookmarks_tags.bookmark_id,\
+                                         tags.title\
+                                  FROM tags, bookmarks_tags\
+                                  WHERE bookmarks_tags.tag_id=tags.rowid\
+                                  AND bookmarks_tags.bookmark_id IN (%s)" %
+                                 self.__get_placeholders(rows),
+                                 list(rows.keys()))
+            # Bookmark id or guid for new bookmarks => tags
+            tags = {}
+            for (bookmark_id, tag) in result:
+                tags.setdefault(bookmark_id, set()).add(tag)
+            current_tags = {key: set(value) for (key, value) in tags.items()}
+            removed = set()
+            updates = {}
+            new_guids = {}
+            # guid => (title, uri, guid)
+            inserts = {}
+            parents = {}
+            mtimes = {}
+            for record in records:
+                bookmark = record["payload"]
+                keys = bookmark.keys()
+                bookmark_id = by_guid.get(bookmark["id"], None)
+                # Nothing to apply, continue
+                if bookmark_id in rows.keys() and\
+                        rows[bookmark_id][3] >= record["modified"]:
+                    continue
+                # Deleted bookmark
+                if "deleted" in keys:
+                    if bookmark_id is not None:
+                        del by_guid[bookmark["id"]]
+                        if bookmark_id in rows.keys():
+                            removed.add(bookmark_id)
+                            by_uri.pop(rows[bookmark_id][2], None)
+                        elif bookmark_id in inserts.keys():
+                            by_uri.pop(inserts[bookmark_id][1], None)
+                        for changes in [updates, new_guids, inserts,
+                                        tags, parents, mtimes]:
+                            changes.pop(bookmark_id, None)
+                    continue
+                # Keep folder only for firefox compatiblity
+                elif bookmark.get("type", None) == "folder"\
+                        and bookmark["id"] is not None\
+                        and bookmark["title"]:
+                    if bookmark_id is None:
+                        bookmark_id = bookmark["id"]
+                        by_guid[bookmark_id] = bookmark_id
+                        inserts[bookmark_id] = (bookmark["title"],
+                                                bookmark["id"],
+                                                bookmark["id"])
+                    # Will calculate position later
+                    if "children" in keys:
+                        children.append(bookmark["children"])
+                # We have a bookmark, add it
+                elif bookmark.get("type", None) == "bookmark"\
+                        and bookmark["id"] is not None\
+                        and bookmark["title"]:
+                    uri = bookmark["bmkUri"].rstrip("/")
+                    # Update bookmark
+                    if bookmark_id is not None:
+                        if bookmark_id in inserts.keys():
+                            inserts[bookmark_id] = (bookmark["title"], uri,
+                                                    bookmark_id)
+                        else:
+                            updates[bookmark_id] = (bookmark["title"], uri)
+                        if "tags" in keys:
+                            tags[bookmark_id] = set(bookmark["tags"])
+                    else:
+                        bookmark_id = by_uri.get(uri, None)
+                        # Add a new bookmark
+                        if bookmark_id is None:
+                            bookmark_id = bookmark["id"]
+                            by_uri[uri] = bookmark_id
+                            inserts[bookmark_id] = (bookmark["title"], uri,
+                                                    bookmark_id)
+                            # Use parent name if no bookmarks tags
+                            if bookmark.get("tags", None):
+                                tags[bookmark_id] = set(bookmark["tags"])
+                            elif bookmark.get("parentName", None):
+                                tags[bookmark_id] = {bookmark["parentName"]}
+                        # Update guid
+                        elif bookmark_id not in inserts.keys():
+                            new_guids[bookmark_id] = bookmark["id"]
+                        by_guid[bookmark["id"]] = bookmark_id
+                # Update parent name if available
+                if bookmark_id is not None and "parentName" in keys:
+                    parents[bookmark_id] = (bookmark["parentid"],
+                                            bookmark["parentName"])
+                if bookmark_id is not None:
+                    mtimes[bookmark_id] = record["modified"]
+            # Write changes
+            for bookmark_id in removed:
+                self.__index.remove(rows[bookmark_id][2],
+                                    rows[bookmark_id][4] + 1)
+            for table, column in [("bookmarks", "rowid"),
+                                  ("bookmarks_tags", "bookmark_id"),
+                                  ("parents", "bookmark_id")]:
+                sql.executemany("DELETE FROM %s WHERE %s=?" % (table, column),
+                                [(bookmark_id,) for bookmark_id in removed])
+            for (bookmark_id, (title, uri)) in updates.items():
+                popularity = rows[bookmark_id][4] + 1
+                self.__index.remove(rows[bookmark_id][2], popularity)
+                self.__index.add(uri, popularity)
+            sql.executemany("UPDATE bookmarks SET title=?, uri=?\
+                             WHERE rowid=?",
+                            [(title, uri, bookmark_id) for
+                             (bookmark_id, (title, uri)) in updates.items()])
+            sql.executemany("UPDATE bookmarks SET guid=? WHERE rowid=?",
+                            [(guid, bookmark_id) for
+                             (bookmark_id, guid) in new_guids.items()])
+            sql.executemany("INSERT INTO bookmarks\
+                             (title, uri, popularity, guid, atime, mtime)\
+                             VALUES (?, ?, 0, ?, 0, 0)", inserts.values())
+            for (title, uri, guid) in inserts.values():
+                self.__index.add(uri, 1)
+            # Get ids for new bookmarks
+            ids = {}
+            result = sql.execute("SELECT guid, rowid FROM bookmarks\
+                                  WHERE guid IN (%s)" %
+                                 self.__get_placeholders(inserts),
+                                 list(inserts.keys()))
+            for (guid, rowid) in result:
+                ids[guid] = rowid
+            # Tags, tag titles are case insensitive
+            result = sql.execute("SELECT title, rowid FROM tags")
+            tag_ids = {title.lower(): rowid for (title, rowid) in result}
+            new_tags = {tag.lower(): tag for value in tags.values()
+                        for tag in value
+                        if tag and tag.lower() not in tag_ids.keys()}
+            for tag in new_tags.values():
+                result = sql.execute("INSERT INTO tags (title) VALUES (?)",
+                                     (tag,))
+                tag_ids[tag.lower()] = result.lastrowid
+            removed_tags = []
+            added_tags = []
+            for (bookmark_id, value) in tags.items():
+                current = current_tags.get(bookmark_id, set())
+                bookmark_id = ids.get(bookmark_id, bookmark_id)
+                for tag in current - value:
+                    removed_tags.append((bookmark_id, tag_ids[tag.lower()]))
+                for tag in value - current:
+                    if tag:
+                        added_tags.append((bookmark_id,
+                                           tag_ids[tag.lower()]))
+            sql.executemany("DELETE FROM bookmarks_tags\
+                             WHERE bookmark_id=? AND tag_id=?", removed_tags)
+            sql.executemany("INSERT INTO bookmarks_tags\
+                             (bookmark_id, tag_id) VALUES (?, ?)",
+                            added_tags)
+            # Parents and mtimes
+            parents = [(ids.get(bookmark_id, bookmark_id),) + parent
+                       for (bookmark_id, parent) in parents.items()]
+            sql.executemany("DELETE FROM parents WHERE bookmark_id=?",
+                            [parent[:1] for parent in parents])
+            sql.executemany("INSERT INTO parents\
+                             (bookmark_id, parent_guid, parent_name)\
+                             VALUES (?, ?, ?)", parents)
+            sql.executemany("UPDATE bookmarks SET mtime=? WHERE rowid=?",
+                            [(mtime, ids.get(bookmark_id, bookmark_id))
+                             for (bookmark_id, mtime) in mtimes.items()])
+        return children
+
+    def set_children_positions(self, children):
+        """
+            Set bookmarks positions in their folder
+            @param children as [[str]]: folders children guids
+        """
+        with SqlCursor(self, True) as sql:
+            result = sql.execute("SELECT guid, rowid FROM bookmarks")
+            ids = dict(result)
+            sql.executemany("UPDATE bookmarks SET position=? WHERE rowid=?",
+                            [(position, ids[guid])
+                             for guids in children
+                             for (position, guid) in enumerate(guids)
+                             if guid in ids.keys()])
+
     def exists_guid(self, guid):
         """
             Check if guid exists in db
@@ -958,31 +1221,31 @@ class DatabaseBookmarks:
         words = search.lower().split()
         items = []
         with SqlCursor(self) as sql:
-            filters = ()
-            for word in words:
-                filters += ("%" + word + "%", "%" + word + "%")
-            filters += (limit,)
-
-            # Search items matching all words
-            request = "SELECT rowid, title, uri\
-                       FROM bookmarks WHERE "
-            words_copy = list(words)
-            while words_copy:
-                word = words_copy.pop(0)
-                if word:
-                    request += " (title LIKE ? OR uri LIKE ?) AND"
-            request += " guid != uri ORDER BY length(uri) ASC LIMIT ?"
-
+            if self.__has_fts and [word for word in words if len(word) > 2]:
+                (request, filters) = self.__get_fts_request(words, limit)
+            else:
+                (request, filters) = self.__get_like_request(words, limit)
             result = sql.execute(request, filters)
             items = list(result)
         return items
 
+    def create_fts(self, sql):
+        """
+            Create full text index and populate it
+            @param sql as sqlite3.Connection
+        """
+        for request in self.__create_bookmarks_fts:
+            sql.execute(request)
+        sql.execute("INSERT INTO bookmarks_fts (rowid, title, uri)\
+                     SELECT rowid, noaccents(title), noaccents(uri)\
+                     FROM bookmarks")
+
     def get_cursor(self):
         """
             Return a new sqlite cursor
         """
         try:
-            c = sqlite3.connect(self.DB_PATH, 600.0)
+            c = sqlite3.connect(self.DB_PATH)
             c.create_collation('LOCALIZED', LocalizedCollation())
             c.create_function("noaccents", 1, noaccents)
             return c
@@ -993,6 +1256,64 @@ class DatabaseBookmarks:
 #######################
 # PRIVATE             #
 #######################
+    def __get_placeholders(self, values):
+        """
+            Get SQL placeholders for values
+            @param values as []
+            @return str
+        """
+        return ", ".join(["?"] * len(values))
+
+    def __get_fts_request(self, words, limit):
+        """
+            Get a full text search request for words, ranked with bm25 and
+            recency
+            @param words as [str]
+            @param limit as int
+            @return (str, tuple)
+        """
+        matches = []
+        likes = ()
+        request = "SELECT bookmarks.rowid, bookmarks.title, bookmarks.uri\
+                   FROM bookmarks_fts, bookmarks\
+                   WHERE bookmarks_fts MATCH ?\
+                   AND bookmarks.rowid=bookmarks_fts.rowid\
+                   AND bookmarks.guid != bookmarks.uri"
+        for word in words:
+            word = noaccents(word)
+            # Trigram index needs at least three chars
+            if len(word) > 2:
+                matches.append('"%s"' % word.replace('"', '""'))
+            else:
+                request += " AND (bookmarks_fts.title LIKE ?\
+                                  OR bookmarks_fts.uri LIKE ?)"
+                likes += ("%" + word + "%", "%" + word + "%")
+        request += " ORDER BY bm25(bookmarks_fts, 10.0, 5.0)\
+                     - 2.0 / (1 + (? - bookmarks.atime) / 86400.0) LIMIT ?"
+        filters = (" AND ".join(matches),) + likes + (time(), limit)
+        return (request, filters)
+
+    def __get_like_request(self, words, limit):
+        """
+            Get a LIKE search request for words
+            @param words as [str]
+            @param limit as int
+            @return (str, tuple)
+        """
+        filters = ()
+        for word in words:
+            filters += ("%" + word + "%", "%" + word + "%")
+        filters += (limit,)
+        request = "SELECT rowid, title, uri\
+                   FROM bookmarks WHERE "
+        words_copy = list(words)
+        while words_copy:
+            word = words_copy.pop(0)
+            if word:
+                request += " (title LIKE ? OR uri LIKE ?) AND"
+        request += " guid != uri ORDER BY length(uri) ASC LIMIT ?"
+        return (request, filters)
+
     def __get_firefox_bookmarks(self, c):
         """
             Return firefox bookmarks
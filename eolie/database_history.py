@@ -16,6 +16,7 @@ import sqlite3
 import itertools
 from urllib.parse import urlparse
 from threading import Lock
+from time import time
 
 from eolie.utils import noaccents, get_random_string
 from eolie.define import EOLIE_DATA_PATH, Type
@@ -23,6 +24,8 @@ from eolie.localized import LocalizedCollation
 from eolie.sqlcursor import SqlCursor
 from eolie.logger import Logger
 from eolie.database_upgrade import DatabaseUpgrade
+from eolie.history_writer import HistoryWriter
+from eolie.uri_index import UriIndex
 
 
 class DatabaseHistory:
@@ -52,7 +55,8 @@ class DatabaseHistory:
                                                guid TEXT NOT NULL,
                                                mtime REAL NOT NULL,
                                                opened INT NOT NULL DEFAULT 0,
-                                               popularity INT NOT NULL
+                                               popularity INT NOT NULL,
+                                               frecency INT NOT NULL DEFAULT 0
                                                )'''
     __create_history_atime = '''CREATE TABLE history_atime (
                                                 history_id INT NOT NULL,
@@ -65,6 +69,45 @@ class DatabaseHistory:
     __create_history_where_idx = """CREATE INDEX
                                                idx_where ON history(
                                                uri, title)"""
+    __create_history_frecency_idx = """CREATE INDEX
+                                               idx_frecency ON history(
+                                               frecency)"""
+    __create_history_netloc_idx = """CREATE INDEX
+                                               idx_netloc ON history(
+                                               netloc, frecency)"""
+    __create_history_atime_idx = """CREATE INDEX
+                                               idx_atime ON history_atime(
+                                               history_id)"""
+
+    # Frecency: sum of visits weighted by their age, Firefox like
+    # [(max age in days, weight)]
+    __FRECENCY_BUCKETS = [(4, 100), (14, 70), (31, 50), (90, 30)]
+    __FRECENCY_WEIGHT = 10
+
+    # Full text index, accents removed with noaccents()
+    __create_history_fts = [
+        """CREATE VIRTUAL TABLE history_fts USING fts5(
+                                               title, uri, netloc,
+                                               tokenize='trigram')""",
+        """CREATE TRIGGER history_fts_insert AFTER INSERT ON history
+           BEGIN
+               INSERT INTO history_fts (rowid, title, uri, netloc)
+               VALUES (new.rowid, noaccents(new.title),
+                       noaccents(new.uri), new.netloc);
+           END""",
+        """CREATE TRIGGER history_fts_delete AFTER DELETE ON history
+           BEGIN
+               DELETE FROM history_fts WHERE rowid=old.rowid;
+           END""",
+        """CREATE TRIGGER history_fts_update
+           AFTER UPDATE OF title, uri, netloc ON history
+           BEGIN
+               UPDATE history_fts SET title=noaccents(new.title),
+                                      uri=noaccents(new.uri),
+                                      netloc=new.netloc
+               WHERE rowid=new.rowid;
+           END"""
+    ]
 
     def __init__(self):
         """
@@ -82,11 +125,22 @@ class DatabaseHistory:
                     sql.execute(self.__create_history_atime)
                     sql.execute(self.__create_history_orderby_idx)
                     sql.execute(self.__create_history_where_idx)
+                    sql.execute(self.__create_history_frecency_idx)
+                    sql.execute(self.__create_history_netloc_idx)
+                    sql.execute(self.__create_history_atime_idx)
                     sql.execute("PRAGMA user_version=%s" % upgrade.version)
+                with SqlCursor(self, True) as sql:
+                    self.create_fts(sql)
             except Exception as e:
                 Logger.error("DatabaseHistory::__init__(): %s", e)
         else:
             upgrade.upgrade(self)
+        with SqlCursor(self) as sql:
+            result = sql.execute("SELECT name FROM sqlite_master\
+                                  WHERE name='history_fts'")
+            self.__has_fts = result.fetchone() is not None
+        self.__index = UriIndex()
+        self.__writer = HistoryWriter(self)
 
     def add(self, title, uri, mtime, guid=None, atimes=[]):
         """
@@ -132,12 +186,7 @@ class DatabaseHistory:
             # Only add new atimes to db
             if not atimes:
                 atimes = [mtime]
-            current_atimes = self.get_atimes(history_id)
-            for atime in atimes:
-                if atime not in current_atimes:
-                    sql.execute("INSERT INTO history_atime\
-                                 (history_id, atime)\
-                                 VALUES (?, ?)", (history_id, atime))
+            self.set_atimes(history_id, atimes)
             return history_id
 
     def remove(self, history_id):
@@ -145,7 +194,13 @@ class DatabaseHistory:
             Remove item from history
             @param history id as int
         """
+        self.__writer.flush()
         with SqlCursor(self, True) as sql:
+            result = sql.execute("SELECT uri, frecency FROM history\
+                                  WHERE rowid=?", (history_id,))
+            v = result.fetchone()
+            if v is not None:
+                self.__index.remove(v[0], v[1])
             sql.execute("DELETE from history\
                          WHERE rowid=?", (history_id,))
             sql.execute("DELETE from history_atime\
@@ -156,18 +211,148 @@ class DatabaseHistory:
             Clear history from atime
             @param atime as int
         """
+        self.__writer.flush()
         with SqlCursor(self, True) as sql:
             sql.execute("DELETE FROM history_atime\
                          WHERE atime >= ?", (atime,))
+        self.update_frecency()
 
     def clear_to(self, atime):
         """
             Clear history to atime
             @param atime as int
         """
+        self.__writer.flush()
         with SqlCursor(self, True) as sql:
             sql.execute("DELETE FROM history_atime\
                          WHERE atime <= ?", (atime,))
+        self.update_frecency()
+
+    def apply_sync_records(self, records):
+        """
+            Apply Firefox Sync history records in one transaction
+            Rows are loaded with one query, writes are batched
+            @param records as [{}]: at most 400 records
+            @return applied records count as int
+        """
+        self.__writer.flush()
+        guids = [record["payload"]["id"] for record in records]
+        uris = [record["payload"]["histUri"].rstrip("/")
+                for record in records
+                if isinstance(record["payload"].get("histUri"), str)]
+        with SqlCursor(self, True) as sql:
+            result = sql.execute("SELECT rowid, guid, uri, mtime, frecency\
+                                  FROM history\
+                                  WHERE guid IN (%s) OR uri IN (%s)" % (
+                                      self.__get_placeholders(guids),
+                                      self.__get_placeholders(uris)),
+                                 guids + uris)
+            by_guid = {}
+            by_uri = {}
+            for row in result:
+                by_guid[row[1]] = row
+                by_uri[row[2]] = row
+            removed = {}
+            # rowid/uri for new items => (title, uri, netloc, mtime, guid)
+            items = {}
+            visits = {}
+            count = 0
+            for record in records:
+                history = record["payload"]
+                keys = history.keys()
+                row = by_guid.get(history["id"], None)
+                if "deleted" in keys:
+                    if row is not None:
+                        removed[row[0]] = row
+                        by_uri.pop(row[2], None)
+                        by_guid.pop(row[1], None)
+                        items.pop(row[0], None)
+                        visits.pop(row[0], None)
+                        count += 1
+                    continue
+                # Check we have a valid history item
+                if "histUri" not in keys or "title" not in keys or\
+                        not history["title"] or\
+                        (row is not None and row[3] >= record["modified"]):
+                    continue
+                # Try to get visit date
+                try:
+                    atimes = [round(int(visit["date"]) / 1000000, 2)
+                              for visit in history["visits"]]
+                except:
+                    continue
+                uri = history["histUri"].rstrip("/")
+                row = by_uri.get(uri, None)
+                key = uri if row is None else row[0]
+                # Keep guid for an existing uri
+                guid = history["id"] if row is None else row[1]
+                if key in items.keys():
+                    guid = items[key][4]
+                items[key] = (history["title"].strip(), uri,
+                              urlparse(uri).netloc, record["modified"], guid)
+                visits.setdefault(key, set()).update(
+                    atimes or [record["modified"]])
+                count += 1
+            # Write changes
+            sql.executemany("DELETE FROM history WHERE rowid=?",
+                            [(rowid,) for rowid in removed.keys()])
+            sql.executemany("DELETE FROM history_atime WHERE history_id=?",
+                            [(rowid,) for rowid in removed.keys()])
+            sql.executemany("UPDATE history\
+                             SET title=?, uri=?, netloc=?, mtime=?,\
+                                 popularity=popularity+1\
+                             WHERE rowid=?",
+                            [items[key][:4] + (key,) for key in items.keys()
+                             if not isinstance(key, str)])
+            inserts = [items[key] for key in items.keys()
+                       if isinstance(key, str)]
+            sql.executemany("INSERT INTO history\
+                             (title, uri, netloc, mtime, guid, popularity)\
+                             VALUES (?, ?, ?, ?, ?, 0)", inserts)
+            # Get ids for new items
+            ids = {}
+            inserted_uris = [item[1] for item in inserts]
+            result = sql.execute("SELECT uri, rowid FROM history\
+                                  WHERE uri IN (%s)" %
+                                 self.__get_placeholders(inserted_uris),
+                                 inserted_uris)
+            for (uri, rowid) in result:
+                ids[uri] = rowid
+            for key in items.keys():
+                if not isinstance(key, str):
+                    ids[items[key][1]] = key
+            # Only add new atimes to db
+            current_atimes = {}
+            rowids = list(ids.values())
+            result = sql.execute("SELECT history_id, atime\
+                                  FROM history_atime\
+                                  WHERE history_id IN (%s)" %
+                                 self.__get_placeholders(rowids),
+                                 rowids)
+            for (rowid, atime) in result:
+                current_atimes.setdefault(rowid, set()).add(atime)
+            new_atimes = []
+            frecencies = []
+            current_time = time()
+            for key in visits.keys():
+                rowid = ids[items[key][1]]
+                frecency = 0
+                for atime in visits[key] - current_atimes.get(rowid, set()):
+                    new_atimes.append((rowid, atime))
+                    frecency += self.__get_frecency_weight(
+                        current_time - atime)
+                if frecency:
+                    frecencies.append((frecency, rowid))
+                    if self.__index.loaded:
+                        self.__index.add(items[key][1], frecency)
+            sql.executemany("INSERT INTO history_atime (history_id, atime)\
+                             VALUES (?, ?)", new_atimes)
+            sql.executemany("UPDATE history\
+                             SET frecency=frecency+?\
+                             WHERE rowid=?", frecencies)
+            for row in removed.values():
+                self.__index.remove(row[2], row[4])
+            return count
 
     def get_from_atime(self, atime):
         """
@@ -333,6 +518,15 @@ class DatabaseHistory:
             @param ssl_force as bool
             @return str
         """
+        # Check for not written entries
+        for (title, pending_uri) in sorted(self.__writer.get_pending(),
+                                           key=lambda x: len(x[1])):
+            if (not ssl_force or pending_uri.startswith("https://")) and\
+                    pending_uri.startswith("http") and\
+                    pending_uri.find(uri) != -1:
+                return pending_uri
+        if self.__index.loaded:
+            return self.__index.match(uri, ssl_force)
         with SqlCursor(self) as sql:
             if ssl_force:
                 filter = ("https://%{}%".format(uri),)
@@ -368,7 +562,7 @@ class DatabaseHistory:
         """
         with SqlCursor(self) as sql:
             request = "SELECT rowid, title, uri FROM history\
-                       ORDER BY popularity DESC LIMIT ?"
+                       ORDER BY frecency DESC LIMIT ?"
             result = sql.execute(request, (limit,))
             return list(result)
         return []
@@ -391,8 +585,7 @@ class DatabaseHistory:
                                 FROM history\
                                 WHERE netloc=?\
                                 AND popularity!=0\
-                                ORDER BY popularity DESC,\
-                                mtime DESC\
+                                ORDER BY frecency DESC\
                                 LIMIT ?", (netloc, limit))
             else:
                 result = sql.execute("\
@@ -403,8 +596,7 @@ class DatabaseHistory:
                                        COUNT(uri)\
                                 FROM history\
                                 GROUP BY netloc\
-                                ORDER BY MAX(popularity) DESC,\
-                                mtime DESC\
+                                ORDER BY MAX(frecency) DESC\
                                 LIMIT ?", (limit,))
             return list(result)
 
@@ -453,10 +645,20 @@ class DatabaseHistory:
         """
         with SqlCursor(self, True) as sql:
             current_atimes = self.get_atimes(history_id)
+            frecency = 0
+            current_time = time()
             for atime in atimes:
                 if atime not in current_atimes:
                     sql.execute("INSERT INTO history_atime (history_id, atime)\
                                  VALUES (?, ?)", (history_id, atime))
+                    age = current_time - atime
+                    frecency += self.__get_frecency_weight(age)
+            if frecency:
+                sql.execute("UPDATE history\
+                             SET frecency=frecency+?\
+                             WHERE rowid=?", (frecency, history_id))
+                if self.__index.loaded:
+                    self.__index.add(self.get_uri(history_id), frecency)
 
     def set_mtime(self, history_id, mtime):
         """
@@ -473,32 +675,34 @@ class DatabaseHistory:
             Search string in db (uri and title)
             @param search as str
             @param limit as int
-            @return [(id, title, uri)] as [(int, str, str)]
+            @return [(id, title, uri, frecency)] as [(int, str, str, int)]
         """
         words = search.lower().split()
         items = []
         with SqlCursor(self) as sql:
-            filters = ()
-            for word in words:
-                filters += ("%" + word + "%", "%" + word + "%")
-            filters += (limit,)
-            request = "SELECT rowid, title, uri FROM history"
-            if words:
-                request += " WHERE"
-                words_copy = list(words)
-                while words_copy:
-                    word = words_copy.pop(0)
-                    request += " (title LIKE ? OR uri LIKE ?)"
-                    if words_copy:
-                        request += " AND "
-            request += " ORDER BY length(uri) ASC LIMIT ?"
+            if self.__has_fts and [word for word in words if len(word) > 2]:
+                (request, filters) = self.__get_fts_request(words, limit)
+            else:
+                (request, filters) = self.__get_like_request(words, limit)
             try:
                 result = sql.execute(request, filters)
                 items = list(result)
             except:
                 Logger.error("DatabaseHistory::search(): %s -> %s",
                              (request, filters))
-        return items
+        # Add not written entries
+        uris = [item[2] for item in items]
+        for (title, uri) in self.__writer.get_pending():
+            if uri in uris:
+                continue
+            lower = (title + uri).lower()
+            for word in words:
+                if lower.find(word) == -1:
+                    break
+            else:
+                items.insert(0, (Type.NONE, title, uri,
+                                 self.__get_frecency_weight(0)))
+        return items[:limit]
 
     def reset_popularity(self, uri):
         """
@@ -508,11 +712,66 @@ class DatabaseHistory:
         with SqlCursor(self, True) as sql:
             parsed = urlparse(uri)
             if parsed.scheme:
-                sql.execute("UPDATE history SET popularity=0 WHERE uri=?",
-                            (uri,))
+                sql.execute("UPDATE history SET popularity=0, frecency=0\
+                             WHERE uri=?", (uri,))
             else:
-                sql.execute("UPDATE history SET popularity=0 WHERE netloc=?",
-                            (uri,))
+                sql.execute("UPDATE history SET popularity=0, frecency=0\
+                             WHERE netloc=?", (uri,))
+
+    def update_frecency(self, reset=False):
+        """
+            Recompute frecency from access times, visits age changed
+            @param reset as bool: also recompute items with a reset frecency
+            @thread safe
+        """
+        request = "UPDATE history SET frecency=(\
+                    SELECT COALESCE(SUM(CASE"
+        for (days, weight) in self.__FRECENCY_BUCKETS:
+            request += " WHEN ? - atime < %s THEN %s" % (days * 86400, weight)
+        request += " ELSE %s END), 0)\
+                    FROM history_atime\
+                    WHERE history_id=history.rowid)" % self.__FRECENCY_WEIGHT
+        if not reset:
+            # Keep frecency reset by user until next visit
+            request += " WHERE frecency!=0"
+        current_time = time()
+        try:
+            with SqlCursor(self, True) as sql:
+                sql.execute(request,
+                            (current_time,) * len(self.__FRECENCY_BUCKETS))
+        except Exception as e:
+            Logger.error("DatabaseHistory::update_frecency(): %s", e)
+
+    def load_index(self):
+        """
+            Load uris in autocompletion index
+            @thread safe
+        """
+        try:
+            with SqlCursor(self) as sql:
+                result = sql.execute("SELECT uri, frecency FROM history")
+                self.__index.set_items(result)
+        except Exception as e:
+            Logger.error("DatabaseHistory::load_index(): %s", e)
+
+    def create_fts(self, sql):
+        """
+            Create full text index and populate it
+            @param sql as sqlite3.Connection
+        """
+        for request in self.__create_history_fts:
+            sql.execute(request)
+        sql.execute("INSERT INTO history_fts (rowid, title, uri, netloc)\
+                     SELECT rowid, noaccents(title), noaccents(uri), netloc\
+                     FROM history")
+
+    @property
+    def writer(self):
+        """
+            Get history writer
+            @return HistoryWriter
+        """
+        return self.__writer
 
     def exists_guid(self, guid):
         """
@@ -530,7 +789,7 @@ class DatabaseHistory:
             Return a new sqlite cursor
         """
         try:
-            c = sqlite3.connect(self.DB_PATH, 600.0)
+            c = sqlite3.connect(self.DB_PATH)
             c.create_collation('LOCALIZED', LocalizedCollation())
             c.create_function("noaccents", 1, noaccents)
             return c
@@ -541,3 +800,74 @@ class DatabaseHistory:
 #######################
 # PRIVATE             #
 #######################
+    def __get_frecency_weight(self, age):
+        """
+            Get frecency weight for a visit
+            @param age as int (seconds)
+            @return int
+        """
+        for (days, weight) in self.__FRECENCY_BUCKETS:
+            if age < days * 86400:
+                return weight
+        return self.__FRECENCY_WEIGHT
+
+    def __get_placeholders(self, values):
+        """
+            Get SQL placeholders for values
+            @param values as []
+            @return str
+        """
+        return ", ".join(["?"] * len(values))
+
+    def __get_fts_request(self, words, limit):
+        """
+            Get a full text search request for words, ranked with bm25 and
+            frecency
+            @param words as [str]
+            @param limit as int
+            @return (str, tuple)
+        """
+        matches = []
+        likes = ()
+        request = "SELECT history.rowid, history.title, history.uri,\
+                          history.frecency\
+                   FROM history_fts, history\
+                   WHERE history_fts MATCH ?\
+                   AND history.rowid=history_fts.rowid"
+        for word in words:
+            word = noaccents(word)
+            # Trigram index needs at least three chars
+            if len(word) > 2:
+                matches.append('"%s"' % word.replace('"', '""'))
+            else:
+                request += " AND (history_fts.title LIKE ?\
+                                  OR history_fts.uri LIKE ?)"
+                likes += ("%" + word + "%", "%" + word + "%")
+        request += " ORDER BY bm25(history_fts, 10.0, 5.0, 1.0)\
+                     - 2.0 * history.frecency / (history.frecency + 100.0)\
+                     LIMIT ?"
+        filters = (" AND ".join(matches),) + likes + (limit,)
+        return (request, filters)
+
+    def __get_like_request(self, words, limit):
+        """
+            Get a LIKE search request for words
+            @param words as [str]
+            @param limit as int
+            @return (str, tuple)
+        """
+        filters = ()
+        for word in words:
+            filters += ("%" + word + "%", "%" + word + "%")
+        filters += (limit,)
+        request = "SELECT rowid, title, uri, frecency FROM history"
+        if words:
+            request += " WHERE"
+            words_copy = list(words)
+            while words_copy:
+                word = words_copy.pop(0)
+                request += " (title LIKE ? OR uri LIKE ?)"
+                if words_copy:
+                    request += " AND "
+        request += " ORDER BY frecency DESC, length(uri) ASC LIMIT ?"
+        return (request, filters)
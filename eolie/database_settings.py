@@ -194,7 +194,7 @@ class DatabaseSettings:
             Return a new sqlite cursor
         """
         try:
-            c = sqlite3.connect(self.__DB_PATH, 600.0)
+            c = sqlite3.connect(self.__DB_PATH)
             return c
         except Exception as e:
             Logger.error("DatabaseSettings::get_cursor(): %s", e)
@@ -30,6 +30,7 @@ class DatabaseUpgrade:
             self.__UPGRADES = {
                 1: self.__upgrade_bookmarks_1,
                 2: "ALTER TABLE bookmarks ADD startup INT NOT NULL DEFAULT 0",
+                3: self.__upgrade_fts
             }
         elif t == Type.HISTORY:
             self.__UPGRADES = {
@@ -39,7 +40,13 @@ class DatabaseUpgrade:
                 4: "DELETE FROM history_atime WHERE NOT EXISTS (SELECT * FROM\
                     history WHERE history.rowid=history_atime.history_id)",
                 5: "CREATE INDEX idx_orderby ON history(mtime, popularity)",
-                6: "CREATE INDEX idx_where ON history(uri, title)"
+                6: "CREATE INDEX idx_where ON history(uri, title)",
+                7: self.__upgrade_fts,
+                8: "ALTER TABLE history ADD frecency INT NOT NULL DEFAULT 0",
+                9: "CREATE INDEX idx_frecency ON history(frecency)",
+                10: "CREATE INDEX idx_netloc ON history(netloc, frecency)",
+                11: "CREATE INDEX idx_atime ON history_atime(history_id)",
+                12: self.__upgrade_frecency
             }
         elif t == Type.SETTINGS:
             self.__UPGRADES = {
@@ -52,7 +59,7 @@ class DatabaseUpgrade:
             @param db as Database
         """
         version = 0
-        with SqlCursor(db) as sql:
+        with SqlCursor(db, True) as sql:
             result = sql.execute("PRAGMA user_version")
             v = result.fetchone()
             if v is not None:
@@ -93,7 +100,7 @@ class DatabaseUpgrade:
                                            mtime REAL NOT NULL,
                                            position INT DEFAULT 0
                                            )'''
-        with SqlCursor(db) as sql:
+        with SqlCursor(db, True) as sql:
             sql.execute("ALTER TABLE bookmarks RENAME TO _bookmarks")
             sql.execute(create_bookmarks)
             sql.execute("""INSERT INTO bookmarks (id, title, uri,
@@ -101,3 +108,18 @@ class DatabaseUpgrade:
                            SELECT id, title, uri, popularity, atime, guid,
                             mtime, position FROM _bookmarks""")
             sql.execute("DROP TABLE _bookmarks")
+
+    def __upgrade_fts(self, db):
+        """
+            Add full text index
+            @param db as Database
+        """
+        with SqlCursor(db, True) as sql:
+            db.create_fts(sql)
+
+    def __upgrade_frecency(self, db):
+        """
+            Compute frecency for all items
+            @param db as DatabaseHistory
+        """
+        db.update_frecency(True)
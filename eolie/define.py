@@ -93,6 +93,12 @@ class Type:
     SETTINGS = -12
 
 
+class TaskPriority:
+    INTERACTIVE = 0
+    BACKGROUND = 1
+    BULK = 2
+
+
 class LoadingState:
     NONE = 0
     LOADING = 1
@@ -103,6 +109,12 @@ class LoadingState:
 class Score:
     SUGGESTION = 1000
     WEBVIEW = 500
+    BOOKMARK = 200
+    # History frecency is mapped to [0, HISTORY[, reaching half at FRECENCY
+    HISTORY = 300
+    FRECENCY = 500
+    # By position in provider results
+    RANK = 10
 
 
 class StartPage:
@@ -12,7 +12,7 @@
 
 from gi.repository import Gtk, GLib, WebKit2, GObject, Pango
 
-from eolie.define import MARGIN_SMALL
+from eolie.define import App, MARGIN_SMALL
 from eolie.utils import emit_signal
 from eolie.logger import Logger
 
@@ -95,7 +95,7 @@ class ClearDataDialog(Gtk.Bin):
             Clear data
             @param button as Gtk.Button
         """
-        context = WebKit2.WebContext.get_default()
+        context = App().context_pool.default
         data_manager = context.get_property("website-data-manager")
         rows = self.__listbox.get_selected_rows()
         items = [row.item for row in rows]
@@ -143,7 +143,7 @@ class ClearDataDialog(Gtk.Bin):
         """
             Populate treeview
         """
-        context = WebKit2.WebContext.get_default()
+        context = App().context_pool.default
         data_manager = context.get_property("website-data-manager")
         data_manager.fetch(WebKit2.WebsiteDataTypes.ALL,
                            None,
@@ -0,0 +1,116 @@
+# Copyright (c) 2017-2021 Cedric Bellegarde <cedric.bellegarde@adishatz.org>
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+from gi.repository import GLib, WebKit2
+
+from time import time
+
+from eolie.define import App
+from eolie.logger import Logger
+
+
+class DiscardManager:
+    """
+        Unload background webviews:
+        - not shown since "discard-idle-time" minutes
+        - oldest ones when more than "max-loaded-webviews" are loaded
+    """
+
+    __CHECK_INTERVAL = 60
+
+    def __init__(self):
+        """
+            Init manager
+        """
+        self.__timeout_id = None
+        # WebKitGTK >= 2.34 needed to terminate a web process
+        if WebKit2.get_minor_version() < 34:
+            Logger.info("DiscardManager: WebKitGTK too old, disabled")
+            return
+        self.__timeout_id = GLib.timeout_add_seconds(self.__CHECK_INTERVAL,
+                                                     self.__on_check)
+
+    def discard(self, count=None):
+        """
+            Discard least recently used webviews
+            @param count as int/None (None: all possible webviews)
+            @return discarded webviews count as int
+        """
+        if self.__timeout_id is None:
+            return 0
+        webviews = self.__get_candidates()
+        if count is not None:
+            webviews = webviews[:count]
+        for webview in webviews:
+            webview.discard()
+        return len(webviews)
+
+    def stop(self):
+        """
+            Stop checking for webviews
+        """
+        if self.__timeout_id is not None:
+            GLib.source_remove(self.__timeout_id)
+            self.__timeout_id = None
+
+    @property
+    def loaded(self):
+        """
+            Get loaded webviews
+            @return [WebView]
+        """
+        webviews = []
+        for window in App().windows:
+            for webview in window.container.webviews:
+                if not webview.discarded and webview.get_uri() is not None:
+                    webviews.append(webview)
+        return webviews
+
+#######################
+# PRIVATE             #
+#######################
+    def __get_candidates(self):
+        """
+            Get webviews that can be discarded, least recently used first
+            @return [WebView]
+        """
+        webviews = [webview for webview in self.loaded
+                    if webview.can_discard()]
+        return sorted(webviews, key=lambda x: x.idle_since)
+
+    def __on_check(self):
+        """
+            Discard idle webviews and webviews over budget
+            @return True
+        """
+        try:
+            idle_time = App().settings.get_value(
+                "discard-idle-time").get_int32() * 60
+            max_loaded = App().settings.get_value(
+                "max-loaded-webviews").get_int32()
+            candidates = self.__get_candidates()
+            to_discard = []
+            if max_loaded > 0:
+                over = len(self.loaded) - max_loaded
+                if over > 0:
+                    to_discard = candidates[:over]
+            if idle_time > 0:
+                current_time = time()
+                for webview in candidates:
+                    if webview not in to_discard and\
+                            current_time - webview.idle_since > idle_time:
+                        to_discard.append(webview)
+            for webview in to_discard:
+                webview.discard()
+        except Exception as e:
+            Logger.error("DiscardManager::__on_check(): %s", e)
+        return True
@@ -15,13 +15,18 @@ from gi.repository import Gio, GLib, GObject
 
 from pickle import dump, load
 from hashlib import sha256
+from hmac import compare_digest
+from base64 import b64encode, b64decode
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+from os import cpu_count
 import json
 from fcntl import flock, LOCK_EX, LOCK_NB, LOCK_UN
-from time import time, sleep
+from time import time, sleep, monotonic
+from itertools import chain
 
 from eolie.helper_task import TaskHelper
-from eolie.define import App, EOLIE_DATA_PATH
-from eolie.sqlcursor import SqlCursor
+from eolie.define import App, EOLIE_DATA_PATH, TaskPriority
 from eolie.helper_passwords import PasswordsHelper
 from eolie.logger import Logger
 from eolie.utils import emit_signal
@@ -40,6 +45,9 @@ class SyncWorker(GObject.Object):
         "syncing": (GObject.SignalFlags.RUN_FIRST, None, (str,))
     }
 
+    # Records applied in one transaction
+    __APPLY_BATCH_SIZE = 250
+
     def check_modules():
         """
             True if deps are installed
@@ -105,7 +113,6 @@ class SyncWorker(GObject.Object):
         if attributes is None or not attributes["login"] or not password:
             Logger.warning("SyncWorker::login(): %s", attributes)
             return
-        from base64 import b64encode
         import json
         session = None
         self.__username = attributes["login"]
@@ -137,7 +144,7 @@ class SyncWorker(GObject.Object):
             Start a new session
         """
         # Just reset session, will be set by get_session_bulk_keys()
-        self.__session = None
+        self.__reset_session()
 
     def set_credentials(self):
         """
@@ -165,7 +172,8 @@ class SyncWorker(GObject.Object):
         if Gio.NetworkMonitor.get_default().get_network_available() and\
                 self.__username:
             task_helper = TaskHelper()
-            task_helper.run(self.__pull, force)
+            task_helper.run(self.__pull, force,
+                            priority=TaskPriority.BULK, key="pull")
 
     def push(self):
         """
@@ -175,7 +183,8 @@ class SyncWorker(GObject.Object):
         if Gio.NetworkMonitor.get_default().get_network_available() and\
                 self.__username:
             task_helper = TaskHelper()
-            task_helper.run(self.__push,)
+            task_helper.run(self.__push,
+                            priority=TaskPriority.BULK, key="push")
 
     def push_history(self, history_id):
         """
@@ -246,7 +255,7 @@ class SyncWorker(GObject.Object):
         """
         self.__username = ""
         self.__password = ""
-        self.__session = None
+        self.__reset_session()
         self.__helper.clear_sync(None)
 
     def stop(self, force=False):
@@ -260,7 +269,7 @@ class SyncWorker(GObject.Object):
         self.__sync_cancellable.cancel()
         self.__sync_cancellable = Gio.Cancellable()
         if force:
-            self.__session = None
+            self.__reset_session()
 
     def save_pendings(self):
         """
@@ -288,8 +297,7 @@ class SyncWorker(GObject.Object):
         """
         try:
             if self.__username:
-                self.__get_session_bulk_keys()
-                self.__firefox_sync.client.info_collections()
+                self.__get_info_collections()
                 return True
         except Exception as e:
             Logger.error("SyncWorker::status(): %s", e)
@@ -315,11 +323,21 @@ class SyncWorker(GObject.Object):
             self.__mz = FirefoxSync()
         return self.__mz
 
+    def __reset_session(self):
+        """
+            Forget FxA session and sync token
+        """
+        self.__session = None
+        if self.__mz is not None:
+            self.__mz.disconnect()
+
     def __get_session_bulk_keys(self):
         """
-            Get session decrypt keys
+            Get session decrypt keys, cached until sync token expires
             @return keys as (b"", b"")
         """
+        if self.__firefox_sync.connected:
+            return self.__firefox_sync.bulk_keys
         if self.__session is None:
             from fxa.core import Session as FxASession
             from fxa.crypto import quick_stretch_password
@@ -337,15 +355,35 @@ class SyncWorker(GObject.Object):
         bulk_keys = self.__firefox_sync.connect(bid_assertion, key)
         return bulk_keys
 
-    def __update_state(self):
+    def __get_info_collections(self):
+        """
+            Get collections mtimes, connect again if token is rejected
+            @return {str: float}
+        """
+        from requests.exceptions import HTTPError
+        self.__get_session_bulk_keys()
+        try:
+            return self.__firefox_sync.client.info_collections()
+        except HTTPError as e:
+            if e.response is None or e.response.status_code != 401:
+                raise
+            Logger.sync_debug("SyncWorker: token rejected, reconnecting")
+            self.__firefox_sync.disconnect()
+            self.__get_session_bulk_keys()
+            return self.__firefox_sync.client.info_collections()
+
+    def __update_state(self, mtimes=None):
         """
             Update state file
+            @param mtimes as {}: collections mtimes, fetched if None
         """
         try:
             f = open(EOLIE_DATA_PATH + "/firefox_sync.bin", "wb")
             # Lock file
             flock(f, LOCK_EX | LOCK_NB)
-            self.__mtimes = self.__firefox_sync.client.info_collections()
+            if mtimes is None:
+                mtimes = self.__get_info_collections()
+            self.__mtimes = mtimes
             dump(self.__mtimes, f)
             # Unlock file
             flock(f, LOCK_UN)
@@ -359,29 +397,40 @@ class SyncWorker(GObject.Object):
         """
         try:
             if Gio.NetworkMonitor.get_default().get_network_available() and\
-                    self.__username and not self.__syncing_pendings:
+                    self.__username and not self.__syncing_pendings and\
+                    [key for key in self.__pending_records.keys()
+                     if self.__pending_records[key]]:
                 self.__syncing_pendings = True
                 Logger.sync_debug("Elements to push to Firefox sync: %s",
                                   self.__pending_records)
                 self.__check_worker()
                 bulk_keys = self.__get_session_bulk_keys()
                 for key in self.__pending_records.keys():
-                    while self.__pending_records[key]:
-                        try:
-                            record = self.__pending_records[key].pop(0)
-                            Logger.sync_debug("syncing %s", record)
-                            if "bmkUri" in record.keys():
-                                emit_signal(self, "syncing",
-                                            record["bmkUri"])
-                            elif "histUri" in record.keys():
-                                emit_signal(self, "syncing",
-                                            record["histUri"])
-                            elif "hostname" in record.keys():
-                                emit_signal(self, "syncing",
-                                            record["hostname"])
-                            self.__firefox_sync.add(record, key, bulk_keys)
-                        except:
-                            self.__pending_records[key].append(record)
+                    pendings = self.__pending_records[key]
+                    if not pendings:
+                        continue
+                    self.__pending_records[key] = []
+                    try:
+                        # Only last version of a record needs to be uploaded
+                        records = {}
+                        for record in pendings:
+                            records[record["id"]] = record
+                        for record in records.values():
+                            for field in ["bmkUri", "histUri", "hostname"]:
+                                if field in record.keys():
+                                    emit_signal(self, "syncing", record[field])
+                                    break
+                        Logger.sync_debug("syncing %s %s", len(records), key)
+                        failed = self.__firefox_sync.add_records(
+                            list(records.values()), key, bulk_keys)
+                    except Exception:
+                        # Keep records for next sync, before newer ones
+                        self.__pending_records[key] = pendings +\
+                            self.__pending_records[key]
+                        raise
+                    # Retry failed records on next sync
+                    self.__pending_records[key] += [records[record_id]
+                                                    for record_id in failed]
                 self.__update_state()
                 self.__syncing_pendings = False
         except Exception as e:
@@ -557,8 +606,10 @@ class SyncWorker(GObject.Object):
         try:
             self.__check_worker()
 
+            new_mtimes = self.__get_info_collections()
             bulk_keys = self.__get_session_bulk_keys()
-            new_mtimes = self.__firefox_sync.client.info_collections()
+            # Only successfully pulled collections get their mtime updated
+            mtimes = dict(self.__mtimes)
 
             self.__check_worker()
             ########################
@@ -571,6 +622,7 @@ class SyncWorker(GObject.Object):
                 # Only pull if something new available
                 if self.__mtimes["passwords"] != new_mtimes["passwords"]:
                     self.__pull_passwords(bulk_keys)
+                mtimes["passwords"] = new_mtimes["passwords"]
             except:
                 pass  # No passwords in sync
 
@@ -585,6 +637,7 @@ class SyncWorker(GObject.Object):
                 # Only pull if something new available
                 if self.__mtimes["history"] != new_mtimes["history"]:
                     self.__pull_history(bulk_keys)
+                mtimes["history"] = new_mtimes["history"]
             except:
                 pass
 
@@ -599,9 +652,10 @@ class SyncWorker(GObject.Object):
                 # Only pull if something new available
                 if self.__mtimes["bookmarks"] != new_mtimes["bookmarks"]:
                     self.__pull_bookmarks(bulk_keys)
+                mtimes["bookmarks"] = new_mtimes["bookmarks"]
             except:
                 pass
-            self.__update_state()
+            self.__update_state(mtimes)
             Logger.sync_debug("Stop pulling")
         except Exception as e:
             Logger.error("SyncWorker::__pull(): %s", e)
@@ -653,103 +707,15 @@ class SyncWorker(GObject.Object):
             @raise StopIteration
         """
         Logger.sync_debug("pull bookmarks")
-        SqlCursor.add(App().bookmarks)
-        records = self.__firefox_sync.get_records("bookmarks", bulk_keys)
-        children_array = []
-        for record in records:
+        records = self.__firefox_sync.get_records("bookmarks", bulk_keys,
+                                                  self.__mtimes["bookmarks"])
+        children = []
+        for batch in self.__apply_records("bookmarks", records):
             self.__check_worker()
-            if record["modified"] < self.__mtimes["bookmarks"]:
-                continue
-            sleep(0.01)
-            bookmark = record["payload"]
-            bookmark_id = App().bookmarks.get_id_by_guid(bookmark["id"])
-            # Nothing to apply, continue
-            if App().bookmarks.get_mtime(bookmark_id) >= record["modified"]:
-                continue
-            Logger.sync_debug("pulling %s", record)
-            # Deleted bookmark
-            if "deleted" in bookmark.keys():
-                App().bookmarks.remove(bookmark_id)
-            # Keep folder only for firefox compatiblity
-            elif "type" in bookmark.keys() and bookmark["type"] == "folder"\
-                    and bookmark["id"] is not None\
-                    and bookmark["title"]:
-                if bookmark_id is None:
-                    bookmark_id = App().bookmarks.add(bookmark["title"],
-                                                      bookmark["id"],
-                                                      bookmark["id"],
-                                                      [],
-                                                      0)
-                # Will calculate position later
-                if "children" in bookmark.keys():
-                    children_array.append(bookmark["children"])
-            # We have a bookmark, add it
-            elif "type" in bookmark.keys() and bookmark["type"] == "bookmark"\
-                    and bookmark["id"] is not None\
-                    and bookmark["title"]:
-                # Update bookmark
-                if bookmark_id is not None:
-                    App().bookmarks.set_title(bookmark_id,
-                                              bookmark["title"])
-                    App().bookmarks.set_uri(bookmark_id,
-                                            bookmark["bmkUri"])
-                    # Update tags
-                    current_tags = App().bookmarks.get_tags(bookmark_id)
-                    for tag in App().bookmarks.get_tags(bookmark_id):
-                        if "tags" in bookmark.keys() and\
-                                tag not in bookmark["tags"]:
-                            tag_id = App().bookmarks.get_tag_id(tag)
-                            current_tags.remove(tag)
-                            App().bookmarks.del_tag_from(tag_id,
-                                                         bookmark_id)
-                    if "tags" in bookmark.keys():
-                        for tag in bookmark["tags"]:
-                            # Tag already associated
-                            if tag in current_tags:
-                                continue
-                            tag_id = App().bookmarks.get_tag_id(tag)
-                            if tag_id is None:
-                                tag_id = App().bookmarks.add_tag(tag)
-                            App().bookmarks.add_tag_to(tag_id,
-                                                       bookmark_id)
-                # Add a new bookmark
-                else:
-                    bookmark_id = App().bookmarks.get_id(bookmark["bmkUri"])
-                    # Add a new bookmark
-                    if bookmark_id is None:
-                        # Use parent name if no bookmarks tags
-                        if "tags" not in bookmark.keys() or\
-                                not bookmark["tags"]:
-                            if "parentName" in bookmark.keys() and\
-                                    bookmark["parentName"]:
-                                bookmark["tags"] = [bookmark["parentName"]]
-                            else:
-                                bookmark["tags"] = []
-                        bookmark_id = App().bookmarks.add(bookmark["title"],
-                                                          bookmark["bmkUri"],
-                                                          bookmark["id"],
-                                                          bookmark["tags"],
-                                                          0)
-                    else:
-                        # Update guid
-                        App().bookmarks.set_guid(bookmark_id, bookmark["id"])
-            # Update parent name if available
-            if bookmark_id is not None and "parentName" in bookmark.keys():
-                App().bookmarks.set_parent(bookmark_id,
-                                           bookmark["parentid"],
-                                           bookmark["parentName"])
-            App().bookmarks.set_mtime(bookmark_id,
-                                      record["modified"])
+            children += App().bookmarks.apply_sync_records(batch)
         # Update bookmark position
-        for children in children_array:
-            position = 0
-            for child in children:
-                bid = App().bookmarks.get_id_by_guid(child)
-                App().bookmarks.set_position(bid,
-                                             position)
-                position += 1
-        App().bookmarks.clean_tags()  # Will commit
-        SqlCursor.remove(App().bookmarks)
+        App().bookmarks.set_children_positions(children)
+        App().bookmarks.clean_tags()
 
     def __pull_passwords(self, bulk_keys):
         """
@@ -758,12 +724,10 @@ class SyncWorker(GObject.Object):
             @raise StopIteration
         """
         Logger.sync_debug("pull passwords")
-        records = self.__firefox_sync.get_records("passwords", bulk_keys)
+        records = self.__firefox_sync.get_records("passwords", bulk_keys,
+                                                  self.__mtimes["passwords"])
         for record in records:
             self.__check_worker()
-            if record["modified"] < self.__mtimes["passwords"]:
-                continue
-            sleep(0.01)
             Logger.sync_debug("pulling %s", record)
             password = record["payload"]
             password_id = password["id"].strip("{}")
@@ -788,38 +752,39 @@ class SyncWorker(GObject.Object):
             @raise StopIteration
         """
         Logger.sync_debug("pull history")
-        records = self.__firefox_sync.get_records("history", bulk_keys)
-        for record in records:
+        records = self.__firefox_sync.get_records("history", bulk_keys,
+                                                  self.__mtimes["history"])
+        for batch in self.__apply_records("history", records):
             self.__check_worker()
-            if record["modified"] < self.__mtimes["history"]:
-                continue
-            sleep(0.01)
-            history = record["payload"]
-            keys = history.keys()
-            history_id = App().history.get_id_by_guid(history["id"])
-            # Check we have a valid history item
-            if "histUri" in keys and\
-                    "title" in keys and\
-                    history["title"] and\
-                    App().history.get_mtime(history_id) < record["modified"]:
-                # Try to get visit date
-                atimes = []
-                try:
-                    for visit in history["visits"]:
-                        atimes.append(round(int(visit["date"]) / 1000000, 2))
-                except:
+            App().history.apply_sync_records(batch)
+
+    def __apply_records(self, collection, records):
+        """
+            Group records in batches to apply, log throughput
+            @param collection as str
+            @param records as iterator of {}
+            @return iterator of [{}]
+        """
+        start = monotonic()
+        apply_time = 0
+        count = 0
+        batch = []
+        for record in chain(records, [None]):
+            if record is not None:
+                batch.append(record)
+                if len(batch) < self.__APPLY_BATCH_SIZE:
                     continue
-                Logger.sync_debug("pulling %s", record)
-                title = history["title"].rstrip().lstrip()
-                history_id = App().history.add(title,
-                                               history["histUri"],
-                                               record["modified"],
-                                               history["id"],
-                                               atimes,
-                                               True)
-            elif "deleted" in keys:
-                history_id = App().history.get_id_by_guid(history_id)
-                App().history.remove(history_id)
+            if batch:
+                apply_start = monotonic()
+                yield batch
+                apply_time += monotonic() - apply_start
+                count += len(batch)
+                batch = []
+        duration = monotonic() - start
+        Logger.info("SyncWorker: %s %s records in %.2fs, %d/s, "
+                    "applied at %d/s", count, collection, duration,
+                    count / max(duration, 0.001),
+                    count / max(apply_time, 0.001))
 
     def __set_credentials(self, attributes, password, uri, index, count):
         """
@@ -832,7 +797,6 @@ class SyncWorker(GObject.Object):
         """
         if attributes is None:
             return
-        from base64 import b64decode
         import json
         try:
             self.__username = attributes["login"]
@@ -887,12 +851,25 @@ class FirefoxSync(object):
         Sync client
     """
 
+    __PAGE_SIZE = 1000
+    __DECRYPT_WORKERS = 4
+    __DECRYPT_CHUNK_SIZE = 100
+    # Used for missing values in server /info/configuration
+    __LIMITS = {"max_post_records": 100,
+                "max_post_bytes": 1024 * 1024,
+                "max_total_records": 10000,
+                "max_total_bytes": 100 * 1024 * 1024,
+                "max_record_payload_bytes": 256 * 1024}
+
     def __init__(self):
         """
             Init client
         """
         from fxa.core import Client as FxAClient
         self.__fxa_client = FxAClient()
+        self.__client = None
+        self.__bulk_keys = None
+        self.__limits = None
 
     def login(self, login, password, code):
         """
@@ -919,15 +896,15 @@ class FirefoxSync(object):
             from binascii import hexlify
             state = hexlify(sha256(key).digest()[0:16])
         self.__client = SyncClient(bid_assertion, state)
+        self.__limits = None
         sync_keys = KeyBundle.fromMasterKey(
             key,
             "identity.mozilla.com/picl/v1/oldsync")
 
         # Fetch the sync bundle keys out of storage.
         # They're encrypted with the account-level key.
-        keys = self.__decrypt_payload(self.__client.get_record("crypto",
-                                                               "keys"),
-                                      sync_keys)
+        keys = RecordCipher(sync_keys).decrypt(
+            self.__client.get_record("crypto", "keys"))
 
         # There's some provision for using separate
         # key bundles for separate collections
@@ -940,37 +917,71 @@ class FirefoxSync(object):
             return None
 
         # Now use those keys to decrypt the records of interest.
-        from base64 import b64decode
-        bulk_keys = KeyBundle(b64decode(keys["default"][0]),
-                              b64decode(keys["default"][1]))
-        return bulk_keys
+        self.__bulk_keys = KeyBundle(b64decode(keys["default"][0]),
+                                     b64decode(keys["default"][1]))
+        return self.__bulk_keys
 
-    def get_records(self, collection, bulk_keys):
+    def disconnect(self):
         """
-            Return records payload
+            Forget sync token and bundle keys
+        """
+        self.__client = None
+        self.__bulk_keys = None
+        self.__limits = None
+
+    def get_records(self, collection, bulk_keys, newer=None):
+        """
+            Return records modified after newer, oldest first
+            Records are fetched page by page and decrypted ahead of
+            iteration by a pool of threads
             @param collection as str
             @param bulk keys as KeyBundle
-            @return [{}]
+            @param newer as float
+            @return iterator of {}
         """
-        records = []
-        for record in self.__client.get_records(collection):
-            record["payload"] = self.__decrypt_payload(record, bulk_keys)
-            records.append(record)
-        return records
+        records = self.__client.iter_records(collection, newer,
+                                             self.__PAGE_SIZE)
+        yield from self.__decrypt_records(records, bulk_keys)
 
-    def add(self, item, collection, bulk_keys):
+    def add_records(self, items, collection, bulk_keys):
         """
-            Add bookmark
-            @param bookmark as {}
+            Upload items with batch API, respecting server limits
+            @param items as [{}]
             @param collection as str
             @param bulk_keys as KeyBundle
+            @return failed items ids as [str]
         """
-        payload = self.__encrypt_payload(item, bulk_keys)
-        record = {}
-        record["modified"] = round(time(), 2)
-        record["payload"] = payload
-        record["id"] = item["id"]
-        self.__client.put_record(collection, record)
+        limits = self.__get_limits()
+        cipher = RecordCipher(bulk_keys)
+        failed = set()
+        records = []
+        for item in items:
+            record = {"id": item["id"], "payload": cipher.encrypt(item)}
+            # Server will never accept it, do not retry
+            if len(record["payload"]) > limits["max_record_payload_bytes"]:
+                Logger.error("FirefoxSync::add_records(): %s too large",
+                             item["id"])
+                continue
+            records.append(record)
+        for batch in self.__split(records,
+                                  limits["max_total_records"],
+                                  limits["max_total_bytes"]):
+            posts = list(self.__split(batch,
+                                      limits["max_post_records"],
+                                      limits["max_post_bytes"]))
+            # Servers without batch support apply each post
+            batch_id = "true"
+            try:
+                for post in posts:
+                    result = self.__client.post_records(
+                        collection, post, batch_id, post is posts[-1])
+                    failed |= set(result.get("failed", {}).keys())
+                    batch_id = result.get("batch", batch_id)
+            except Exception as e:
+                # Uncommitted batch is discarded by server
+                Logger.error("FirefoxSync::add_records(): %s", e)
+                failed |= set(record["id"] for record in batch)
+        return list(failed)
 
     def get_browserid_assertion(self, session,
                                 tokenserver_url=TOKENSERVER_URL):
@@ -982,6 +993,24 @@ class FirefoxSync(object):
         bid_assertion = session.get_identity_assertion(tokenserver_url)
         return bid_assertion, session.keys[1]
 
+    @property
+    def connected(self):
+        """
+            True if sync token and bundle keys are still valid
+            @return bool
+        """
+        return self.__client is not None and\
+            self.__bulk_keys is not None and\
+            not self.__client.expired
+
+    @property
+    def bulk_keys(self):
+        """
+            Get bundle keys
+            @return KeyBundle
+        """
+        return self.__bulk_keys
+
     @property
     def client(self):
         """
@@ -999,56 +1028,163 @@ class FirefoxSync(object):
 #######################
 # PRIVATE             #
 #######################
-    def __encrypt_payload(self, record, key_bundle):
+    def __get_limits(self):
+        """
+            Get server upload limits
+            @return {str: int}
+        """
+        if self.__limits is None:
+            self.__limits = dict(self.__LIMITS)
+            try:
+                configuration = self.__client.info_configuration()
+                for key in self.__limits.keys():
+                    if key in configuration.keys():
+                        self.__limits[key] = configuration[key]
+            except Exception as e:
+                # Old servers do not have this endpoint
+                Logger.info("FirefoxSync::__get_limits(): %s", e)
+        return self.__limits
+
+    def __decrypt_records(self, records, bulk_keys):
+        """
+            Decrypt records in chunks with a pool of threads
+            Only a few chunks are decrypted ahead of consumer
+            @param records as iterator of {}
+            @param bulk_keys as KeyBundle
+            @return iterator of {}, in records order
+        """
+        cipher = RecordCipher(bulk_keys)
+        workers = min(self.__DECRYPT_WORKERS, cpu_count() or 1)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            pending = deque()
+            chunks = self.__split(records, self.__DECRYPT_CHUNK_SIZE)
+            for chunk in chunks:
+                pending.append((chunk, executor.submit(cipher.decrypt_all,
+                                                       chunk)))
+                if len(pending) < workers * 2:
+                    continue
+                (chunk, future) = pending.popleft()
+                yield from self.__set_payloads(chunk, future.result())
+            while pending:
+                (chunk, future) = pending.popleft()
+                yield from self.__set_payloads(chunk, future.result())
+
+    def __set_payloads(self, records, payloads):
+        """
+            Set decrypted payloads to records
+            @param records as [{}]
+            @param payloads as [{}]
+            @return iterator of {}
+        """
+        for (record, payload) in zip(records, payloads):
+            record["payload"] = payload
+            yield record
+
+    def __split(self, records, max_records, max_bytes=None):
+        """
+            Split records in chunks respecting limits
+            @param records as [{}]
+            @param max_records as int
+            @param max_bytes as int: payloads size, None for no limit
+            @return iterator of [{}]
+        """
+        chunk = []
+        size = 0
+        for record in records:
+            length = len(record["payload"])
+            if chunk and (len(chunk) >= max_records or
+                          (max_bytes is not None and
+                           size + length > max_bytes)):
+                yield chunk
+                chunk = []
+                size = 0
+            chunk.append(record)
+            size += length
+        if chunk:
+            yield chunk
+
+
+class RecordCipher:
+    """
+        Encrypt and decrypt records payloads with a KeyBundle
+        Crypto modules and keys are set up once, decrypt() is thread safe:
+        hashlib and Crypto release the GIL while working
+    """
+
+    def __init__(self, key_bundle):
+        """
+            Init cipher
+            @param key_bundle as KeyBundle
+        """
+        from Crypto.Cipher import AES
+        from Crypto.Random import get_random_bytes
+        from hmac import new
+        self.__aes = AES
+        self.__get_random_bytes = get_random_bytes
+        self.__encryption_key = key_bundle.encryption_key
+        # Copied for each record, key is only hashed once
+        self.__hmac = new(key_bundle.hmac_key, digestmod=sha256)
+
+    def encrypt(self, record):
         """
             Encrypt payload
             @param record as {}
-            @param key bundle as KeyBundle
             @return encrypted record payload
         """
-        from Crypto.Cipher import AES
-        from Crypto import Random
-        from hmac import new
-        from base64 import b64encode
         plaintext = json.dumps(record).encode("utf-8")
         # Input strings must be a multiple of 16 in length
         length = 16 - (len(plaintext) % 16)
         plaintext += bytes([length]) * length
-        iv = Random.new().read(16)
-        aes = AES.new(key_bundle.encryption_key, AES.MODE_CBC, iv)
+        iv = self.__get_random_bytes(16)
+        aes = self.__aes.new(self.__encryption_key, self.__aes.MODE_CBC, iv)
         ciphertext = b64encode(aes.encrypt(plaintext))
-        _hmac = new(key_bundle.hmac_key, ciphertext, sha256).hexdigest()
         payload = {"ciphertext": ciphertext.decode("utf-8"),
-                   "IV": b64encode(iv).decode("utf-8"), "hmac": _hmac}
+                   "IV": b64encode(iv).decode("utf-8"),
+                   "hmac": self.__get_hmac(ciphertext)}
         return json.dumps(payload)
 
-    def __decrypt_payload(self, record, key_bundle):
+    def decrypt(self, record):
         """
-            Descrypt payload
-            @param record as str (json)
-            @param key bundle as KeyBundle
+            Decrypt payload
+            @param record as {} with payload as str (json)
             @return uncrypted record payload
         """
-        from Crypto.Cipher import AES
-        from hmac import new
-        from base64 import b64decode
         j = json.loads(record["payload"])
+        ciphertext = j['ciphertext'].encode("utf-8")
         # Always check the hmac before decrypting anything.
-        expected_hmac = new(key_bundle.hmac_key,
-                            j['ciphertext'].encode("utf-8"),
-                            sha256).hexdigest()
-        if j['hmac'] != expected_hmac:
+        expected_hmac = self.__get_hmac(ciphertext)
+        if not compare_digest(j['hmac'], expected_hmac):
             raise ValueError("HMAC mismatch: %s != %s" % (j['hmac'],
                                                           expected_hmac))
-        ciphertext = b64decode(j['ciphertext'])
-        iv = b64decode(j['IV'])
-        aes = AES.new(key_bundle.encryption_key, AES.MODE_CBC, iv)
-        plaintext = aes.decrypt(ciphertext).strip().decode("utf-8")
+        aes = self.__aes.new(self.__encryption_key, self.__aes.MODE_CBC,
+                             b64decode(j['IV']))
+        plaintext = aes.decrypt(b64decode(ciphertext)).strip().decode("utf-8")
         # Remove any CBC block padding,
         # assuming it's a well-formed JSON payload.
         plaintext = plaintext[:plaintext.rfind("}") + 1]
         return json.loads(plaintext)
 
+    def decrypt_all(self, records):
+        """
+            Decrypt payloads
+            @param records as [{}]
+            @return [{}]
+        """
+        return [self.decrypt(record) for record in records]
+
+#######################
+# PRIVATE             #
+#######################
+    def __get_hmac(self, ciphertext):
+        """
+            Get ciphertext hmac
+            @param ciphertext as bytes
+            @return str
+        """
+        _hmac = self.__hmac.copy()
+        _hmac.update(ciphertext)
+        return _hmac.hexdigest()
+
 
 class KeyBundle:
     """
@@ -1151,6 +1287,15 @@ class SyncClient(object):
         Client for the Firefox Sync server.
     """
 
+    # Renew token before server rejects it
+    __EXPIRATION_MARGIN = 60
+    __TIMEOUT = 30
+    __RETRIES = 3
+    __RETRY_DELAY = 0.5
+    __RETRY_MAX_DELAY = 30
+    __RETRY_STATUS = [429, 500, 502, 503, 504]
+    __IDEMPOTENT_METHODS = ["get", "put", "delete"]
+
     def __init__(self, bid_assertion=None, client_state=None,
                  credentials={}, tokenserver_url=TOKENSERVER_URL):
         """
@@ -1160,11 +1305,18 @@ class SyncClient(object):
             @param credentials as {}
             @param server_url as str
         """
+        from requests import Session
         from requests_hawk import HawkAuth
         if bid_assertion is not None and client_state is not None:
             ts_client = TokenserverClient(bid_assertion, client_state,
                                           tokenserver_url)
             credentials = ts_client.get_hawk_credentials()
+        # Keep connections alive between requests
+        self.__session = Session()
+        self.__expiration = None
+        if 'duration' in credentials.keys():
+            self.__expiration = time() + credentials['duration'] -\
+                self.__EXPIRATION_MARGIN
         self.__user_id = credentials['uid']
         self.__api_endpoint = credentials['api_endpoint']
         self.__auth = HawkAuth(algorithm=credentials['hashalg'],
@@ -1180,18 +1332,16 @@ class SyncClient(object):
             @param url as str
             @param kwargs as requests.request named args
         """
-        from requests import request, exceptions
-        url = self.__api_endpoint.rstrip('/') + '/' + url.lstrip('/')
-        raw_resp = request(method, url, auth=self.__auth, **kwargs)
-        raw_resp.raise_for_status()
+        return self.__request(method, url, **kwargs).json()
 
-        if raw_resp.status_code == 304:
-            http_error_msg = '%s Client Error: %s for url: %s' % (
-                raw_resp.status_code,
-                raw_resp.reason,
-                raw_resp.url)
-            raise exceptions.HTTPError(http_error_msg, response=raw_resp)
-        return raw_resp.json()
+    @property
+    def expired(self):
+        """
+            True if token expired
+            @return bool
+        """
+        return self.__expiration is not None and\
+            time() > self.__expiration
 
     def info_collections(self, **kwargs):
         """
@@ -1214,6 +1364,13 @@ class SyncClient(object):
         """
         return self._request('get', '/info/quota', **kwargs)
 
+    def info_configuration(self, **kwargs):
+        """
+            Returns an object giving server limits, like max_post_records,
+            max_post_bytes, max_total_records and max_total_bytes.
+        """
+        return self._request('get', '/info/configuration', **kwargs)
+
     def get_collection_usage(self, **kwargs):
         """
             Returns an object mapping collection names associated with the
@@ -1293,6 +1450,38 @@ class SyncClient(object):
         return self._request('get', '/storage/%s' % collection.lower(),
                              params=params, **kwargs)
 
+    def iter_records(self, collection, newer=None, limit=1000,
+                     sort="oldest", **kwargs):
+        """
+            Iterate over full BSOs contained in a collection
+            Pages of limit BSOs are fetched when needed, following
+            X-Weave-Next-Offset header
+            @param collection as str
+            @param newer as float: only BSOs modified after this time
+            @param limit as int: BSOs per page
+            @param sort as str
+            @return iterator of {}
+        """
+        params = kwargs.pop('params', {})
+        params['full'] = True
+        params['limit'] = limit
+        params['sort'] = sort
+        if newer is not None:
+            params['newer'] = newer
+        headers = kwargs.pop('headers', {})
+        url = '/storage/%s' % collection.lower()
+        while True:
+            raw_resp = self.__request('get', url, params=params,
+                                      headers=headers, **kwargs)
+            yield from raw_resp.json()
+            offset = raw_resp.headers.get('X-Weave-Next-Offset')
+            if offset is None:
+                break
+            params['offset'] = offset
+            # Server fails with 412 if collection changed between pages
+            headers['X-If-Unmodified-Since'] =\
+                raw_resp.headers['X-Last-Modified']
+
     def get_record(self, collection, record_id, **kwargs):
         """Returns the BSO in the collection corresponding to the requested id.
         """
@@ -1345,3 +1534,89 @@ class SyncClient(object):
         return self._request('put', '/storage/%s/%s' % (
             collection.lower(), record_id), data=json.dumps(record),
             headers=headers, **kwargs)
+
+    def post_records(self, collection, records, batch=None, commit=False,
+                     **kwargs):
+        """
+            Creates or updates BSOs within a collection.
+            The passed records must be a list of python objects containing
+            new data for the BSOs.
+
+            With batch set to "true", server starts a new batch and returns
+            its id. Records posted with this id are only applied when a
+            request with commit is received.
+
+            Successful responses will return an object with the new
+            last-modified time, the ids of accepted BSOs and the ids of
+            failed BSOs with failure reasons.
+
+            :param batch:
+                "true" to start a batch, or a batch id.
+
+            :param commit:
+                commit the batch after applying these records.
+        """
+        params = kwargs.pop('params', {})
+        if batch is not None:
+            params['batch'] = batch
+        if commit:
+            params['commit'] = 'true'
+        headers = kwargs.pop('headers', {})
+        headers['Content-Type'] = 'application/json; charset=utf-8'
+
+        return self._request('post', '/storage/%s' % collection.lower(),
+                             params=params, data=json.dumps(records),
+                             headers=headers, **kwargs)
+
+#######################
+# PRIVATE             #
+#######################
+    def __request(self, method, url, **kwargs):
+        """
+            Request an endpoint with the correct authentication setup,
+            raises on errors
+            Idempotent requests are retried on network errors and
+            server overload, with exponential backoff
+            @param method as str
+            @param url as str
+            @param kwargs as requests.request named args
+            @return requests.Response
+        """
+        from requests import exceptions
+        url = self.__api_endpoint.rstrip('/') + '/' + url.lstrip('/')
+        kwargs.setdefault('timeout', self.__TIMEOUT)
+        retries = 0
+        if method.lower() in self.__IDEMPOTENT_METHODS:
+            retries = self.__RETRIES
+        attempt = 0
+        while True:
+            delay = self.__RETRY_DELAY * 2 ** attempt
+            try:
+                # Auth is computed again for each attempt, new hawk nonce
+                raw_resp = self.__session.request(method, url,
+                                                  auth=self.__auth,
+                                                  **kwargs)
+                if raw_resp.status_code not in self.__RETRY_STATUS:
+                    break
+                try:
+                    delay = max(delay,
+                                float(raw_resp.headers['Retry-After']))
+                except:
+                    pass
+                if attempt >= retries or delay > self.__RETRY_MAX_DELAY:
+                    break
+            except (exceptions.ConnectionError, exceptions.Timeout):
+                if attempt >= retries:
+                    raise
+            Logger.sync_debug("SyncClient: retrying %s in %ss", url, delay)
+            sleep(delay)
+            attempt += 1
+        raw_resp.raise_for_status()
+
+        if raw_resp.status_code == 304:
+            http_error_msg = '%s Client Error: %s for url: %s' % (
+                raw_resp.status_code,
+                raw_resp.reason,
+                raw_resp.url)
+            raise exceptions.HTTPError(http_error_msg, response=raw_resp)
+        return raw_resp
@@ -0,0 +1,139 @@
+# Copyright (c) 2017-2021 Cedric Bellegarde <cedric.bellegarde@adishatz.org>
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+from gi.repository import GLib
+
+from time import monotonic
+
+from eolie.define import App, TaskPriority
+from eolie.logger import Logger
+
+
+class ModelHelper:
+    """
+        Load a Gio.ListStore content:
+        - items are built by a loader in a background thread
+        - items are inserted in frame sized chunks with Gio.ListStore.splice
+    """
+
+    # Time allowed to insert a chunk, in seconds
+    __FRAME_TIME = 0.008
+
+    def __init__(self, model):
+        """
+            Init helper
+            @param model as Gio.ListStore
+        """
+        self.__model = model
+        self.__generation = 0
+        self.__populate_id = None
+        self.__chunk_size = 10
+        self.__start_time = 0
+        self.__first_row_time = 0
+        self.__populate_time = 0
+
+    def load(self, loader, *args, **kwd):
+        """
+            Replace model content with loader result
+            @param loader as function returning [GObject.Object]
+            @param *args as loader arguments
+            @param **kwd as { "callback": (function, *args) }
+            @callback (items count as int, *args)
+        """
+        self.clear()
+        self.__start_time = monotonic()
+        App().task_helper.run(loader, *args,
+                              callback=(self.__on_load,
+                                        self.__generation,
+                                        kwd.get("callback", (None,))),
+                              priority=TaskPriority.INTERACTIVE)
+
+    def clear(self):
+        """
+            Stop loading and clear model
+        """
+        self.__generation += 1
+        if self.__populate_id is not None:
+            GLib.source_remove(self.__populate_id)
+            self.__populate_id = None
+        self.__model.remove_all()
+
+    @property
+    def first_row_time(self):
+        """
+            Time between last load and first inserted row
+            @return float (seconds)
+        """
+        return self.__first_row_time
+
+    @property
+    def populate_time(self):
+        """
+            Time between last load and last inserted row
+            @return float (seconds)
+        """
+        return self.__populate_time
+
+#######################
+# PRIVATE             #
+#######################
+    def __populate(self, items, callback):
+        """
+            Insert a chunk of items in model
+            @param items as [GObject.Object]
+            @param callback as (function, *args)
+            @return bool
+        """
+        start = monotonic()
+        chunk = items[:self.__chunk_size]
+        del items[:self.__chunk_size]
+        self.__model.splice(self.__model.get_n_items(), 0, chunk)
+        if self.__first_row_time == 0:
+            self.__first_row_time = monotonic() - self.__start_time
+        # Adapt chunk size to frame time
+        elapsed = monotonic() - start
+        if elapsed < self.__FRAME_TIME / 2:
+            self.__chunk_size *= 2
+        elif elapsed > self.__FRAME_TIME and self.__chunk_size > 1:
+            self.__chunk_size //= 2
+        if items:
+            return True
+        self.__populate_id = None
+        self.__populate_time = monotonic() - self.__start_time
+        Logger.debug("ModelHelper: %s items, first row: %.3fs, all: %.3fs",
+                     self.__model.get_n_items(),
+                     self.__first_row_time,
+                     self.__populate_time)
+        (function, *args) = callback
+        if function is not None:
+            function(self.__model.get_n_items(), *args)
+        return False
+
+    def __on_load(self, items, generation, callback):
+        """
+            Populate model with items
+            @param items as [GObject.Object]
+            @param generation as int
+            @param callback as (function, *args)
+        """
+        # A newer load is running
+        if generation != self.__generation:
+            return
+        self.__first_row_time = 0
+        if items:
+            self.__populate_id = GLib.idle_add(self.__populate,
+                                               list(items), callback)
+        else:
+            self.__populate_time = monotonic() - self.__start_time
+            (function, *args) = callback
+            if function is not None:
+                function(0, *args)
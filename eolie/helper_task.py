@@ -10,13 +10,10 @@
 # You should have received a copy of the GNU General Public License
 # along with this program. If not, see <http://www.gnu.org/licenses/>.
 
-import gi
-gi.require_version("Soup", "2.4")
-from gi.repository import GLib, Soup
+from threading import Lock
 
-from threading import Thread
-
-from eolie.logger import Logger
+from eolie.task_pool import TaskPool
+from eolie.http_client import HttpClient, BytesSink
 
 
 class TaskHelper:
@@ -24,6 +21,11 @@ class TaskHelper:
         Simple helper for running a task in background
     """
 
+    __pool = None
+    __pool_lock = Lock()
+    __client = None
+    __client_lock = Lock()
+
     def __init__(self, user_agent=None):
         """
             Init helper
@@ -46,12 +48,19 @@ class TaskHelper:
             run command with params and return to callback
             @param command as function
             @param *args as command arguments
-            @param **kwd as { "callback": (function, *args) }
+            @param **kwd as { "callback": (function, *args),
+                              "priority": TaskPriority,
+                              "cancellable": Gio.Cancellable,
+                              "key": str, replace queued command with key }
         """
-        thread = Thread(target=self.__run,
-                        args=(command, kwd, *args))
-        thread.daemon = True
-        thread.start()
+        with TaskHelper.__pool_lock:
+            if TaskHelper.__pool is None:
+                TaskHelper.__pool = TaskPool()
+        TaskHelper.__pool.add(command, args,
+                              kwd.get("callback", None),
+                              kwd.get("priority", None),
+                              kwd.get("cancellable", None),
+                              kwd.get("key", None))
 
     def load_uri_content(self, uri, cancellable, callback, *args):
         """
@@ -61,85 +70,30 @@ class TaskHelper:
             @param callback as a function
             @callback (uri as str, status as bool, content as bytes, args)
         """
-        try:
-            session = Soup.Session.new()
-            session.set_property("accept-language-auto", True)
-            if self.__user_agent is not None:
-                session.set_property("user-agent", self.__user_agent)
-            request = session.request(uri)
-            request.send_async(cancellable,
-                               self.__on_request_send_async,
-                               callback,
-                               cancellable,
-                               uri,
-                               *args)
-        except Exception as e:
-            Logger.error("HelperTask::load_uri_content(): %s, %s:", e, uri)
-            callback(None, False, b"", *args)
-
-#######################
-# PRIVATE             #
-#######################
-    def __run(self, command, kwd, *args):
-        """
-            Pass command result to callback
-            @param command as function
-            @param *args as command arguments
-            @param kwd as { "callback": (function, *args) }
-        """
-        try:
-            result = command(*args)
-            if "callback" in kwd.keys():
-                (callback, *callback_args) = kwd["callback"]
-                if callback is not None:
-                    GLib.idle_add(callback, result, *callback_args)
-        except Exception as e:
-            Logger.error("TaskHelper::__run(): %s, %s, %s", e, command, kwd)
+        self.load_uri_stream(uri, BytesSink(), cancellable, callback, *args)
 
-    def __on_read_bytes_async(self, stream, result, content,
-                              cancellable, callback, uri, *args):
+    def load_uri_stream(self, uri, sink, cancellable, callback, *args):
         """
-            Read data from stream, when finished, pass to callback
-            @param stream as Gio.InputStream
-            @param result as Gio.AsyncResult
-            @param cancellable as Gio.Cancellable
-            @param content as bytes
-            @param callback as function
+            Load uri with libsoup, body is passed to sink while loading
             @param uri as str
+            @param sink as HttpSink
+            @param cancellable as Gio.Cancellable
+            @param callback as a function
+            @callback (uri as str, status as bool, sink result, args)
         """
-        try:
-            content_result = stream.read_bytes_finish(result)
-            content_bytes = content_result.get_data()
-            if content_bytes:
-                content += content_bytes
-                stream.read_bytes_async(4096, GLib.PRIORITY_LOW,
-                                        cancellable,
-                                        self.__on_read_bytes_async,
-                                        content, cancellable, callback,
-                                        uri, *args)
-            else:
-                callback(uri, True, bytes(content), *args)
-        except Exception as e:
-            Logger.error("TaskHelper::__on_read_bytes_async(): %s", e)
-            callback(uri, False, b"", *args)
+        headers = list(self.__headers)
+        if self.__user_agent is not None:
+            headers.append(("User-Agent", self.__user_agent))
+        self.http_client.load(uri, sink, headers,
+                              cancellable, callback, *args)
 
-    def __on_request_send_async(self, source, result, callback,
-                                cancellable, uri, *args):
+    @property
+    def http_client(self):
         """
-            Get stream and start reading from it
-            @param source as Soup.Session
-            @param result as Gio.AsyncResult
-            @param cancellable as Gio.Cancellable
-            @param callback as a function
-            @param uri as str
+            Get shared HTTP client
+            @return HttpClient
         """
-        try:
-            stream = source.send_finish(result)
-            # We use a bytearray here as seems that bytes += is really slow
-            stream.read_bytes_async(4096, GLib.PRIORITY_LOW,
-                                    cancellable, self.__on_read_bytes_async,
-                                    bytearray(0), cancellable, callback, uri,
-                                    *args)
-        except Exception as e:
-            Logger.warning("TaskHelper::__on_request_send_async(): %s", e)
-            callback(uri, False, b"", *args)
+        with TaskHelper.__client_lock:
+            if TaskHelper.__client is None:
+                TaskHelper.__client = HttpClient()
+        return TaskHelper.__client
@@ -0,0 +1,207 @@
+# Copyright (c) 2017-2021 Cedric Bellegarde <cedric.bellegarde@adishatz.org>
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+from gi.repository import GLib
+
+from threading import Thread, Condition
+from time import monotonic
+from collections import OrderedDict
+
+from eolie.sqlcursor import SqlCursor
+from eolie.logger import Logger
+
+
+class HistoryWrite:
+    """
+        Pending writes for an uri
+    """
+
+    def __init__(self, uri):
+        """
+            Init write
+            @param uri as str
+        """
+        self.uri = uri
+        self.title = None
+        self.mtime = None
+        # None: unchanged, 0: closed, else opened at mtime
+        self.opened = None
+        self.callbacks = []
+
+
+class HistoryWriter:
+    """
+        Write history in a dedicated thread:
+        - writes for an uri are coalesced
+        - writes are flushed in one transaction every FLUSH_DELAY ms or
+          when FLUSH_COUNT uris are pending
+    """
+
+    FLUSH_DELAY = 1000
+    FLUSH_COUNT = 50
+
+    def __init__(self, history):
+        """
+            Init writer
+            @param history as DatabaseHistory
+        """
+        self.__history = history
+        self.__pending = OrderedDict()
+        self.__flushing = {}
+        self.__condition = Condition()
+        self.__stop = False
+        self.__flush_wanted = False
+        self.__thread = Thread(target=self.__run, name="HistoryWriter")
+        self.__thread.daemon = True
+        self.__thread.start()
+
+    def add(self, title, uri, mtime, callback=None, *args):
+        """
+            Queue a new history entry, see DatabaseHistory.add()
+            @param title as str
+            @param uri as str
+            @param mtime as double
+            @param callback as function
+            @callback (history_id as int, *args)
+        """
+        if not uri:
+            return
+        with self.__condition:
+            write = self.__get_write(uri)
+            write.title = title
+            write.mtime = mtime
+            if callback is not None:
+                write.callbacks.append((callback, args))
+            self.__condition.notify()
+
+    def set_page_state(self, uri, mtime=None):
+        """
+            Queue page state, see DatabaseHistory.set_page_state()
+            @param uri as str
+            @param mtime as double
+        """
+        if uri is None:
+            return
+        with self.__condition:
+            write = self.__get_write(uri)
+            write.opened = 0 if mtime is None else mtime
+            self.__condition.notify()
+
+    def get_pending(self):
+        """
+            Get pending entries, flushing ones included
+            @return [(title, uri)]
+        """
+        with self.__condition:
+            writes = list(self.__flushing.values()) +\
+                list(self.__pending.values())
+            return [(write.title, write.uri) for write in writes
+                    if write.title is not None]
+
+    def flush(self):
+        """
+            Wait for pending writes to be written
+        """
+        with self.__condition:
+            if self.__thread is None:
+                return
+            if self.__pending:
+                self.__flush_wanted = True
+                self.__condition.notify_all()
+            while self.__pending or self.__flushing:
+                self.__condition.wait()
+
+    def stop(self):
+        """
+            Flush pending writes and stop thread
+        """
+        if self.__thread is None:
+            return
+        self.flush()
+        with self.__condition:
+            self.__stop = True
+            self.__condition.notify_all()
+        self.__thread.join()
+        self.__thread = None
+
+#######################
+# PRIVATE             #
+#######################
+    def __get_write(self, uri):
+        """
+            Get pending write for uri, moved at queue end
+            @param uri as str
+            @return HistoryWrite
+        """
+        uri = uri.rstrip("/")
+        if uri in self.__pending.keys():
+            self.__pending.move_to_end(uri)
+        else:
+            self.__pending[uri] = HistoryWrite(uri)
+        return self.__pending[uri]
+
+    def __run(self):
+        """
+            Flush writes
+        """
+        SqlCursor.add(self.__history)
+        while True:
+            with self.__condition:
+                while not self.__pending and not self.__stop:
+                    self.__condition.wait()
+                deadline = monotonic() + self.FLUSH_DELAY / 1000
+                while len(self.__pending) < self.FLUSH_COUNT and\
+                        not self.__stop and not self.__flush_wanted:
+                    timeout = deadline - monotonic()
+                    if timeout <= 0:
+                        break
+                    self.__condition.wait(timeout)
+                self.__flush_wanted = False
+                if not self.__pending:
+                    break
+                self.__flushing = self.__pending
+                self.__pending = OrderedDict()
+            self.__write(list(self.__flushing.values()))
+            with self.__condition:
+                self.__flushing = {}
+                self.__condition.notify_all()
+        SqlCursor.remove(self.__history)
+
+    def __write(self, writes):
+        """
+            Write pending writes in one transaction, callbacks are run
+            once committed. On error, batch is rolled back and dropped
+            @param writes as [HistoryWrite]
+        """
+        try:
+            callbacks = []
+            for write in writes:
+                if write.title is not None:
+                    history_id = self.__history.add(write.title,
+                                                    write.uri,
+                                                    write.mtime)
+                    for (callback, args) in write.callbacks:
+                        callbacks.append((callback, history_id, args))
+                if write.opened == 0:
+                    self.__history.set_page_state(write.uri)
+                elif write.opened is not None:
+                    self.__history.set_page_state(write.uri, write.opened)
+            SqlCursor.commit(self.__history)
+            for (callback, history_id, args) in callbacks:
+                GLib.idle_add(callback, history_id, *args)
+        except Exception as e:
+            Logger.error("HistoryWriter::__write(): %s, %s entries dropped",
+                         e, len(writes))
+            try:
+                SqlCursor.rollback(self.__history)
+            except Exception as e:
+                Logger.error("HistoryWriter::__write(): %s", e)
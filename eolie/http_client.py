@@ -0,0 +1,328 @@
+# Copyright (c) 2017-2021 Cedric Bellegarde <cedric.bellegarde@adishatz.org>
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import gi
+gi.require_version("Soup", "2.4")
+from gi.repository import Gio, GLib, Soup
+
+from eolie.define import EOLIE_CACHE_PATH
+from eolie.logger import Logger
+
+
+class HttpSink:
+    """
+        Receive a response body chunk by chunk
+    """
+
+    def set_response(self, status_code, headers):
+        """
+            Receive response status and headers, before body
+            @param status_code as int
+            @param headers as Soup.MessageHeaders
+        """
+        pass
+
+    def open(self, size):
+        """
+            Start receiving body
+            @param size as int, -1 if unknown
+        """
+        pass
+
+    def write(self, data):
+        """
+            Receive a body chunk
+            @param data as bytes
+        """
+        pass
+
+    def close(self, status):
+        """
+            Body fully received or request failed
+            @param status as bool
+            @return object passed to load callback
+        """
+        return None
+
+
+class BytesSink(HttpSink):
+    """
+        Buffer body in memory, preallocated from Content-Length
+    """
+
+    def __init__(self):
+        """
+            Init sink
+        """
+        self.__content = bytearray(0)
+        self.__offset = 0
+
+    def open(self, size):
+        """
+            Preallocate buffer
+            @param size as int, -1 if unknown
+        """
+        if size > 0:
+            self.__content = bytearray(size)
+        self.__offset = 0
+
+    def write(self, data):
+        """
+            Copy chunk to buffer
+            @param data as bytes
+        """
+        end = self.__offset + len(data)
+        if end > len(self.__content):
+            # Content-Length was wrong or missing
+            self.__content.extend(bytes(end - len(self.__content)))
+        self.__content[self.__offset:end] = data
+        self.__offset = end
+
+    def close(self, status):
+        """
+            Get content
+            @param status as bool
+            @return bytes
+        """
+        if not status:
+            return b""
+        if self.__offset == len(self.__content):
+            content = bytes(self.__content)
+        else:
+            content = bytes(memoryview(self.__content)[:self.__offset])
+        self.__content = bytearray(0)
+        return content
+
+
+class ChunkSink(HttpSink):
+    """
+        Pass chunks to a callback as they are received
+    """
+
+    def __init__(self, callback, *args):
+        """
+            Init sink
+            @param callback as function
+            @callback (data as bytes, *args)
+        """
+        self.__callback = callback
+        self.__args = args
+
+    def write(self, data):
+        """
+            Pass chunk to callback
+            @param data as bytes
+        """
+        self.__callback(data, *self.__args)
+
+
+class FileSink(HttpSink):
+    """
+        Write body to a file, file is only replaced on success
+    """
+
+    def __init__(self, path):
+        """
+            Init sink
+            @param path as str
+        """
+        self.__file = Gio.File.new_for_path(path)
+        self.__stream = None
+
+    def open(self, size):
+        """
+            Open file
+            @param size as int, -1 if unknown
+        """
+        self.__stream = self.__file.replace(
+            None, False, Gio.FileCreateFlags.REPLACE_DESTINATION, None)
+
+    def write(self, data):
+        """
+            Write chunk to file
+            @param data as bytes
+        """
+        self.__stream.write_all(data, None)
+
+    def close(self, status):
+        """
+            Close file, keep previous one if request failed
+            @param status as bool
+            @return Gio.File/None
+        """
+        if self.__stream is None:
+            return None
+        try:
+            if status:
+                self.__stream.close(None)
+                return self.__file
+            else:
+                # A cancelled close does not replace destination
+                cancellable = Gio.Cancellable.new()
+                cancellable.cancel()
+                self.__stream.close(cancellable)
+        except Exception as e:
+            Logger.debug("FileSink::close(): %s", e)
+        finally:
+            self.__stream = None
+        return None
+
+
+class HttpClient:
+    """
+        HTTP client sharing one session:
+        - connections are kept alive and reused between requests
+        - responses are cached on disk following HTTP cache headers,
+          requests with their own validators bypass this cache
+        - body is read in chunks growing with stream throughput and
+          passed to an HttpSink
+    """
+
+    __CACHE_SIZE = 50 * 1024 * 1024
+    __CHUNK_SIZE_MIN = 64 * 1024
+    __CHUNK_SIZE_MAX = 1024 * 1024
+    __CONDITIONAL_HEADERS = ["If-None-Match", "If-Modified-Since"]
+
+    def __init__(self):
+        """
+            Init client
+        """
+        self.__session = Soup.Session.new()
+        self.__session.set_property("accept-language-auto", True)
+        self.__cache = None
+        try:
+            self.__cache = Soup.Cache.new("%s/http" % EOLIE_CACHE_PATH,
+                                          Soup.CacheType.SINGLE_USER)
+            self.__cache.set_max_size(self.__CACHE_SIZE)
+            self.__cache.load()
+            self.__session.add_feature(self.__cache)
+        except Exception as e:
+            Logger.error("HttpClient::__init__(): %s", e)
+
+    def load(self, uri, sink, headers, cancellable, callback, *args):
+        """
+            Load uri in sink
+            @param uri as str
+            @param sink as HttpSink
+            @param headers as [(str, str)]
+            @param cancellable as Gio.Cancellable
+            @param callback as function
+            @callback (uri as str, status as bool, sink result, *args)
+        """
+        try:
+            message = Soup.Message.new("GET", uri)
+            for (name, value) in headers:
+                message.request_headers.replace(name, value)
+                # Caller wants to see 304 responses
+                if name in self.__CONDITIONAL_HEADERS:
+                    message.disable_feature(Soup.Cache.__gtype__)
+            self.__session.send_async(message, cancellable,
+                                      self.__on_send_async,
+                                      (uri, message, sink, cancellable,
+                                       callback, args))
+        except Exception as e:
+            Logger.error("HttpClient::load(): %s, %s", e, uri)
+            callback(uri, False, sink.close(False), *args)
+
+    def dump(self):
+        """
+            Save cache index to disk
+        """
+        try:
+            if self.__cache is not None:
+                self.__cache.dump()
+        except Exception as e:
+            Logger.error("HttpClient::dump(): %s", e)
+
+#######################
+# PRIVATE             #
+#######################
+    def __read(self, stream, chunk_size, data):
+        """
+            Read next chunk from stream
+            @param stream as Gio.InputStream
+            @param chunk_size as int
+            @param data as (str, Soup.Message, HttpSink,
+                            Gio.Cancellable, function, [])
+        """
+        cancellable = data[3]
+        stream.read_bytes_async(chunk_size, GLib.PRIORITY_LOW, cancellable,
+                                self.__on_read_bytes_async, chunk_size, data)
+
+    def __finish(self, status, data):
+        """
+            Close sink and pass result to callback
+            @param status as bool
+            @param data as (str, Soup.Message, HttpSink,
+                            Gio.Cancellable, function, [])
+        """
+        (uri, message, sink, cancellable, callback, args) = data
+        try:
+            result = sink.close(status)
+        except Exception as e:
+            Logger.error("HttpClient::__finish(): %s, %s", e, uri)
+            (status, result) = (False, None)
+        callback(uri, status, result, *args)
+
+    def __on_send_async(self, session, result, data):
+        """
+            Open sink and start reading body
+            @param session as Soup.Session
+            @param result as Gio.AsyncResult
+            @param data as (str, Soup.Message, HttpSink,
+                            Gio.Cancellable, function, [])
+        """
+        (uri, message, sink, cancellable, callback, args) = data
+        try:
+            stream = session.send_finish(result)
+            sink.set_response(message.status_code, message.response_headers)
+            if not 200 <= message.status_code < 300:
+                Logger.debug("HttpClient: %s, status %s",
+                             uri, message.status_code)
+                stream.close_async(GLib.PRIORITY_LOW, None, None)
+                self.__finish(False, data)
+                return
+            size = message.response_headers.get_content_length()
+            sink.open(size if size > 0 else -1)
+            if size > 0:
+                chunk_size = min(size, self.__CHUNK_SIZE_MAX)
+            else:
+                chunk_size = self.__CHUNK_SIZE_MIN
+            self.__read(stream, chunk_size, data)
+        except Exception as e:
+            Logger.warning("HttpClient::__on_send_async(): %s, %s", e, uri)
+            self.__finish(False, data)
+
+    def __on_read_bytes_async(self, stream, result, chunk_size, data):
+        """
+            Pass chunk to sink and read next one
+            @param stream as Gio.InputStream
+            @param result as Gio.AsyncResult
+            @param chunk_size as int
+            @param data as (str, Soup.Message, HttpSink,
+                            Gio.Cancellable, function, [])
+        """
+        try:
+            chunk = stream.read_bytes_finish(result).get_data()
+            if not chunk:
+                stream.close_async(GLib.PRIORITY_LOW, None, None)
+                self.__finish(True, data)
+                return
+            data[2].write(chunk)
+            # Stream is fast enough, ask for more at once
+            if len(chunk) == chunk_size:
+                chunk_size = min(chunk_size * 2, self.__CHUNK_SIZE_MAX)
+            self.__read(stream, chunk_size, data)
+        except Exception as e:
+            Logger.error("HttpClient::__on_read_bytes_async(): %s, %s",
+                         e, data[0])
+            self.__finish(False, data)
@@ -58,7 +58,8 @@ class Logger:
             Log debug message
             @parma msg as str
         """
-        if App().settings.get_value("debug"):
+        # No application when used from tools
+        if App() is not None and App().settings.get_value("debug"):
             Logger.get_default().debug(msg, *args)
 
     @staticmethod
@@ -67,7 +68,8 @@ class Logger:
             Log debug sync message
             @parma msg as str
         """
-        if App().settings.get_value("debug-sync"):
+        # No application when used from tools
+        if App() is not None and App().settings.get_value("debug-sync"):
             Logger.get_default().debug(msg, *args)
 
     @staticmethod
@@ -0,0 +1,278 @@
+# Copyright (c) 2017-2021 Cedric Bellegarde <cedric.bellegarde@adishatz.org>
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+from gi.repository import GLib
+
+from urllib.parse import urlparse
+
+from eolie.define import App, Type, Score, TaskPriority
+from eolie.popover_uri_item import Item
+from eolie.logger import Logger
+
+
+class OmniboxSearch:
+    """
+        Results for a search, merged by uri
+    """
+
+    def __init__(self, value, cancellable, callback, args):
+        """
+            Init search
+            @param value as str
+            @param cancellable as Gio.Cancellable
+            @param callback as function
+            @param args as []
+        """
+        self.value = value
+        self.cancellable = cancellable
+        self.callback = callback
+        self.args = args
+        self.pending = 0
+        self.timeout_id = None
+        # provider => [(id, type, title, uri, score)]
+        self.results = {}
+        # uri => Item
+        self.items = {}
+
+
+class Omnibox:
+    """
+        Query omnibox providers concurrently and merge their results:
+        - history: frecency, bounded by history boost
+        - bookmarks: bookmark boost
+        - opened pages: open tab boost
+        - remote suggestions: suggestion score
+        Providers not finished after LATENCY_BUDGET ms are ignored
+    """
+
+    LATENCY_BUDGET = 1000
+    __LIMIT = 15
+    __SUGGESTIONS = 2
+    # Do not query remote suggestions for each keystroke
+    __SUGGESTIONS_DELAY = 100
+
+    def __init__(self):
+        """
+            Init omnibox
+        """
+        self.__suggestions_id = None
+
+    def search(self, value, webviews, cancellable, callback, *args):
+        """
+            Search value, callback is called each time a provider finishes
+            @param value as str
+            @param webviews as [WebView]
+            @param cancellable as Gio.Cancellable
+            @param callback as function
+            @callback ([Item] sorted by score, finished as bool, *args)
+        """
+        search = OmniboxSearch(value, cancellable, callback, args)
+        providers = [self.__search_history]
+        if value:
+            providers.append(self.__search_bookmarks)
+        search.pending = len(providers)
+        for provider in providers:
+            App().task_helper.run(provider, search,
+                                  priority=TaskPriority.INTERACTIVE,
+                                  cancellable=cancellable)
+        # Opened pages: main thread only, no need for a worker
+        if len(value) > 1:
+            self.__add_results(search, "webviews",
+                               self.__search_webviews(value, webviews))
+        parsed = urlparse(value)
+        is_uri = parsed.scheme in ["about", "http", "file",
+                                   "https", "populars"]
+        # Remove any pending suggestion search
+        if self.__suggestions_id is not None:
+            GLib.source_remove(self.__suggestions_id)
+            self.__suggestions_id = None
+        if App().settings.get_value("enable-suggestions") and\
+                value.strip() and not is_uri:
+            search.pending += 1
+            self.__suggestions_id = GLib.timeout_add(
+                self.__SUGGESTIONS_DELAY,
+                self.__on_suggestions_timeout,
+                search)
+        search.timeout_id = GLib.timeout_add(self.LATENCY_BUDGET,
+                                             self.__on_budget_timeout,
+                                             search)
+
+#######################
+# PRIVATE             #
+#######################
+    def __search_history(self, search):
+        """
+            Search value in history
+            @param search as OmniboxSearch
+            @thread safe
+        """
+        results = []
+        if not search.cancellable.is_cancelled():
+            if search.value:
+                items = App().history.search(search.value, self.__LIMIT)
+            else:
+                items = App().history.get_populars(25)
+                count = len(items)
+                # Populars are already sorted by frecency
+                items = [(history_id, title, uri, count - i)
+                         for (i, (history_id, title, uri))
+                         in enumerate(items)]
+            for (history_id, title, uri, frecency) in items:
+                score = int(frecency * Score.HISTORY /
+                            (frecency + Score.FRECENCY))
+                results.append((history_id, Type.SEARCH, title, uri,
+                                score + self.__get_rank_score(
+                                    len(results))))
+        GLib.idle_add(self.__on_provider_finished, search, "history", results)
+
+    def __search_bookmarks(self, search):
+        """
+            Search value in bookmarks
+            @param search as OmniboxSearch
+            @thread safe
+        """
+        results = []
+        if not search.cancellable.is_cancelled():
+            items = App().bookmarks.search(search.value, self.__LIMIT)
+            for (bookmark_id, title, uri) in items:
+                results.append((bookmark_id, Type.SEARCH, title, uri,
+                                Score.BOOKMARK + self.__get_rank_score(
+                                    len(results))))
+        GLib.idle_add(self.__on_provider_finished, search,
+                      "bookmarks", results)
+
+    def __search_webviews(self, value, webviews):
+        """
+            Search value in opened pages
+            @param value as str
+            @param webviews as [WebView]
+            @return [(int, int, str, str, int)]
+        """
+        results = []
+        value = value.lower()
+        for webview in webviews:
+            uri = webview.uri
+            if uri is None:
+                continue
+            parsed = urlparse(uri)
+            if parsed.netloc.lower().find(value) != -1:
+                results.append((Type.NONE, Type.WEBVIEW,
+                                webview.title, uri, Score.WEBVIEW))
+        return results
+
+    def __get_rank_score(self, position):
+        """
+            Get score for result position in provider results
+            @param position as int
+            @return int
+        """
+        return (self.__LIMIT - position) * Score.RANK
+
+    def __add_results(self, search, provider, results):
+        """
+            Set provider results, merge all results by uri and notify callback
+            @param search as OmniboxSearch
+            @param provider as str
+            @param results as [(int, int, str, str, int)]
+        """
+        search.results[provider] = results
+        items = {}
+        for provider_results in search.results.values():
+            for (item_id, item_type, title, uri, score) in provider_results:
+                key = uri.rstrip("/")
+                if key not in items.keys():
+                    # Keep items from previous merge, rows are bound to them
+                    item = search.items.get(key, None)
+                    if item is None:
+                        item = Item()
+                    item.set_property("id", item_id)
+                    item.set_property("type", item_type)
+                    item.set_property("title", title)
+                    item.set_property("uri", uri)
+                    item.set_property("score", score)
+                    items[key] = item
+                    continue
+                item = items[key]
+                item.set_property("score", item.get_property("score") + score)
+                # Switching to an opened page is better than loading it
+                if item_type == Type.WEBVIEW:
+                    item.set_property("type", item_type)
+                    item.set_property("title", title)
+                    item.set_property("uri", uri)
+                elif not item.get_property("title"):
+                    item.set_property("title", title)
+        search.items = items
+        items = sorted(items.values(),
+                       key=lambda x: x.get_property("score"),
+                       reverse=True)
+        search.callback(items, search.pending == 0, *search.args)
+
+    def __on_provider_finished(self, search, provider, results):
+        """
+            Merge provider results
+            @param search as OmniboxSearch
+            @param provider as str
+            @param results as [(int, int, str, str, int)]
+        """
+        # Search cancelled or out of budget
+        if search.cancellable.is_cancelled() or search.pending == 0:
+            return
+        search.pending -= 1
+        if search.pending == 0 and search.timeout_id is not None:
+            GLib.source_remove(search.timeout_id)
+            search.timeout_id = None
+        self.__add_results(search, provider, results)
+
+    def __on_search_suggestions(self, suggestions, finished, search):
+        """
+            Add suggestions
+            @param suggestions as [str]
+            @param finished as bool
+            @param search as OmniboxSearch
+        """
+        results = []
+        for suggestion in suggestions[:self.__SUGGESTIONS]:
+            results.append((Type.NONE, Type.SUGGESTION, suggestion,
+                            App().search.get_search_uri(suggestion),
+                            Score.SUGGESTION - len(results)))
+        if finished:
+            self.__on_provider_finished(search, "suggestions", results)
+        # Cached suggestions while loading
+        elif not search.cancellable.is_cancelled() and search.pending != 0:
+            self.__add_results(search, "suggestions", results)
+
+    def __on_suggestions_timeout(self, search):
+        """
+            Search remote suggestions
+            @param search as OmniboxSearch
+        """
+        self.__suggestions_id = None
+        if not search.cancellable.is_cancelled():
+            App().search.search_suggestions(search.value,
+                                            search.cancellable,
+                                            self.__on_search_suggestions,
+                                            search)
+
+    def __on_budget_timeout(self, search):
+        """
+            Ignore providers still running
+            @param search as OmniboxSearch
+        """
+        search.timeout_id = None
+        if search.pending != 0 and not search.cancellable.is_cancelled():
+            Logger.debug("Omnibox: %s providers out of budget",
+                         search.pending)
+            search.pending = 0
+            search.callback(sorted(search.items.values(),
+                                   key=lambda x: x.get_property("score"),
+                                   reverse=True),
+                            True, *search.args)
@@ -10,7 +10,7 @@
 # You should have received a copy of the GNU General Public License
 # along with this program. If not, see <http://www.gnu.org/licenses/>.
 
-from gi.repository import Gtk, GLib, Gio, WebKit2, Gdk
+from gi.repository import Gtk, GLib, Gio, Gdk
 
 from time import time
 from gettext import gettext as _
@@ -94,7 +94,7 @@ class DownloadRow(Gtk.ListBoxRow):
             webview = self.__download.get_web_view()
             App().download_manager.remove(self.__download)
             if webview is None:
-                WebKit2.WebContext.get_default().download_uri(self.__uri)
+                App().context_pool.default.download_uri(self.__uri)
             else:
                 webview.download_uri(self.__uri)
             self.destroy()
@@ -15,7 +15,6 @@ from gi.repository import Gtk, GLib, Gio
 from gettext import gettext as _
 from time import mktime, time
 from datetime import datetime
-from locale import strcoll
 from urllib.parse import urlparse
 
 from eolie.helper_task import TaskHelper
@@ -23,13 +22,10 @@ from eolie.define import App, Type, TimeSpan, TimeSpanValues
 from eolie.popover_uri_row import Row
 from eolie.popover_uri_events import UriPopoverEvents
 from eolie.popover_uri_content import UriPopoverContent
-from eolie.popover_uri_suggestions import UriPopoverSuggestions
-from eolie.popover_uri_webviews import UriPopoverWebviews
 from eolie.popover_uri_input import Input
 
 
-class UriPopover(Gtk.Popover, UriPopoverEvents, UriPopoverContent,
-                 UriPopoverSuggestions, UriPopoverWebviews):
+class UriPopover(Gtk.Popover, UriPopoverEvents, UriPopoverContent):
     """
         Show user bookmarks or search
     """
@@ -42,8 +38,6 @@ class UriPopover(Gtk.Popover, UriPopoverEvents, UriPopoverContent,
         Gtk.Popover.__init__(self)
         UriPopoverEvents.__init__(self)
         UriPopoverContent.__init__(self)
-        UriPopoverSuggestions.__init__(self)
-        UriPopoverWebviews.__init__(self)
         self.__cancellable = Gio.Cancellable.new()
         self._task_helper = TaskHelper()
         self.set_modal(False)
@@ -66,10 +60,11 @@ class UriPopover(Gtk.Popover, UriPopoverEvents, UriPopoverContent,
         self._history_box.bind_model(self._history_model,
                                      self.__on_item_create)
         self._search_box = builder.get_object("search_box")
+        self._search_box.set_sort_func(self.__sort_search)
         self._stack = builder.get_object("stack")
         self.__tags = builder.get_object("tags")
         self._tags_box = builder.get_object("tags_box")
-        self._tags_box.set_sort_func(self.__sort_tags)
+        self._tags_box.bind_model(self._tags_model, self._create_tag_row)
         self._remove_button = builder.get_object("remove_button")
         self._bookmarks_count = builder.get_object("count")
         self._bookmarks_box = builder.get_object("bookmarks_box")
@@ -114,10 +109,21 @@ class UriPopover(Gtk.Popover, UriPopoverEvents, UriPopoverContent,
         for child in self._search_box.get_children():
             child.destroy()
         self.search_value(value, self.__cancellable)
-        self.add_suggestions(value, self.__cancellable)
-        self.add_webviews(value, self.__cancellable)
         self._stack.set_visible_child_name("search")
 
+    def clear_models(self):
+        """
+            Drop models content if popover hidden
+            @return removed items count as int
+        """
+        if self.is_visible():
+            return 0
+        count = self._bookmarks_model.get_n_items() +\
+            self._history_model.get_n_items()
+        self._bookmarks_helper.clear()
+        self._history_helper.clear()
+        return count
+
     @property
     def input(self):
         """
@@ -258,18 +264,7 @@ class UriPopover(Gtk.Popover, UriPopoverEvents, UriPopoverContent,
         if row is not None:
             current = row.item.get_property("id")
         self._input == Input.TAGS
-        for child in self._tags_box.get_children():
-            self._tags_box.remove(child)
-        static = [(Type.POPULARS,
-                   # Translators: Plural
-                   _("Popular")),
-                  (Type.RECENTS,
-                   # Translators: Plural
-                   _("Recent")),
-                  (Type.UNCLASSIFIED,
-                   _("Unclassified"))]
-        GLib.idle_add(self._add_tags,
-                      static + App().bookmarks.get_all_tags(), current)
+        self._set_tags(current)
 
     def _on_day_selected(self, calendar):
         """
@@ -279,9 +274,7 @@ class UriPopover(Gtk.Popover, UriPopoverEvents, UriPopoverContent,
         (year, month, day) = calendar.get_date()
         date = datetime(year, month + 1, day, 0, 0)
         atime = mktime(date.timetuple())
-        result = App().history.get(atime)
-        self._history_model.remove_all()
-        GLib.idle_add(self._add_history_items, result, (year, month, day))
+        self._set_history(atime)
         self.__infobar.hide()
 
     def _on_clear_history_clicked(self, button):
@@ -336,16 +329,14 @@ class UriPopover(Gtk.Popover, UriPopoverEvents, UriPopoverContent,
             for history_id in App().history.get_empties():
                 App().history.remove(history_id)
 
-    def __sort_tags(self, row1, row2):
+    def __sort_search(self, row1, row2):
         """
-            Sort tags
+            Sort search rows by score
             @param row1 as Row
             @param row2 as Row
         """
-        if row1.item.get_property("type") < 0:
-            return False
-        return strcoll(row1.item.get_property("title"),
-                       row2.item.get_property("title"))
+        return row2.item.get_property("score") -\
+            row1.item.get_property("score")
 
     def __on_map(self, widget):
         """
@@ -368,9 +359,8 @@ class UriPopover(Gtk.Popover, UriPopoverEvents, UriPopoverContent,
             @param widget as Gtk.Widget
         """
         self._stack.set_visible_child_name("bookmarks")
-        self._bookmarks_model.remove_all()
-        for child in self._tags_box.get_children():
-            child.destroy()
+        self._bookmarks_helper.clear()
+        self._tags_helper.clear()
         for child in self._search_box.get_children():
             child.destroy()
 
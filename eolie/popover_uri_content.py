@@ -10,7 +10,7 @@
 # You should have received a copy of the GNU General Public License
 # along with this program. If not, see <http://www.gnu.org/licenses/>.
 
-from gi.repository import GLib, Gio
+from gi.repository import Gio
 
 from gettext import gettext as _
 
@@ -18,6 +18,8 @@ from eolie.define import App, Type
 from eolie.popover_uri_item import Item
 from eolie.popover_uri_row import Row
 from eolie.popover_uri_input import Input
+from eolie.omnibox import Omnibox
+from eolie.helper_model import ModelHelper
 
 
 class UriPopoverContent:
@@ -32,6 +34,13 @@ class UriPopoverContent:
         self._input = None
         self._bookmarks_model = Gio.ListStore()
         self._history_model = Gio.ListStore()
+        self._tags_model = Gio.ListStore()
+        self._bookmarks_helper = ModelHelper(self._bookmarks_model)
+        self._history_helper = ModelHelper(self._history_model)
+        self._tags_helper = ModelHelper(self._tags_model)
+        self.__omnibox = Omnibox()
+        # Item => (Row, type)
+        self.__search_rows = {}
 
     def search_value(self, value, cancellable):
         """
@@ -39,90 +48,47 @@ class UriPopoverContent:
            @param value as str
            @param cancellable as Gio.Cancellable
         """
-        self._task_helper.run(self.__search_value, value, cancellable)
+        self.__search_rows = {}
+        self.__omnibox.search(value, self._window.container.webviews,
+                              cancellable, self.__on_search_results,
+                              cancellable)
 
 #######################
 # PROTECTED           #
 #######################
-    def _add_bookmarks(self, bookmarks):
+    def _set_tags(self, select):
         """
-            Add bookmarks to model
-            @param [(bookmark_id, title, uri)] as [(int, str, str)]
+            Set tags, select tag id
+            @param select as int
         """
-        if bookmarks:
-            (bookmark_id, uri, title) = bookmarks.pop(0)
-            item = Item()
-            item.set_property("id", bookmark_id)
-            item.set_property("type", Type.BOOKMARK)
-            item.set_property("title", title)
-            item.set_property("uri", uri)
-            self._bookmarks_model.append(item)
-            GLib.idle_add(self._add_bookmarks, bookmarks)
+        self._tags_helper.load(self.__get_tag_items,
+                               callback=(self.__on_tags_loaded, select))
 
-    def _add_tags(self, tags, select, position=0):
+    def _set_history(self, atime):
         """
-            Add tags to model
-            @param [(tag_id, title)] as [(int, str)]
-            @param select as int
+            Set history for day
+            @param atime as int
         """
-        if tags:
-            (tag_id, title) = tags.pop(0)
-            item = Item()
-            item.set_property("id", tag_id)
-            item.set_property("type", Type.TAG)
-            item.set_property("title", title)
-            child = Row(item, self._window)
-            child.connect("activate", self.__on_row_activated)
-            child.connect("moved", self.__on_row_moved)
-            child.show()
-            self._tags_box.add(child)
-            GLib.idle_add(self._add_tags, tags, select)
-        else:
-            if select is None:
-                select = Type.POPULARS
-            # Search for previous current row
-            for row in self._tags_box.get_children():
-                if row.item.get_property("id") == select:
-                    self._tags_box.select_row(row)
-                    break
-            self._set_bookmarks(select)
-
-    def _add_history_items(self, items, date):
-        """
-            Add history items to model
-            @param [(history_id, title, uri, atime)]  as [(int, str, str, int)]
-            @param date (jj, mm, aaaa) as (int, int, int)
-        """
-        if items:
-            if date != self._calendar.get_date():
-                return
-            (history_id, title, uri, atime) = items.pop(0)
-            item = Item()
-            item.set_property("id", history_id)
-            item.set_property("type", Type.HISTORY)
-            item.set_property("title", title)
-            item.set_property("uri", uri)
-            item.set_property("atime", atime)
-            self._history_model.append(item)
-            GLib.idle_add(self._add_history_items, items, date)
+        self._history_helper.load(self.__get_history_items, atime)
 
     def _set_bookmarks(self, tag_id):
         """
             Set bookmarks for tag id
             @param tag id as int
         """
-        self._bookmarks_model.remove_all()
         self._remove_button.hide()
-        if tag_id == Type.POPULARS:
-            items = App().bookmarks.get_populars(50)
-        elif tag_id == Type.RECENTS:
-            items = App().bookmarks.get_recents()
-        elif tag_id == Type.UNCLASSIFIED:
-            items = App().bookmarks.get_unclassified()
-        else:
-            items = App().bookmarks.get_bookmarks(tag_id)
-        self._bookmarks_count.set_text(_("%s bookmarks") % len(items))
-        GLib.idle_add(self._add_bookmarks, items)
+        self._bookmarks_helper.load(self.__get_bookmark_items, tag_id,
+                                    callback=(self.__on_bookmarks_loaded,))
+
+    def _create_tag_row(self, item):
+        """
+            Create a row for tag item
+            @param item as Item
+        """
+        child = Row(item, self._window)
+        child.connect("activate", self.__on_row_activated)
+        child.connect("moved", self.__on_row_moved)
+        return child
 
     def _get_current_box(self):
         """
@@ -156,38 +122,121 @@ class UriPopoverContent:
 #######################
 # PRIVATE             #
 #######################
-    def __search_value(self, value, cancellable):
+    def __get_tag_items(self):
         """
-            Search for value in DB
-            @param value as str
-            @param cancellable as Gio.Cancellable
+            Get tag items
+            @return [Item]
+            @thread safe
         """
-        if value == "":
-            result = App().history.get_populars(25)
+        static = [(Type.POPULARS,
+                   # Translators: Plural
+                   _("Popular")),
+                  (Type.RECENTS,
+                   # Translators: Plural
+                   _("Recent")),
+                  (Type.UNCLASSIFIED,
+                   _("Unclassified"))]
+        items = []
+        for (tag_id, title) in static + App().bookmarks.get_all_tags():
+            item = Item()
+            item.set_property("id", tag_id)
+            item.set_property("type", Type.TAG)
+            item.set_property("title", title)
+            items.append(item)
+        return items
+
+    def __get_history_items(self, atime):
+        """
+            Get history items for day
+            @param atime as int
+            @return [Item]
+            @thread safe
+        """
+        items = []
+        for (history_id, title, uri, atime) in App().history.get(atime):
+            item = Item()
+            item.set_property("id", history_id)
+            item.set_property("type", Type.HISTORY)
+            item.set_property("title", title)
+            item.set_property("uri", uri)
+            item.set_property("atime", atime)
+            items.append(item)
+        return items
+
+    def __get_bookmark_items(self, tag_id):
+        """
+            Get bookmark items for tag id
+            @param tag_id as int
+            @return [Item]
+            @thread safe
+        """
+        if tag_id == Type.POPULARS:
+            bookmarks = App().bookmarks.get_populars(50)
+        elif tag_id == Type.RECENTS:
+            bookmarks = App().bookmarks.get_recents()
+        elif tag_id == Type.UNCLASSIFIED:
+            bookmarks = App().bookmarks.get_unclassified()
         else:
-            result = App().bookmarks.search(value, 15)
-            result += App().history.search(value, 15)
-        GLib.idle_add(self.__add_searches, result, cancellable)
+            bookmarks = App().bookmarks.get_bookmarks(tag_id)
+        items = []
+        for (bookmark_id, uri, title) in bookmarks:
+            item = Item()
+            item.set_property("id", bookmark_id)
+            item.set_property("type", Type.BOOKMARK)
+            item.set_property("title", title)
+            item.set_property("uri", uri)
+            items.append(item)
+        return items
+
+    def __on_tags_loaded(self, count, select):
+        """
+            Select tag and load its bookmarks
+            @param count as int
+            @param select as int
+        """
+        if select is None:
+            select = Type.POPULARS
+        # Search for previous current row
+        for row in self._tags_box.get_children():
+            if row.item.get_property("id") == select:
+                self._tags_box.select_row(row)
+                break
+        self._set_bookmarks(select)
 
-    def __add_searches(self, result, cancellable):
+    def __on_bookmarks_loaded(self, count):
         """
-            Add searches to model
-            @param result as [(str, str, int)]
+            Update bookmarks count
+            @param count as int
+        """
+        self._bookmarks_count.set_text(_("%s bookmarks") % count)
+
+    def __on_search_results(self, items, finished, cancellable):
+        """
+            Update search rows, box is sorted by score
+            @param items as [Item]
+            @param finished as bool
             @param cancellable as Gio.Cancellable
         """
         if cancellable.is_cancelled():
             return
-        if result:
-            (rowid, title, uri) = result.pop(0)
-            item = Item()
-            item.set_property("id", rowid)
-            item.set_property("type", Type.SEARCH)
-            item.set_property("title", title)
-            item.set_property("uri", uri)
+        # Remove rows for items not in results anymore
+        for item in list(self.__search_rows.keys()):
+            if item not in items:
+                (child, child_type) = self.__search_rows.pop(item)
+                child.destroy()
+        for item in items:
+            item_type = item.get_property("type")
+            if item in self.__search_rows.keys():
+                (child, child_type) = self.__search_rows[item]
+                if child_type == item_type:
+                    continue
+                # Item merged with an opened page
+                child.destroy()
             child = Row(item, self._window)
             child.show()
             self._search_box.add(child)
-            GLib.idle_add(self.__add_searches, result, cancellable)
+            self.__search_rows[item] = (child, item_type)
+        self._search_box.invalidate_sort()
 
     def __on_row_activated(self, row):
         """
@@ -37,6 +37,7 @@ class Row(Gtk.ListBoxRow):
         self.__item = item
         self.__window = window
         self.__search = ""
+        self.__map_id = None
         eventbox = None
         favicon = None
         Gtk.ListBoxRow.__init__(self)
@@ -50,8 +51,11 @@ class Row(Gtk.ListBoxRow):
         grid.set_hexpand(True)
         grid.set_property("valign", Gtk.Align.CENTER)
         if item_type in [Type.BOOKMARK, Type.SEARCH, Type.HISTORY]:
-            favicon = Gtk.Image()
-            self.__set_favicon(favicon)
+            favicon = Gtk.Image.new_from_icon_name("web-browser-symbolic",
+                                                   Gtk.IconSize.LARGE_TOOLBAR)
+            favicon.show()
+            # Load favicon only when row is shown
+            self.__map_id = self.connect("map", self.__on_map, favicon)
         elif item_type == Type.SUGGESTION:
             favicon = Gtk.Image.new_from_icon_name("system-search-symbolic",
                                                    Gtk.IconSize.MENU)
@@ -165,16 +169,22 @@ class Row(Gtk.ListBoxRow):
         """
             Try to get a favicon for current URI
             @param favicon as Gtk.Image
-            @param uri as str
         """
         uri = self.__item.get_property("uri")
         favicon_path = App().art.get_favicon_path(uri)
         if favicon_path is not None:
             favicon.set_from_file(favicon_path)
-        else:
-            favicon.set_from_icon_name("web-browser-symbolic",
-                                       Gtk.IconSize.LARGE_TOOLBAR)
-        favicon.show()
+
+    def __on_map(self, widget, favicon):
+        """
+            Load favicon
+            @param widget as Gtk.Widget
+            @param favicon as Gtk.Image
+        """
+        self.disconnect(self.__map_id)
+        self.__map_id = None
+        GLib.idle_add(self.__set_favicon, favicon,
+                      priority=GLib.PRIORITY_LOW)
 
     def __on_query_tooltip(self, widget, x, y, keyboard, tooltip):
         """
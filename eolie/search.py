@@ -10,13 +10,14 @@
 # You should have received a copy of the GNU General Public License
 # along with this program. If not, see <http://www.gnu.org/licenses/>.
 
-from gi.repository import Gio, GLib
+from gi.repository import Gio
 
 from gettext import gettext as _
 from urllib.parse import urlparse
 import json
 
 from eolie.helper_task import TaskHelper
+from eolie.search_suggestions import SearchSuggestions
 from eolie.define import App, EOLIE_DATA_PATH
 from eolie.logger import Logger
 
@@ -32,6 +33,7 @@ class Search:
             @param user_agent as str
         """
         self.__user_agent = user_agent
+        self.__suggestions = SearchSuggestions(user_agent)
         # Gettext does not work outside init
         self.__ENGINES = {
             'Google': [
@@ -127,24 +129,17 @@ class Search:
         except:
             return self.engines["Google"][1] % words
 
-    def search_suggestions(self, value, cancellable, callback):
+    def search_suggestions(self, value, cancellable, callback, *args):
         """
             Search suggestions for value
             @param value as str
             @param cancellable as Gio.Cancellable
-            @param callback as str
+            @param callback as function
+            @callback (suggestions as [str], finished as bool, *args)
         """
-        try:
-            if not value.strip(" "):
-                return
-            uri = self.__suggest % GLib.uri_escape_string(value,
-                                                          None,
-                                                          True)
-            task_helper = TaskHelper(self.__user_agent)
-            task_helper.load_uri_content(uri, cancellable,
-                                         callback, self.__encoding, value)
-        except Exception as e:
-            Logger.error("Search::search_suggestions(): %s", e)
+        if self.__suggest:
+            self.__suggestions.search(self.__suggest, self.__encoding, value,
+                                      cancellable, callback, *args)
 
     def install_engine(self, uri, window):
         """
@@ -0,0 +1,193 @@
+# Copyright (c) 2017-2021 Cedric Bellegarde <cedric.bellegarde@adishatz.org>
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import gi
+gi.require_version("Soup", "2.4")
+from gi.repository import GLib, Soup
+
+from urllib.parse import urlparse
+from collections import OrderedDict
+from time import monotonic
+import json
+
+from eolie.logger import Logger
+
+
+class SearchSuggestions:
+    """
+        Search suggestions client:
+        - one keep-alive session per suggestion host
+        - LRU cache keyed by (engine, normalized value) with TTL
+        - cached results for a shorter value are filtered and returned
+          while request is running
+        - a new request cancels running one
+    """
+
+    __CACHE_SIZE = 200
+    __CACHE_TTL = 600
+    __TIMEOUT = 5
+
+    def __init__(self, user_agent=None):
+        """
+            Init client
+            @param user_agent as str
+        """
+        self.__user_agent = user_agent
+        # netloc => Soup.Session
+        self.__sessions = {}
+        # (engine uri, value) => (time, [str])
+        self.__cache = OrderedDict()
+        self.__running = None
+
+    def search(self, uri, encoding, value, cancellable, callback, *args):
+        """
+            Get suggestions for value
+            @param uri as str: engine suggestion uri, %s is value
+            @param encoding as str
+            @param value as str
+            @param cancellable as Gio.Cancellable
+            @param callback as function
+            @callback (suggestions as [str], finished as bool, *args)
+        """
+        self.cancel()
+        value = self.__normalize(value)
+        if not value:
+            return
+        key = (uri, value)
+        cached = self.__get_cached(key)
+        if cached is not None:
+            callback(cached, True, *args)
+            return
+        # Filter results for a shorter value while loading
+        for i in range(len(value) - 1, 0, -1):
+            cached = self.__get_cached((uri, value[:i]))
+            if cached is not None:
+                suggestions = [suggestion for suggestion in cached
+                               if suggestion.lower().startswith(value)]
+                if suggestions:
+                    callback(suggestions, False, *args)
+                break
+        try:
+            search_uri = uri % GLib.uri_escape_string(value, None, True)
+            session = self.__get_session(search_uri)
+            message = Soup.Message.new("GET", search_uri)
+            self.__running = (session, message)
+            session.queue_message(message, self.__on_queue_message,
+                                  (key, encoding, cancellable,
+                                   callback, args))
+        except Exception as e:
+            Logger.error("SearchSuggestions::search(): %s", e)
+            callback([], True, *args)
+
+    def cancel(self):
+        """
+            Cancel running request
+        """
+        if self.__running is not None:
+            (session, message) = self.__running
+            self.__running = None
+            session.cancel_message(message, Soup.Status.CANCELLED)
+
+#######################
+# PRIVATE             #
+#######################
+    def __normalize(self, value):
+        """
+            Normalize value for cache
+            @param value as str
+            @return str
+        """
+        return " ".join(value.lower().split())
+
+    def __get_cached(self, key):
+        """
+            Get cached suggestions for key
+            @param key as (str, str)
+            @return [str]/None
+        """
+        if key not in self.__cache.keys():
+            return None
+        (mtime, suggestions) = self.__cache[key]
+        if monotonic() - mtime > self.__CACHE_TTL:
+            del self.__cache[key]
+            return None
+        self.__cache.move_to_end(key)
+        return suggestions
+
+    def __set_cached(self, key, suggestions):
+        """
+            Cache suggestions for key
+            @param key as (str, str)
+            @param suggestions as [str]
+        """
+        self.__cache[key] = (monotonic(), suggestions)
+        self.__cache.move_to_end(key)
+        while len(self.__cache) > self.__CACHE_SIZE:
+            self.__cache.popitem(last=False)
+
+    def __get_session(self, uri):
+        """
+            Get session for uri host
+            @param uri as str
+            @return Soup.Session
+        """
+        netloc = urlparse(uri).netloc
+        if netloc not in self.__sessions.keys():
+            session = Soup.Session.new()
+            session.set_property("accept-language-auto", True)
+            session.set_property("timeout", self.__TIMEOUT)
+            if self.__user_agent is not None:
+                session.set_property("user-agent", self.__user_agent)
+            self.__sessions[netloc] = session
+        return self.__sessions[netloc]
+
+    def __parse(self, content, encoding):
+        """
+            Parse OpenSearch suggestions response:
+            [query, [completions], [descriptions], [query urls]]
+            @param content as bytes
+            @param encoding as str
+            @return [str]
+        """
+        data = json.loads(content.decode(encoding, errors="replace"))
+        if not isinstance(data, list) or len(data) < 2 or\
+                not isinstance(data[1], list):
+            return []
+        return [suggestion for suggestion in data[1]
+                if isinstance(suggestion, str) and suggestion]
+
+    def __on_queue_message(self, session, message, data):
+        """
+            Parse suggestions and pass them to callback
+            @param session as Soup.Session
+            @param message as Soup.Message
+            @param data as ((str, str), str, Gio.Cancellable, function, [])
+        """
+        (key, encoding, cancellable, callback, args) = data
+        if self.__running is not None and self.__running[1] == message:
+            self.__running = None
+        if message.status_code == Soup.Status.CANCELLED or\
+                cancellable.is_cancelled():
+            return
+        suggestions = []
+        try:
+            if message.status_code == Soup.Status.OK:
+                body = message.get_property("response-body-data")
+                suggestions = self.__parse(body.get_data(), encoding)
+                self.__set_cached(key, suggestions)
+            else:
+                Logger.debug("SearchSuggestions: %s, status %s",
+                             message.get_uri().to_string(False),
+                             message.status_code)
+        except Exception as e:
+            Logger.error("SearchSuggestions::__on_queue_message(): %s", e)
+        callback(suggestions, True, *args)
@@ -11,21 +11,60 @@
 # You should have received a copy of the GNU General Public License
 # along with this program. If not, see <http://www.gnu.org/licenses/>.
 
-from threading import current_thread
+from threading import current_thread, local
 
 from eolie.define import App
+from eolie.logger import Logger
 
 
 class SqlCursor:
     """
         Context manager to get the SQL cursor
+        Connections are pooled by thread and kept open for thread lifetime
     """
+
+    # Default PRAGMAs, a database may override them with a PRAGMAS dict
+    PRAGMAS = {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "cache_size": -4000,
+        "mmap_size": 67108864,
+        "temp_store": "MEMORY",
+        "busy_timeout": 60000
+    }
+
+    __pool = local()
+
+    def get_connection(obj):
+        """
+            Get connection for current thread
+            @param obj as Database
+            @return sqlite3.Connection
+        """
+        if not hasattr(SqlCursor.__pool, "connections"):
+            SqlCursor.__pool.connections = {}
+            SqlCursor.__pool.depths = {}
+        name = obj.__class__.__name__
+        if name not in SqlCursor.__pool.connections.keys():
+            connection = obj.get_cursor()
+            pragmas = dict(SqlCursor.PRAGMAS)
+            pragmas.update(getattr(obj, "PRAGMAS", {}))
+            for key in pragmas.keys():
+                try:
+                    connection.execute("PRAGMA %s=%s" % (key, pragmas[key]))
+                except Exception as e:
+                    Logger.error("SqlCursor::get_connection(): %s, %s",
+                                 key, e)
+            SqlCursor.__pool.connections[name] = connection
+            SqlCursor.__pool.depths[name] = 0
+        return SqlCursor.__pool.connections[name]
+
     def add(obj):
         """
             Add cursor to thread list
         """
         name = current_thread().getName() + obj.__class__.__name__
-        App().cursors[name] = obj.get_cursor()
+        App().cursors[name] = SqlCursor.get_connection(obj)
 
     def remove(obj):
         """
@@ -36,7 +75,6 @@ class SqlCursor:
             obj.thread_lock.acquire()
             App().cursors[name].commit()
             obj.thread_lock.release()
-            App().cursors[name].close()
             del App().cursors[name]
 
     def commit(obj):
@@ -45,9 +83,16 @@ class SqlCursor:
         """
         name = current_thread().getName() + obj.__class__.__name__
         if name in App().cursors.keys():
-            obj.thread_lock.acquire()
-            App().cursors[name].commit()
-            obj.thread_lock.release()
+            with obj.thread_lock:
+                App().cursors[name].commit()
+
+    def rollback(obj):
+        """
+            Rollback current obj
+        """
+        name = current_thread().getName() + obj.__class__.__name__
+        if name in App().cursors.keys():
+            App().cursors[name].rollback()
 
     def __init__(self, obj, commit=False):
         """
@@ -61,24 +106,30 @@ class SqlCursor:
 
     def __enter__(self):
         """
-            Get thread cursor or a new one
+            Get thread cursor or pooled one
         """
         name = current_thread().getName() + self.__obj.__class__.__name__
         if name in App().cursors.keys():
             cursor = App().cursors[name]
             return cursor
         else:
-            self.__cursor = self.__obj.get_cursor()
+            self.__cursor = SqlCursor.get_connection(self.__obj)
+            SqlCursor.__pool.depths[self.__obj.__class__.__name__] += 1
             return self.__cursor
 
     def __exit__(self, type, value, traceback):
         """
-            Close cursor if not thread cursor
+            Commit or rollback if not thread cursor, nested cursors share
+            outer cursor transaction
         """
         if self.__cursor is not None:
+            name = self.__obj.__class__.__name__
+            SqlCursor.__pool.depths[name] -= 1
             if self.__commit:
                 self.__obj.thread_lock.acquire()
                 self.__cursor.commit()
                 self.__obj.thread_lock.release()
-            self.__cursor.close()
+            elif SqlCursor.__pool.depths[name] == 0 and\
+                    self.__cursor.in_transaction:
+                self.__cursor.rollback()
         self.__cursor = None
@@ -0,0 +1,192 @@
+# Copyright (c) 2017-2021 Cedric Bellegarde <cedric.bellegarde@adishatz.org>
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+from gi.repository import GLib
+
+from threading import Thread, Condition, Lock
+from collections import deque
+
+from eolie.define import TaskPriority
+from eolie.logger import Logger
+
+
+class Task:
+    """
+        A queued task
+    """
+
+    def __init__(self, command, args, callback, cancellable, key):
+        """
+            Init task
+            @param command as function
+            @param args as []
+            @param callback as (function, *args)
+            @param cancellable as Gio.Cancellable
+            @param key as str
+        """
+        self.command = command
+        self.args = args
+        self.callback = callback
+        self.cancellable = cancellable
+        self.key = key
+
+
+class TaskPool:
+    """
+        Run tasks in a fixed size thread pool:
+        - tasks are queued in priority lanes: interactive, background, bulk
+        - interactive tasks always have a free thread, bulk tasks can't use
+          more than half of the threads
+        - a queued task with the same key as a new task is replaced
+        - tasks without key are never dropped, lanes grow when needed
+        - cancelled tasks are not run
+        - callbacks are run by one main loop dispatcher, with None as
+          result for replaced and cancelled tasks
+    """
+
+    __THREADS = 4
+    # Max running tasks by lane
+    __MAX_RUNNING = {TaskPriority.INTERACTIVE: __THREADS,
+                     TaskPriority.BACKGROUND: __THREADS - 1,
+                     TaskPriority.BULK: __THREADS // 2}
+    # Queued tasks by lane before warning
+    __MAX_QUEUED = {TaskPriority.INTERACTIVE: 32,
+                    TaskPriority.BACKGROUND: 512,
+                    TaskPriority.BULK: 128}
+
+    def __init__(self):
+        """
+            Init pool
+        """
+        self.__condition = Condition()
+        self.__lanes = {}
+        self.__running = {}
+        for priority in self.__MAX_QUEUED.keys():
+            self.__lanes[priority] = deque()
+            self.__running[priority] = 0
+        self.__callbacks = deque()
+        self.__callbacks_lock = Lock()
+        self.__dispatch_id = None
+        for i in range(0, self.__THREADS):
+            thread = Thread(target=self.__run, name="TaskPool-%s" % i)
+            thread.daemon = True
+            thread.start()
+
+    def add(self, command, args, callback=None, priority=None,
+            cancellable=None, key=None):
+        """
+            Queue command
+            @param command as function
+            @param args as []
+            @param callback as (function, *args)
+            @param priority as TaskPriority
+            @param cancellable as Gio.Cancellable
+            @param key as str: replace queued task with same key
+        """
+        if priority is None:
+            priority = TaskPriority.BACKGROUND
+        task = Task(command, args, callback, cancellable, key)
+        with self.__condition:
+            lane = self.__lanes[priority]
+            if key is not None:
+                for i in range(0, len(lane)):
+                    if lane[i].key == key:
+                        self.__cancel(lane[i])
+                        lane[i] = task
+                        return
+            if len(lane) == self.__MAX_QUEUED[priority]:
+                Logger.warning("TaskPool: lane %s has %s queued tasks",
+                               priority, len(lane))
+            lane.append(task)
+            self.__condition.notify()
+
+#######################
+# PRIVATE             #
+#######################
+    def __get_task(self):
+        """
+            Get next task to run, highest priority first
+            @return (Task, TaskPriority)/(None, None)
+        """
+        # Keep a thread for interactive tasks
+        busy = self.__running[TaskPriority.BACKGROUND] +\
+            self.__running[TaskPriority.BULK]
+        for priority in sorted(self.__lanes.keys()):
+            if not self.__lanes[priority] or\
+                    self.__running[priority] >= self.__MAX_RUNNING[priority]:
+                continue
+            if priority != TaskPriority.INTERACTIVE and\
+                    busy >= self.__THREADS - 1:
+                continue
+            return (self.__lanes[priority].popleft(), priority)
+        return (None, None)
+
+    def __run(self):
+        """
+            Run queued tasks
+        """
+        while True:
+            with self.__condition:
+                (task, priority) = self.__get_task()
+                while task is None:
+                    self.__condition.wait()
+                    (task, priority) = self.__get_task()
+                self.__running[priority] += 1
+            try:
+                if task.cancellable is None or\
+                        not task.cancellable.is_cancelled():
+                    result = task.command(*task.args)
+                    if task.callback is not None:
+                        self.__add_callback(task.callback, result)
+                else:
+                    self.__cancel(task)
+            except Exception as e:
+                Logger.error("TaskPool::__run(): %s, %s", e, task.command)
+            with self.__condition:
+                self.__running[priority] -= 1
+                # A lane may be waiting for a free slot
+                self.__condition.notify_all()
+
+    def __cancel(self, task):
+        """
+            Run task callback with None as result
+            @param task as Task
+        """
+        if task.callback is not None:
+            self.__add_callback(task.callback, None)
+
+    def __add_callback(self, callback, result):
+        """
+            Queue callback for main loop
+            @param callback as (function, *args)
+            @param result as object
+        """
+        with self.__callbacks_lock:
+            self.__callbacks.append((callback, result))
+            if self.__dispatch_id is None:
+                self.__dispatch_id = GLib.idle_add(self.__dispatch)
+
+    def __dispatch(self):
+        """
+            Run queued callbacks
+        """
+        with self.__callbacks_lock:
+            callbacks = self.__callbacks
+            self.__callbacks = deque()
+            self.__dispatch_id = None
+        for ((function, *args), result) in callbacks:
+            if function is None:
+                continue
+            try:
+                function(result, *args)
+            except Exception as e:
+                Logger.error("TaskPool::__dispatch(): %s, %s", e, function)
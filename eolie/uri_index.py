@@ -0,0 +1,297 @@
+# Copyright (c) 2017-2021 Cedric Bellegarde <cedric.bellegarde@adishatz.org>
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+from threading import Lock
+from array import array
+
+
+class UriIndex:
+    """
+        In memory prefix index for uri autocompletion:
+        - keys are uris without scheme and "www."
+        - hosts and full uris are stored in two sorted tables
+        - a table packs UTF-8 keys in one buffer, sorted by an offsets
+          array, with lengths, weights and flags arrays
+        - removed keys bytes are only freed by set_items()
+        - short prefixes match many keys, their results are cached
+    """
+
+    HTTPS = 1
+    WWW = 2
+    __CACHED_PREFIX_LENGTH = 2
+
+    def __init__(self):
+        """
+            Init index
+        """
+        self.__lock = Lock()
+        self.__loaded = False
+        self.__hosts = self.__get_table({})
+        self.__uris = self.__get_table({})
+        self.__cache = {}
+
+    def set_items(self, items):
+        """
+            Replace index content
+            @param items as [(uri as str, weight as int)]
+            @thread safe
+        """
+        hosts = {}
+        uris = {}
+        for (uri, weight) in items:
+            if uri.find("://") == -1:
+                continue
+            parsed = self.__parse(uri)
+            if parsed is None:
+                continue
+            (host, key, flags) = parsed
+            for (keys, value) in [(hosts, host), (uris, key)]:
+                (current_weight, current_flags) = keys.get(value, (0, 0))
+                keys[value] = (current_weight + weight, current_flags | flags)
+        tables = (self.__get_table(hosts), self.__get_table(uris))
+        with self.__lock:
+            (self.__hosts, self.__uris) = tables
+            self.__cache = {}
+            self.__loaded = True
+
+    def add(self, uri, weight):
+        """
+            Add weight to uri, insert it if missing
+            @param uri as str
+            @param weight as int
+            @thread safe
+        """
+        if uri.find("://") == -1:
+            return
+        parsed = self.__parse(uri)
+        if parsed is None:
+            return
+        (host, key, flags) = parsed
+        with self.__lock:
+            self.__invalidate(host)
+            self.__add(self.__hosts, self.__encode(host), weight, flags)
+            self.__add(self.__uris, self.__encode(key), weight, flags)
+
+    def remove(self, uri, weight=0):
+        """
+            Remove weight from uri, drop it when weight reaches 0
+            Other scheme or "www." variants share uri weight
+            @param uri as str
+            @param weight as int
+            @thread safe
+        """
+        parsed = self.__parse(uri)
+        if parsed is None:
+            return
+        (host, key, flags) = parsed
+        with self.__lock:
+            self.__invalidate(host)
+            host = self.__encode(host)
+            self.__remove(self.__uris, self.__encode(key), weight)
+            # Keep host while uris remain for it
+            index = self.__bisect(self.__uris, host)
+            used = index < len(self.__uris[1]) and\
+                self.__get_key(self.__uris, index) == host
+            if not used:
+                index = self.__bisect(self.__uris, host + b"/")
+                used = index < len(self.__uris[1]) and\
+                    self.__get_key(self.__uris, index).startswith(host + b"/")
+            if used:
+                (data, offsets, lengths, weights, key_flags) = self.__hosts
+                index = self.__bisect(self.__hosts, host)
+                if index < len(offsets) and\
+                        self.__get_key(self.__hosts, index) == host:
+                    weights[index] = max(0, weights[index] - weight)
+            else:
+                self.__remove(self.__hosts, host, None)
+
+    def match(self, value, ssl_force=False):
+        """
+            Get best uri starting with value
+            @param value as str
+            @param ssl_force as bool
+            @return str/None
+        """
+        parsed = self.__parse(value)
+        if parsed is None:
+            return None
+        (host, key, wanted) = parsed
+        # Only keep flags asked by user
+        wanted &= self.WWW
+        if ssl_force:
+            wanted |= self.HTTPS
+        with self.__lock:
+            cached = len(key) <= self.__CACHED_PREFIX_LENGTH
+            if cached and (key, wanted) in self.__cache.keys():
+                return self.__cache[(key, wanted)]
+            if key.find("/") == -1:
+                table = self.__hosts
+            else:
+                table = self.__uris
+            (data, offsets, lengths, weights, flags) = table
+            prefix = self.__encode(key)
+            index = self.__bisect(table, prefix)
+            best = None
+            while index < len(offsets) and data.startswith(
+                    prefix, offsets[index], offsets[index] + lengths[index]):
+                if flags[index] & wanted == wanted and (
+                        best is None or weights[index] > weights[best]):
+                    best = index
+                index += 1
+            uri = None
+            if best is not None:
+                scheme = "https://" if flags[best] & self.HTTPS else "http://"
+                www = "www." if flags[best] & self.WWW else ""
+                uri = scheme + www + self.__get_key(table, best).decode(
+                    "utf-8", "surrogatepass")
+            if cached:
+                self.__cache[(key, wanted)] = uri
+            return uri
+
+    @property
+    def loaded(self):
+        """
+            True if index content has been set
+            @return bool
+        """
+        return self.__loaded
+
+#######################
+# PRIVATE             #
+#######################
+    def __encode(self, key):
+        """
+            Get key as bytes, UTF-8 keeps str sort order
+            @param key as str
+            @return bytes
+        """
+        return key.encode("utf-8", "surrogatepass")
+
+    def __get_table(self, keys):
+        """
+            Pack keys in a new table
+            @param keys as {str: (weight as int, flags as int)}
+            @return (bytearray, array, array, array, array)
+        """
+        table = (bytearray(), array("I"), array("I"),
+                 array("q"), array("B"))
+        (data, offsets, lengths, weights, flags) = table
+        for key in sorted(keys.keys()):
+            encoded = self.__encode(key)
+            offsets.append(len(data))
+            lengths.append(len(encoded))
+            data += encoded
+            weights.append(keys[key][0])
+            flags.append(keys[key][1])
+        return table
+
+    def __get_key(self, table, index):
+        """
+            Get key at index in table
+            @param table as (bytearray, array, array, array, array)
+            @param index as int
+            @return bytes
+        """
+        (data, offsets, lengths, weights, flags) = table
+        return bytes(data[offsets[index]:offsets[index] + lengths[index]])
+
+    def __bisect(self, table, key):
+        """
+            Get position of key in table
+            @param table as (bytearray, array, array, array, array)
+            @param key as bytes
+            @return int
+        """
+        low = 0
+        high = len(table[1])
+        while low < high:
+            middle = (low + high) // 2
+            if self.__get_key(table, middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def __add(self, table, key, weight, flags):
+        """
+            Add weight and flags to key in table
+            @param table as (bytearray, array, array, array, array)
+            @param key as bytes
+            @param weight as int
+            @param flags as int
+        """
+        (data, offsets, lengths, weights, key_flags) = table
+        index = self.__bisect(table, key)
+        if index < len(offsets) and self.__get_key(table, index) == key:
+            weights[index] += weight
+            key_flags[index] |= flags
+        else:
+            # Only offsets keep keys sorted, append bytes to buffer
+            offsets.insert(index, len(data))
+            lengths.insert(index, len(key))
+            data += key
+            weights.insert(index, weight)
+            key_flags.insert(index, flags)
+
+    def __remove(self, table, key, weight):
+        """
+            Remove weight from key in table, drop key when reaching 0
+            @param table as (bytearray, array, array, array, array)
+            @param key as bytes
+            @param weight as int/None (None to drop key)
+        """
+        (data, offsets, lengths, weights, key_flags) = table
+        index = self.__bisect(table, key)
+        if index < len(offsets) and self.__get_key(table, index) == key:
+            if weight is not None and weights[index] > weight:
+                weights[index] -= weight
+            else:
+                del offsets[index]
+                del lengths[index]
+                del weights[index]
+                del key_flags[index]
+
+    def __invalidate(self, host):
+        """
+            Remove cached results for host prefixes
+            @param host as str
+        """
+        for key in list(self.__cache.keys()):
+            if host.startswith(key[0]):
+                del self.__cache[key]
+
+    def __parse(self, uri):
+        """
+            Get index keys for uri
+            @param uri as str
+            @return (host as str, key as str, flags as int)/None
+        """
+        flags = 0
+        split = uri.split("://", 1)
+        if len(split) == 2:
+            if split[0] not in ["http", "https"]:
+                return None
+            if split[0] == "https":
+                flags |= self.HTTPS
+            uri = split[1]
+        if uri.startswith("www."):
+            flags |= self.WWW
+            uri = uri[4:]
+        split = uri.split("/", 1)
+        host = split[0].lower()
+        if not host:
+            return None
+        if len(split) == 2:
+            key = host + "/" + split[1]
+        else:
+            key = host
+        return (host, key, flags)
@@ -20,6 +20,7 @@ from threading import current_thread
 from urllib.parse import urlparse
 from random import choice
 from base64 import b64encode
+import resource
 
 from eolie.logger import Logger
 from eolie.define import ArtSize, LoadingType
@@ -96,6 +97,20 @@ def get_safe_netloc(uri):
     return netloc
 
 
+def get_rss():
+    """
+        Get current process resident memory
+        @return bytes as int
+    """
+    try:
+        with open("/proc/self/statm", "r") as f:
+            pages = int(f.read().split()[1])
+        return pages * resource.getpagesize()
+    except Exception as e:
+        Logger.debug("get_rss(): %s", e)
+    return 0
+
+
 def wanted_loading_type(index):
     """
         Return window type based on current index
@@ -16,7 +16,6 @@ from urllib.parse import urlparse
 from time import time
 
 from eolie.define import App, LoadingType, LoadingState
-from eolie.context import Context
 from eolie.webview_errors import WebViewErrors
 from eolie.webview_navigation import WebViewNavigation
 from eolie.webview_signals import WebViewSignals
@@ -25,6 +24,8 @@ from eolie.webview_state import WebViewState
 from eolie.webview_credentials import WebViewCredentials
 from eolie.webview_helpers import WebViewHelpers
 from eolie.webview_night_mode import WebViewNightMode
+from eolie.webview_discard import WebViewDiscard
+from eolie.webview_content_blocker import WebViewContentBlocker
 from eolie.list import LinkedList
 from eolie.utils import emit_signal
 from eolie.logger import Logger
@@ -40,13 +41,11 @@ class WebView(WebKit2.WebView):
             New webview
             @param window as Window
         """
-        context = WebKit2.WebContext(
-            process_swap_on_cross_site_navigation_enabled=True)
-        Context(context)
-
+        context = App().context_pool.get(window)
         webview = WebKit2.WebView.new_with_context(context)
         webview.__class__ = WebViewMeta
         webview.__init(None, window)
+        App().context_pool.add_webview(webview)
         return webview
 
     def new_ephemeral(window):
@@ -54,11 +53,11 @@ class WebView(WebKit2.WebView):
             New ephemeral webview
             @param window as Window
         """
-        context = WebKit2.WebContext.new_ephemeral()
-        Context(context)
+        context = App().context_pool.get_ephemeral()
         webview = WebKit2.WebView.new_with_context(context)
         webview.__class__ = WebViewMeta
         webview.__init(None, window)
+        App().context_pool.add_webview(webview)
         return webview
 
     def new_with_related_view(related, window):
@@ -411,6 +410,8 @@ class WebView(WebKit2.WebView):
         WebViewSignals.__init__(self)
         WebViewArtwork.__init__(self)
         WebViewCredentials.__init__(self)
+        WebViewDiscard.__init__(self)
+        WebViewContentBlocker.__init__(self)
         self.__window = window
         self.__atime = 0
         self._loading_state = LoadingState.NONE
@@ -422,10 +423,6 @@ class WebView(WebKit2.WebView):
         self.set_hexpand(True)
         self.set_vexpand(True)
         self.clear_text_entry()
-        content_manager = self.get_user_content_manager()
-        for content_filter in App().content_filters:
-            if content_filter is not None:
-                content_manager.add_filter(content_filter)
         if related is None:
             # Set settings
             settings = self.get_settings()
@@ -576,7 +573,8 @@ class WebView(WebKit2.WebView):
 
 class WebViewMeta(WebViewNavigation, WebView, WebViewErrors,
                   WebViewSignals, WebViewArtwork, WebViewState,
-                  WebViewCredentials, WebViewHelpers, WebViewNightMode):
+                  WebViewCredentials, WebViewHelpers, WebViewNightMode,
+                  WebViewDiscard, WebViewContentBlocker):
 
     def __init__(self):
         pass
@@ -595,3 +593,5 @@ class WebViewMeta(WebViewNavigation, WebView, WebViewErrors,
         WebViewNavigation._on_load_changed(self, webview, event)
         WebViewArtwork._on_load_changed(self, webview, event)
         WebViewNightMode._on_load_changed(self, webview, event)
+        WebViewDiscard._on_load_changed(self, webview, event)
+        WebViewContentBlocker._on_load_changed(self, webview, event)
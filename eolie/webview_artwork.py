@@ -90,7 +90,8 @@ class WebViewArtwork:
             @param webview as WebView
         """
         parsed = urlparse(self.uri)
-        if self.is_ephemeral or parsed.scheme not in ["http", "https"]:
+        if self.is_ephemeral or self.discarded or\
+                parsed.scheme not in ["http", "https"]:
             return
         surface = self.get_favicon()
         if surface is not None:
@@ -148,7 +149,8 @@ class WebViewArtwork:
         self.__helper.run(App().art.save_artwork,
                           uri,
                           surface,
-                          "favicon")
+                          "favicon",
+                          key="favicon:%s" % uri)
 
     def __on_uri_changed(self, webview, param):
         """
@@ -0,0 +1,66 @@
+# Copyright (c) 2017-2021 Cedric Bellegarde <cedric.bellegarde@adishatz.org>
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+from gi.repository import WebKit2
+
+from urllib.parse import urlparse
+
+from eolie.define import App
+
+
+class WebViewContentBlocker:
+    """
+        Apply content blockers filters matching loaded page
+    """
+
+    def __init__(self):
+        """
+            Init content blocker
+        """
+        self.update_content_filters()
+
+    def update_content_filters(self):
+        """
+            Add/remove filters for current uri
+        """
+        content_manager = self.get_user_content_manager()
+        # Related webviews share their content manager, so applied filters
+        # are tracked on it: content blocker name => UserContentFilter
+        filters = getattr(content_manager, "applied_filters", None)
+        if filters is None:
+            filters = content_manager.applied_filters = {}
+        netloc = urlparse(self.get_uri() or "").netloc
+        for content_blocker in App().content_blockers:
+            content_filter = content_blocker.get_filter(netloc)
+            current = filters.get(content_blocker.name, None)
+            if current is content_filter:
+                continue
+            # Filters with same name replace each other, remove first
+            if current is not None:
+                content_manager.remove_filter(current)
+            if content_filter is not None:
+                content_manager.add_filter(content_filter)
+            filters[content_blocker.name] = content_filter
+
+#######################
+# PROTECTED           #
+#######################
+    def _on_load_changed(self, webview, event):
+        """
+            Update filters before page resources load
+            @param webview as WebView
+            @param event as WebKit2.LoadEvent
+        """
+        if event in [WebKit2.LoadEvent.STARTED,
+                     WebKit2.LoadEvent.REDIRECTED,
+                     WebKit2.LoadEvent.COMMITTED]:
+            self.update_content_filters()
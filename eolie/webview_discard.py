@@ -0,0 +1,133 @@
+# Copyright (c) 2017-2021 Cedric Bellegarde <cedric.bellegarde@adishatz.org>
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+from gi.repository import GLib, WebKit2
+
+from time import time
+
+from eolie.define import App
+from eolie.logger import Logger
+
+
+class WebViewDiscard:
+    """
+        Unload webview web process, keep enough to restore it:
+        snapshot, title, favicon and session state
+    """
+
+    def __init__(self):
+        """
+            Init discard
+        """
+        self.__session = None
+        self.__load_time = 0
+
+    def can_discard(self):
+        """
+            True if webview can be unloaded
+            @return bool
+        """
+        # Related webviews share the same web process
+        if self.__session is not None or\
+                self.get_uri() is None or\
+                self.related is not None or\
+                self.children or\
+                self.is_playing_audio() or\
+                self == self.window.container.webview:
+            return False
+        return self.netloc not in App().websettings.get_pinned_netlocs()
+
+    def discard(self):
+        """
+            Unload webview if no text area or editable element focused
+        """
+        if self.can_discard():
+            # Contenteditable elements are reported as "EDITABLE"
+            self.run_javascript("var e = document.activeElement;"
+                                "!e ? '' : e.isContentEditable ?"
+                                "'EDITABLE' : e.tagName;", None,
+                                self.__on_get_active_element)
+
+    def restore(self):
+        """
+            Reload webview from saved session state
+        """
+        if self.__session is None:
+            return
+        Logger.debug("WebViewDiscard::restore(): %s", self.uri)
+        session = WebKit2.WebViewSessionState(self.__session)
+        self.__session = None
+        self.restore_session_state(session)
+        item = self.get_back_forward_list().get_current_item()
+        if item is None:
+            self.load_uri(self.uri)
+        else:
+            self.go_to_back_forward_list_item(item)
+
+    @property
+    def idle_since(self):
+        """
+            Get last time webview was shown or loaded
+            @return int
+        """
+        return max(self.atime, self.__load_time)
+
+    @property
+    def discarded(self):
+        """
+            True if webview web process has been unloaded
+            @return bool
+        """
+        return self.__session is not None
+
+    @property
+    def discarded_session(self):
+        """
+            Get session saved at discard
+            @return GLib.Bytes/None
+        """
+        return self.__session
+
+#######################
+# PROTECTED           #
+#######################
+    def _on_load_changed(self, webview, event):
+        """
+            Update load time
+            @param webview as WebView
+            @param event as WebKit2.LoadEvent
+        """
+        if event == WebKit2.LoadEvent.FINISHED:
+            self.__load_time = int(time())
+
+#######################
+# PRIVATE             #
+#######################
+    def __on_get_active_element(self, source, result):
+        """
+            Unload webview if user is not editing a text area
+            @param source as GObject.Object
+            @param result as Gio.AsyncResult
+        """
+        try:
+            data = source.run_javascript_finish(result)
+            name = data.get_js_value().to_string()
+            if name in ["TEXTAREA", "INPUT", "EDITABLE"] or\
+                    not self.can_discard():
+                return
+            Logger.debug("WebViewDiscard::discard(): %s", self.uri)
+            self.__session = GLib.Bytes.new(
+                self.get_session_state().serialize().get_data())
+            self.terminate_web_process()
+        except Exception as e:
+            self.__session = None
+            Logger.error("WebViewDiscard::__on_get_active_element(): %s", e)
@@ -169,6 +169,9 @@ class WebViewErrors:
             We just crashed :-(
             @param webview as WebKit2.WebView
         """
+        # Web process unloaded by DiscardManager
+        if webview.discarded:
+            return True
         self._loading_state = LoadingState.ERROR
         f = Gio.File.new_for_uri("resource:///org/gnome/Eolie/error.css")
         (status, css_content, tag) = f.load_contents(None)
@@ -127,7 +127,7 @@ class WebViewNavigation:
             if self._loading_state not in [LoadingState.STOPPED,
                                            LoadingState.ERROR]:
                 self._loading_state = LoadingState.NONE
-            App().history.set_page_state(self.uri)
+            App().history.writer.set_page_state(self.uri)
             self.__update_bookmark_metadata(self.uri)
             self.update_spell_checking(self.uri)
             if App().show_tls:
@@ -98,6 +98,13 @@ class WebViewNightMode:
         """
         self.__stylesheets.remove_cache()
 
+    def clear_night_mode_stylesheets(self):
+        """
+            Drop in memory stylesheets
+            @return freed bytes as int
+        """
+        return self.__stylesheets.clear()
+
     @property
     def stylesheets(self):
         """
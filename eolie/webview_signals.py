@@ -204,7 +204,10 @@ class WebViewSignals(WebViewMenuSignals, WebViewJsSignals):
                     not is_http:
                 return
             mtime = round(time(), 2)
-            history_id = App().history.add(self.__title, self.__uri, mtime)
-            App().history.set_page_state(self.__uri, mtime)
             if App().sync_worker is not None:
-                App().sync_worker.push_history(history_id)
+                callback = App().sync_worker.push_history
+            else:
+                callback = None
+            App().history.writer.add(self.__title, self.__uri, mtime,
+                                     callback)
+            App().history.writer.set_page_state(self.__uri, mtime)
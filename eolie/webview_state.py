@@ -62,7 +62,11 @@ class WebViewState:
             state.title = self.title
             state.atime = self.atime
             state.is_ephemeral = self.is_ephemeral
-            state.session = self.get_session_state().serialize().get_data()
+            if self.discarded:
+                state.session = self.discarded_session.get_data()
+            else:
+                state.session = self.get_session_state().serialize(
+                    ).get_data()
             return state
         else:
             return None
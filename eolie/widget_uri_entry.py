@@ -16,7 +16,7 @@ from gettext import gettext as _
 from urllib.parse import urlparse
 from time import time
 
-from eolie.define import App
+from eolie.define import App, TaskPriority
 from eolie.utils import emit_signal
 from eolie.helper_task import TaskHelper
 from eolie.popover_uri import UriPopover
@@ -328,7 +328,8 @@ class UriEntry(Gtk.Overlay, SizeAllocationHelper):
                 iterator = self.__completion_model.insert(0)
             return iterator
 
-        self.__task_helper.run(look_for_match, value)
+        self.__task_helper.run(look_for_match, value,
+                               priority=TaskPriority.INTERACTIVE)
 
     def __on_popover_closed(self, popover):
         """